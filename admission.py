@@ -0,0 +1,175 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Rejection reason codes returned to webhook callers
+QUEUE_FULL = "QUEUE_FULL"                      # 429: too many requests waiting
+DEADLINE_UNREACHABLE = "DEADLINE_UNREACHABLE"  # 503: would be processed after its deadline
+DEADLINE_MISSED = "DEADLINE_MISSED"            # 503: deadline passed while it waited
+
+# requests without a readable entry time get this much time to be processed
+DEFAULT_DEADLINE_SECONDS = 30.0
+# starting estimate of one request's processing time, until some are measured
+INITIAL_SERVICE_SECONDS = 0.05
+SERVICE_EWMA_ALPHA = 0.2
+
+
+class _Ticket:
+    __slots__ = ("deadline", "seq", "item", "admitted_at")
+
+    def __init__(self, deadline: float, seq: int, item: Any, admitted_at: float):
+        self.deadline = deadline
+        self.seq = seq
+        self.item = item
+        self.admitted_at = admitted_at
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class AdmissionControl:
+    """Earliest-deadline-first queue that only admits work it can finish in time.
+
+    A request is admitted when, served after every queued request with an
+    earlier deadline, it is still estimated to finish before its own
+    deadline, and every queued request behind it still does too; otherwise
+    it is rejected at once rather than left to expire in the queue. The
+    estimate is the queue position times a moving average of measured
+    processing times. Requests whose deadline passes while they wait (the
+    estimate was wrong) are shed when they reach the head.
+    - max_queue: 0 means unlimited queue size.
+    """
+
+    def __init__(self, max_queue: int = 0, now: Callable[[], float] = time.time):
+        self.max_queue = max_queue
+        self.now = now
+        # sorted by (deadline, arrival)
+        self._queue: list[_Ticket] = []
+        self._seq = itertools.count()
+        self.service_seconds = INITIAL_SERVICE_SECONDS
+        # when the request being processed started, or None
+        self._busy_since: float | None = None
+        self.counts: dict[str, int] = {"admitted": 0, "processed": 0, QUEUE_FULL: 0, DEADLINE_UNREACHABLE: 0, DEADLINE_MISSED: 0}
+        self.max_depth = 0
+        # slack (deadline - finish) of processed requests, to see how close the deployment runs
+        self.min_slack: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def _finish_times(self, queue: list[_Ticket], start: float) -> list[float]:
+        finish, times = start, []
+        for _ in queue:
+            finish += self.service_seconds
+            times.append(finish)
+        return times
+
+    def admit(self, item: Any, deadline: float | None) -> tuple[str | None, float]:
+        """Queue `item`; returns (rejection reason or None, estimated wait in seconds)."""
+        now = self.now()
+        if deadline is None:
+            deadline = now + DEFAULT_DEADLINE_SECONDS
+        if self.max_queue and len(self._queue) >= self.max_queue:
+            self.counts[QUEUE_FULL] += 1
+            return QUEUE_FULL, len(self._queue) * self.service_seconds
+        ticket = _Ticket(deadline, next(self._seq), item, now)
+        position = bisect.bisect(self._queue, ticket)
+        candidate = self._queue[:position] + [ticket] + self._queue[position:]
+        start = now
+        if self._busy_since is not None:
+            start += max(0.0, self.service_seconds - (now - self._busy_since))
+        finishes = self._finish_times(candidate, start)
+        wait = finishes[position] - now
+        if any(finish > t.deadline for finish, t in zip(finishes[position:], candidate[position:])):
+            self.counts[DEADLINE_UNREACHABLE] += 1
+            return DEADLINE_UNREACHABLE, wait
+        self._queue = candidate
+        self.counts["admitted"] += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+        return None, wait
+
+    def next(self) -> tuple[Any, str | None]:
+        """Take the earliest-deadline request; the reason is set if it must be shed instead of processed."""
+        ticket = self._queue.pop(0)
+        if self.now() > ticket.deadline:
+            self.counts[DEADLINE_MISSED] += 1
+            return ticket.item, DEADLINE_MISSED
+        self._busy_since = self.now()
+        return ticket.item, None
+
+    def done(self, deadline: float | None = None) -> None:
+        """The request taken by `next` finished processing."""
+        if self._busy_since is None:
+            return
+        now = self.now()
+        elapsed = now - self._busy_since
+        self._busy_since = None
+        self.service_seconds += SERVICE_EWMA_ALPHA * (elapsed - self.service_seconds)
+        self.counts["processed"] += 1
+        if deadline is not None:
+            slack = deadline - now
+            self.min_slack = slack if self.min_slack is None else min(self.min_slack, slack)
+
+    def snapshot(self) -> dict:
+        offered = self.counts["admitted"] + self.counts[QUEUE_FULL] + self.counts[DEADLINE_UNREACHABLE]
+        shed = self.counts[QUEUE_FULL] + self.counts[DEADLINE_UNREACHABLE] + self.counts[DEADLINE_MISSED]
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "max_queue": self.max_queue,
+            "service_ms": round(self.service_seconds * 1000, 2),
+            "counts": dict(self.counts),
+            "shed_ratio": round(shed / offered, 4) if offered else 0.0,
+            "min_slack_seconds": round(self.min_slack, 3) if self.min_slack is not None else None,
+        }
+
+
+class AdmissionQueue:
+    """Runs work admitted by an AdmissionControl one item at a time, earliest deadline first.
+
+    Every way a signal arrives (webhook, ingested sources, other workers)
+    goes through the same queue, so they are ordered and shed alike.
+    """
+
+    def __init__(self, admission: AdmissionControl):
+        self.admission = admission
+        self._ready = asyncio.Event()
+        self._worker_task: asyncio.Task | None = None
+
+    async def run(self, work: Callable[[], Awaitable[Any]], deadline: float | None) -> tuple[Any, str | None, float]:
+        """Queue `work` and wait for it; returns (its result, rejection reason or None, estimated wait)."""
+        # start worker lazily on first item (safe for startup ordering)
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker())
+        result: asyncio.Future = asyncio.get_running_loop().create_future()
+        reason, wait = self.admission.admit((work, result, deadline), deadline)
+        if reason is not None:
+            return None, reason, wait
+        self._ready.set()
+        return await result
+
+    async def _worker(self) -> None:
+        while True:
+            if not len(self.admission):
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            (work, result, deadline), reason = self.admission.next()
+            if reason is not None:
+                if not result.cancelled():
+                    result.set_result((None, reason, 0.0))
+                continue
+            try:
+                value = await work()
+                if not result.cancelled():
+                    result.set_result((value, None, 0.0))
+            except Exception as e:
+                if not result.cancelled():
+                    result.set_exception(e)
+            finally:
+                self.admission.done(deadline)
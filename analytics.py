@@ -0,0 +1,120 @@
+import logging
+from array import array
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class GroupStats:
+    """Running totals for one grouping key, stored as parallel arrays.
+
+    Each distinct key gets a slot index; every array holds one value per slot,
+    so adding a closed trade is a handful of in-place array updates and a
+    summary is a single pass over the slots, independent of history length.
+    """
+
+    def __init__(self, fixed_keys: Iterable | None = None):
+        self._index: dict = {}
+        self.keys: list = []
+        self.trades = array("q")
+        self.wins = array("q")
+        self.depth_sum = array("q")
+        self.pnl = array("d")
+        self.slippage_sum = array("d")
+        for key in fixed_keys or ():
+            self.slot(key)
+
+    def slot(self, key) -> int:
+        idx = self._index.get(key)
+        if idx is None:
+            idx = len(self.keys)
+            self._index[key] = idx
+            self.keys.append(key)
+            self.trades.append(0)
+            self.wins.append(0)
+            self.depth_sum.append(0)
+            self.pnl.append(0.0)
+            self.slippage_sum.append(0.0)
+        return idx
+
+    def add(self, key, won: bool, depth: int, pnl: float, slippage: float) -> None:
+        idx = self.slot(key)
+        self.trades[idx] += 1
+        self.wins[idx] += 1 if won else 0
+        self.depth_sum[idx] += depth
+        self.pnl[idx] += pnl
+        self.slippage_sum[idx] += slippage
+
+    def row(self, key) -> dict | None:
+        idx = self._index.get(key)
+        return None if idx is None else self._row(idx)
+
+    def _row(self, idx: int) -> dict:
+        n = self.trades[idx]
+        return {
+            "key": self.keys[idx],
+            "trades": n,
+            "wins": self.wins[idx],
+            "win_rate": self.wins[idx] / n if n else 0.0,
+            "avg_martingale_depth": self.depth_sum[idx] / n if n else 0.0,
+            "pnl": round(self.pnl[idx], 2),
+            "avg_entry_slippage": self.slippage_sum[idx] / n if n else 0.0,
+        }
+
+    def summary(self, skip_empty: bool = True) -> list[dict]:
+        return [self._row(i) for i in range(len(self.keys)) if self.trades[i] or not skip_empty]
+
+
+class ProviderAnalytics:
+    """Per-provider, per-asset and per-hour statistics over closed sequences.
+
+    Closed sequences are folded into the group totals as they happen, so
+    nothing is ever recomputed from scratch and memory grows with the number
+    of distinct providers and assets, not with history. Per-sequence rows
+    live in the trade history (trade_store.py).
+
+    - depth: martingale level the sequence ended on (0 = first entry).
+    - pnl: net result of the whole sequence.
+    - slippage: seconds between the intended entry time and the broker open time.
+    """
+
+    def __init__(self):
+        self.by_provider = GroupStats()
+        self.by_asset = GroupStats()
+        self.by_hour = GroupStats(fixed_keys=range(24))
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.total
+
+    def record(self, provider: str, asset: str, hour: int, won: bool, depth: int, pnl: float, slippage: float = 0.0) -> None:
+        self.total += 1
+        self.by_provider.add(provider, won, depth, pnl, slippage)
+        self.by_asset.add(asset, won, depth, pnl, slippage)
+        self.by_hour.add(hour, won, depth, pnl, slippage)
+
+    def extend(self, rows: Iterable[tuple]) -> None:
+        """Load history rows of (provider, asset, hour, won, depth, pnl, slippage)."""
+        count = 0
+        for row in rows:
+            self.record(*row)
+            count += 1
+        logger.info(f"Loaded {count} closed sequences into provider analytics")
+
+    def score(self, provider: str, min_trades: int = 20) -> float:
+        """Provider win rate relative to all providers, 1.0 until it has `min_trades` sequences, clamped to [0.25, 2]."""
+        row = self.by_provider.row(provider)
+        if row is None or row["trades"] < min_trades or not len(self):
+            return 1.0
+        overall = sum(self.by_provider.wins) / len(self)
+        if not overall:
+            return 1.0
+        return min(2.0, max(0.25, row["win_rate"] / overall))
+
+    def stats(self, by: str | None = None) -> dict:
+        groups = {"provider": self.by_provider, "asset": self.by_asset, "hour": self.by_hour}
+        if by is not None:
+            if by not in groups:
+                raise ValueError(f"Unknown grouping '{by}', expected one of {sorted(groups)}")
+            groups = {by: groups[by]}
+        return {name: group.summary() for name, group in groups.items()} | {"total_sequences": len(self)}
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rejection reason codes returned to webhook callers
+ASSET_UNKNOWN = "ASSET_UNKNOWN"    # broker does not list the asset
+ASSET_CLOSED = "ASSET_CLOSED"      # listed but not tradable right now (no payout)
+PAYOUT_TOO_LOW = "PAYOUT_TOO_LOW"  # payout below min_payout
+
+# Quote precision. The broker publishes no pip size, so currency pairs use the
+# market convention and other assets the most decimals their prices have shown.
+FOREX_DECIMALS = 5
+JPY_DECIMALS = 3
+FIAT_CURRENCIES = frozenset((
+    "AED", "AUD", "BHD", "BRL", "CAD", "CHF", "CNH", "CNY", "EGP", "EUR", "GBP", "HKD", "IDR", "ILS", "INR", "JOD",
+    "JPY", "KES", "LBP", "MAD", "MXN", "MYR", "NGN", "NOK", "NZD", "OMR", "PHP", "PKR", "PLN", "QAR", "RUB", "SAR",
+    "SEK", "SGD", "THB", "TND", "TRY", "UAH", "USD", "VND", "YER", "ZAR",
+))
+
+
+def _printed_decimals(price: float) -> int:
+    text = repr(float(price))
+    return len(text.split(".")[1]) if "." in text and "e" not in text else 0
+
+
+class AssetCatalog:
+    """In-memory cache of tradable assets and their payouts.
+
+    The broker is polled in the background and the whole table is swapped in
+    one assignment, so lookups from `parse_signal` are a single dict access.
+    An empty or stale catalog never rejects anything: we would rather try the
+    trade than drop a signal because the broker was slow to answer.
+    """
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self._payouts: dict[str, float] = {}
+        self._loaded_at: float = 0.0
+        # most decimals seen per non-forex symbol; only ever grows
+        self._decimals: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def loaded(self) -> bool:
+        if not self._payouts:
+            return False
+        # three missed refreshes and we stop trusting the table
+        return (time.monotonic() - self._loaded_at) < self.refresh_interval * 3
+
+    def payout(self, symbol: str) -> float | None:
+        return self._payouts.get(symbol)
+
+    def observe_price(self, symbol: str, price: float) -> None:
+        decimals = _printed_decimals(price)
+        if decimals > self._decimals.get(symbol, 0):
+            self._decimals[symbol] = decimals
+
+    def decimals(self, symbol: str) -> int:
+        """Decimal places of `symbol`'s quotes, the same for every price of the asset."""
+        pair = symbol.split("_")[0].upper()
+        if len(pair) == 6 and pair[:3] in FIAT_CURRENCIES and pair[3:] in FIAT_CURRENCIES:
+            return JPY_DECIMALS if pair[3:] == "JPY" else FOREX_DECIMALS
+        return self._decimals.get(symbol, 0)
+
+    def check(self, symbol: str, min_payout: float = 0) -> str | None:
+        """Return a rejection reason code for `symbol`, or None if it can be traded."""
+        if not self.loaded:
+            return None
+        payout = self._payouts.get(symbol)
+        if payout is None:
+            return ASSET_UNKNOWN
+        if payout <= 0:
+            return ASSET_CLOSED
+        if payout < min_payout:
+            return PAYOUT_TOO_LOW
+        return None
+
+    async def refresh(self, api) -> None:
+        raw = await api.payout()
+        payouts: dict[str, float] = {}
+        if isinstance(raw, dict):
+            for symbol, value in raw.items():
+                try:
+                    payouts[str(symbol)] = float(value)
+                except (TypeError, ValueError):
+                    continue
+        if not payouts:
+            logger.warning("Broker returned no payouts, keeping previous asset catalog.")
+            return
+        self._payouts = payouts
+        self._loaded_at = time.monotonic()
+        logger.debug(f"Asset catalog refreshed: {len(payouts)} assets")
+
+    async def run(self, api) -> None:
+        while True:
+            try:
+                async with asyncio.timeout(10):
+                    await self.refresh(api)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to refresh asset catalog: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self, api) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(api))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,199 @@
+"""Vectorized martingale backtester and risk simulator.
+
+Signal outcomes are encoded as the index of the first winning leg of a
+martingale sequence, laid out as an int array of shape (paths, days, slots):
+
+    NO_SIGNAL (-2): padding for days with fewer signals than slots
+    LOST      (-1): every recorded leg lost
+    k >= 0        : first win on leg k (0 = the initial entry)
+
+The same rules the bot applies live are replayed with array operations:
+`manage_martingale` multiplies the stake after each loss up to
+`martingale_levels` extra legs, and `trade_signal_webhook` stops accepting
+signals for the rest of the day once the daily P&L is at or below
+`drawback_threshold`. Sequences are treated as settling in signal order, which
+matches the bot whenever signals do not overlap.
+
+Usage:
+    python backtest.py --win-probability 0.55 --paths 20000 --days 30 --signals-per-day 12
+    python backtest.py --history trades.db --timezone Etc/GMT-2 --paths 20000 --days 30
+
+With --history the outcomes are bootstrapped from the sequences the bot
+recorded in its trade history instead of drawn with a fixed win probability.
+"""
+import argparse
+import itertools
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NO_SIGNAL = -2
+LOST = -1
+
+
+def sequence_pnl_table(initial_amount: float, martingale_levels: int, martingale_multiplier: float, payout: float) -> np.ndarray:
+    """P&L of one sequence for every outcome code, shifted so NO_SIGNAL is index 0."""
+    legs = initial_amount * np.power(float(martingale_multiplier), np.arange(martingale_levels + 1))
+    staked_before = np.concatenate(([0.0], np.cumsum(legs)[:-1]))
+    won = legs * payout - staked_before
+    lost = -legs.sum()
+    return np.concatenate(([0.0, lost], won))
+
+
+def simulate(first_win: np.ndarray, initial_amount: float, martingale_levels: int, martingale_multiplier: float,
+             drawback_threshold: float, payout: float = 0.92, starting_balance: float | None = None) -> dict:
+    """Run every path in `first_win` through one risk-management setting."""
+    if first_win.ndim == 2:
+        first_win = first_win[np.newaxis]
+    paths = first_win.shape[0]
+    table = sequence_pnl_table(initial_amount, martingale_levels, martingale_multiplier, payout)
+    idx = np.where(first_win > martingale_levels, 1, first_win + 2)
+    pnl = table[idx]
+
+    # daily drawdown halt: a signal is taken only if the day's P&L before it
+    # has never touched the threshold
+    before = np.cumsum(pnl, axis=-1) - pnl
+    accepted = np.minimum.accumulate(before, axis=-1) > drawback_threshold
+    pnl = np.where(accepted, pnl, 0.0)
+
+    equity = np.cumsum(pnl.reshape(paths, -1), axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 0.0)
+    max_drawdown = (peak - equity).max(axis=1)
+    final_pnl = equity[:, -1]
+    signals = first_win != NO_SIGNAL
+
+    result = {
+        "sequences": int(signals.sum()),
+        "taken": int((accepted & signals).sum()),
+        "halted_day_rate": float((~accepted.all(axis=-1)).mean()),
+        "mean_pnl": float(final_pnl.mean()),
+        "pnl_p5": float(np.percentile(final_pnl, 5)),
+        "pnl_p50": float(np.percentile(final_pnl, 50)),
+        "drawdown_p50": float(np.percentile(max_drawdown, 50)),
+        "drawdown_p95": float(np.percentile(max_drawdown, 95)),
+        "drawdown_p99": float(np.percentile(max_drawdown, 99)),
+        "drawdown_max": float(max_drawdown.max()),
+    }
+    if starting_balance is not None:
+        result["risk_of_ruin"] = float((equity.min(axis=1) <= -starting_balance).mean())
+    return result
+
+
+def sweep(first_win: np.ndarray, grid: dict[str, list], payout: float = 0.92, starting_balance: float | None = None) -> list[dict]:
+    """Evaluate every combination of the RISK_MANAGEMENT values in `grid`."""
+    names = ["initial_amount", "martingale_levels", "martingale_multiplier", "drawback_threshold"]
+    unknown = set(grid) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    defaults = {"initial_amount": [1.0], "martingale_levels": [3], "martingale_multiplier": [2], "drawback_threshold": [-16]}
+    values = [grid.get(name, defaults[name]) for name in names]
+    results = []
+    for combo in itertools.product(*values):
+        params = dict(zip(names, combo))
+        started = time.perf_counter()
+        stats = simulate(first_win, payout=payout, starting_balance=starting_balance, **params)
+        elapsed = time.perf_counter() - started
+        stats["sequences_per_second"] = stats["sequences"] / elapsed if elapsed > 0 else float("inf")
+        results.append(params | stats)
+    return results
+
+
+def sample_first_win(rng: np.random.Generator, paths: int, days: int, signals_per_day: int,
+                     win_probability: float | None = None, recorded: np.ndarray | None = None) -> np.ndarray:
+    """Monte Carlo outcomes, either bootstrapped from `recorded` codes or geometric with `win_probability` per leg."""
+    shape = (paths, days, signals_per_day)
+    if recorded is not None:
+        recorded = recorded[recorded != NO_SIGNAL]
+        if recorded.size == 0:
+            raise ValueError("No recorded outcomes to sample from")
+        return rng.choice(recorded, size=shape)
+    if win_probability is None or not 0 < win_probability <= 1:
+        raise ValueError("win_probability must be in (0, 1] when no recorded outcomes are given")
+    return (rng.geometric(win_probability, size=shape) - 1).astype(np.int16)
+
+
+def outcomes_from_history(won: np.ndarray, depth: np.ndarray, day: np.ndarray) -> np.ndarray:
+    """Pack recorded sequences into a (1, days, slots) outcome array.
+
+    Sequences that never won are recorded as LOST; we do not know how they
+    would have ended with more martingale levels, so they stay losses.
+    """
+    won = np.asarray(won, dtype=bool)
+    codes = np.where(won, np.asarray(depth), LOST).astype(np.int16)
+    day = np.asarray(day)
+    order = np.argsort(day, kind="stable")
+    codes, day = codes[order], day[order]
+    day_ids, starts, counts = np.unique(day, return_index=True, return_counts=True)
+    slot = np.arange(day.size) - np.repeat(starts, counts)
+    row = np.repeat(np.arange(day_ids.size), counts)
+    packed = np.full((1, day_ids.size, counts.max() if counts.size else 0), NO_SIGNAL, dtype=np.int16)
+    packed[0, row, slot] = codes
+    return packed
+
+
+def load_history(path: str, timezone: str = "UTC", provider: str | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(won, depth, day) of the closed sequences in a trade history database, days counted in `timezone`."""
+    sql = "SELECT won, depth, entry_time FROM sequences"
+    params: tuple = ()
+    if provider:
+        sql += " WHERE provider = ?"
+        params = (provider,)
+    with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+        rows = conn.execute(sql + " ORDER BY entry_time, id", params).fetchall()
+    zone = ZoneInfo(timezone)
+    won = np.array([row[0] for row in rows], dtype=bool)
+    depth = np.array([row[1] for row in rows], dtype=np.int16)
+    day = np.array([datetime.fromtimestamp(row[2], zone).toordinal() for row in rows], dtype=np.int64)
+    return won, depth, day
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep of martingale risk management settings.")
+    parser.add_argument("--win-probability", type=float, default=0.55, help="probability that a single leg wins")
+    parser.add_argument("--payout", type=float, default=0.92, help="payout fraction on a winning leg")
+    parser.add_argument("--paths", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--signals-per-day", type=int, default=None, help="default 10, or the recorded average with --history")
+    parser.add_argument("--history", help="trade history database (PO_TRADE_DB) to bootstrap recorded outcomes from")
+    parser.add_argument("--provider", help="with --history, only this provider's sequences")
+    parser.add_argument("--timezone", default="UTC", help="with --history, time zone the daily drawdown resets in")
+    parser.add_argument("--starting-balance", type=float, default=100.0)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--multipliers", type=float, nargs="+", default=[2, 2.5])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[-8, -16, -32])
+    parser.add_argument("--initial-amounts", type=float, nargs="+", default=[1])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.history:
+        recorded = outcomes_from_history(*load_history(args.history, args.timezone, args.provider))
+        sequences = int((recorded != NO_SIGNAL).sum())
+        if not sequences:
+            parser.error(f"No closed sequences recorded in {args.history}")
+        signals_per_day = args.signals_per_day or max(1, round(sequences / recorded.shape[1]))
+        print(f"Bootstrapping {sequences} recorded sequences over {recorded.shape[1]} days, {signals_per_day} signals per day")
+        first_win = sample_first_win(rng, args.paths, args.days, signals_per_day, recorded=recorded)
+    else:
+        first_win = sample_first_win(rng, args.paths, args.days, args.signals_per_day or 10, win_probability=args.win_probability)
+    grid = {
+        "initial_amount": args.initial_amounts,
+        "martingale_levels": args.levels,
+        "martingale_multiplier": args.multipliers,
+        "drawback_threshold": args.thresholds,
+    }
+    results = sweep(first_win, grid, payout=args.payout, starting_balance=args.starting_balance)
+    print(f"{'amount':>7} {'levels':>6} {'mult':>5} {'thresh':>7} {'mean P&L':>10} {'P&L p5':>9} {'DD p95':>8} {'ruin':>7} {'seq/s':>12}")
+    for r in results:
+        print(f"{r['initial_amount']:>7.2f} {r['martingale_levels']:>6} {r['martingale_multiplier']:>5.2f} {r['drawback_threshold']:>7.1f} "
+              f"{r['mean_pnl']:>10.2f} {r['pnl_p5']:>9.2f} {r['drawdown_p95']:>8.2f} {r['risk_of_ruin']:>7.2%} {r['sequences_per_second']:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# bench_models.py - memory and construction cost of the live trade records
+#
+#   python bench_models.py            print bytes and construction time per live trade
+#   python bench_models.py --check    exit with status 1 if the slotted records miss their targets
+#
+# A "live trade" is what the bot holds per open martingale leg: a Trade with
+# its TradeFields, plus the Signal and SignalFields of the signal it came
+# from. The pydantic models below are the ones main.py used before the
+# runtime records moved to models.py; they are kept here as the baseline.
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Optional
+
+from pydantic import BaseModel
+
+from models import Signal, SignalFields, Trade, TradeFields
+
+# the slotted records must beat the pydantic baseline by at least this much;
+# measured about 6.2x memory and 2.7-3.2x construction, the gates leave room for noisy machines
+MIN_MEMORY_RATIO = 3.0
+MIN_SPEED_RATIO = 2.0
+
+
+class TRADE_FIELDS(BaseModel):
+    signal_provider: str
+    asset: str
+    direction: str
+    entry_time: datetime
+    level: int
+    open_price: float
+    amount: float
+    signal_time: Optional[datetime] = None
+    entry_slippage: float = 0.0
+    sequence_pnl: float = 0.0
+    signal_id: str = ""
+    price_slippage: Optional[float] = None
+
+
+class TRADE(BaseModel):
+    trade_id: str
+    trade_details: TRADE_FIELDS
+
+
+class SIGNAL_FIELDS(BaseModel):
+    signal_provider: str
+    asset: str
+    direction: str
+    entry_time: datetime
+
+
+class SIGNAL(BaseModel):
+    signal_id: str
+    signal_details: SIGNAL_FIELDS
+
+
+ENTRY = datetime(2026, 10, 19, 19, 55, tzinfo=timezone.utc)
+OPENED = datetime(2026, 10, 19, 17, 55, 0)
+
+
+def build_pydantic(signal_id: str, trade_id: str):
+    # built from nested dicts, the way main.py did
+    signal = SIGNAL(**{"signal_id": signal_id,
+                       "signal_details": {"signal_provider": "alpha", "asset": "EURUSD", "direction": "BUY", "entry_time": ENTRY}})
+    trade = TRADE(**{"trade_id": trade_id,
+                     "trade_details": {"signal_provider": "alpha", "asset": "EURUSD_otc", "direction": "BUY", "entry_time": OPENED,
+                                       "level": 0, "open_price": 1.0842, "amount": 1.0, "signal_time": ENTRY,
+                                       "entry_slippage": 0.12, "signal_id": signal.signal_id, "price_slippage": 0.00001}})
+    return signal, trade
+
+
+def build_slotted(signal_id: str, trade_id: str):
+    signal = Signal(signal_id=signal_id,
+                    signal_details=SignalFields(signal_provider="alpha", asset="EURUSD", direction="BUY", entry_time=ENTRY))
+    trade = Trade(trade_id=trade_id,
+                  trade_details=TradeFields(signal_provider="alpha", asset="EURUSD_otc", direction="BUY", entry_time=OPENED,
+                                            level=0, open_price=1.0842, amount=1.0, signal_time=ENTRY,
+                                            entry_slippage=0.12, signal_id=signal.signal_id, price_slippage=0.00001))
+    return signal, trade
+
+
+def bytes_per_trade(build, count: int = 20000) -> float:
+    """Heap bytes held per live trade, ids and shared values included."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    live = [build(f"alpha|19:55|EURUSD{i}", f"trade-{i}") for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del live
+    # the list holding them is not part of a trade
+    return (after - before - sys.getsizeof([None] * count)) / count
+
+
+def construct_seconds(builds, count: int = 20000, runs: int = 9) -> list[float]:
+    """Best-of-N seconds to build one live trade from ids that already exist, for each builder.
+
+    The builders take turns within every run, so a slow spell on the machine
+    hits all of them instead of skewing their ratio.
+    """
+    ids = [(f"alpha|19:55|EURUSD{i}", f"trade-{i}") for i in range(count)]
+    best = [float("inf")] * len(builds)
+    # like timeit, keep collector pauses out of the timing
+    gc.disable()
+    try:
+        for _ in range(runs):
+            for i, build in enumerate(builds):
+                started = time.perf_counter()
+                for signal_id, trade_id in ids:
+                    build(signal_id, trade_id)
+                best[i] = min(best[i], time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return [seconds / count for seconds in best]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the live trade records with the old pydantic models.")
+    parser.add_argument("--check", action="store_true", help="fail if the slotted records miss their targets")
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    old_bytes, new_bytes = bytes_per_trade(build_pydantic, args.count), bytes_per_trade(build_slotted, args.count)
+    old_time, new_time = construct_seconds((build_pydantic, build_slotted), args.count)
+    memory_ratio, speed_ratio = old_bytes / new_bytes, old_time / new_time
+    print(f"{'':10}{'bytes/trade':>14}{'us/trade':>12}")
+    print(f"{'pydantic':10}{old_bytes:14.0f}{old_time * 1e6:12.2f}")
+    print(f"{'slotted':10}{new_bytes:14.0f}{new_time * 1e6:12.2f}")
+    print(f"{'ratio':10}{memory_ratio:13.1f}x{speed_ratio:11.1f}x")
+    if not args.check:
+        return 0
+    failed = False
+    if memory_ratio < MIN_MEMORY_RATIO:
+        print(f"FAIL memory {memory_ratio:.1f}x < {MIN_MEMORY_RATIO}x")
+        failed = True
+    if speed_ratio < MIN_SPEED_RATIO:
+        print(f"FAIL construction {speed_ratio:.1f}x < {MIN_SPEED_RATIO}x")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# priority classes, lower runs first
+ORDER = 0
+RESULT = 1
+BALANCE = 2
+MARKET = 3
+CLASS_NAMES = {ORDER: "order", RESULT: "result", BALANCE: "balance", MARKET: "market"}
+
+
+class RequestClass:
+    """Limits for one priority class.
+
+    rate/burst: token bucket, calls per second and the bucket size.
+    uses_slot: whether a call holds one of the gateway's shared in-flight
+    slots. Orders skip the slots so reads can never hold them back, and
+    result checks skip them because `check_win` waits for the trade to expire.
+    timeout: seconds for admission plus the call, None for no limit.
+    cancellable: whether a call that outlives the timeout is cancelled. Orders
+    are not: the broker may fill an order whose reply is slow, so once sent the
+    call is always seen through and the timeout only bounds admission.
+    """
+    __slots__ = ("priority", "rate", "burst", "uses_slot", "timeout", "cancellable", "tokens", "updated",
+                 "waiters", "calls", "coalesced", "timeouts", "errors", "max_wait")
+
+    def __init__(self, priority: int, rate: float, burst: float, uses_slot: bool, timeout: float | None,
+                 cancellable: bool = True):
+        self.priority = priority
+        self.rate = rate
+        self.burst = burst
+        self.uses_slot = uses_slot
+        self.timeout = timeout
+        self.cancellable = cancellable
+        self.tokens = burst
+        self.updated: float | None = None
+        self.waiters: deque[asyncio.Future] = deque()
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.max_wait = 0.0
+
+    def refill(self, now: float) -> None:
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+def default_classes() -> dict[int, RequestClass]:
+    return {
+        ORDER: RequestClass(ORDER, rate=10, burst=10, uses_slot=False, timeout=10, cancellable=False),
+        RESULT: RequestClass(RESULT, rate=20, burst=20, uses_slot=False, timeout=None),
+        BALANCE: RequestClass(BALANCE, rate=2, burst=4, uses_slot=True, timeout=10),
+        MARKET: RequestClass(MARKET, rate=5, burst=10, uses_slot=True, timeout=15),
+    }
+
+
+class BrokerGateway:
+    """Single point of access to the broker client.
+
+    Calls are admitted by priority class (order > result > balance > market),
+    each class is rate limited, identical reads already in flight are shared
+    instead of sent again, and every call is bounded by its class timeout
+    (an order only until it is sent: a sent order is always seen through).
+    Methods that are not scheduled (streams, reconnect, clock probes) pass
+    straight through to the client.
+    """
+
+    def __init__(self, client, max_in_flight: int = 4, classes: dict[int, RequestClass] | None = None):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.classes = classes or default_classes()
+        self.in_flight = 0
+        self._inflight_reads: dict[tuple, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    # admission
+    def _grant(self, klass: RequestClass) -> None:
+        klass.tokens -= 1
+        if klass.uses_slot:
+            self.in_flight += 1
+
+    def _can_start(self, klass: RequestClass) -> bool:
+        return klass.tokens >= 1 and (not klass.uses_slot or self.in_flight < self.max_in_flight)
+
+    def _wake(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = asyncio.get_running_loop().time()
+        next_token = None
+        for priority in sorted(self.classes):
+            klass = self.classes[priority]
+            klass.refill(now)
+            while klass.waiters and klass.waiters[0].done():
+                klass.waiters.popleft()
+            while klass.waiters and self._can_start(klass):
+                waiter = klass.waiters.popleft()
+                if waiter.done():
+                    continue
+                self._grant(klass)
+                waiter.set_result(None)
+            if klass.waiters and klass.tokens < 1:
+                wait = (1 - klass.tokens) / klass.rate
+                next_token = wait if next_token is None else min(next_token, wait)
+        if next_token is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_token, self._wake)
+
+    async def _acquire(self, klass: RequestClass) -> None:
+        loop = asyncio.get_running_loop()
+        klass.refill(loop.time())
+        # callers of a higher class never queue behind a lower one, equal classes keep FIFO order
+        if not klass.waiters and self._can_start(klass):
+            self._grant(klass)
+            return
+        waiter = loop.create_future()
+        klass.waiters.append(waiter)
+        self._wake()
+        started = loop.time()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # admitted just as we were cancelled, hand the slot back
+                self._release(klass)
+            raise
+        klass.max_wait = max(klass.max_wait, loop.time() - started)
+
+    def _release(self, klass: RequestClass) -> None:
+        if klass.uses_slot:
+            self.in_flight -= 1
+        self._wake()
+
+    async def _send(self, klass: RequestClass, method: str, args: tuple, kwargs: dict):
+        try:
+            return await getattr(self.client, method)(*args, **kwargs)
+        finally:
+            self._release(klass)
+
+    async def _run(self, klass: RequestClass, method: str, args: tuple, kwargs: dict):
+        await self._acquire(klass)
+        return await self._send(klass, method, args, kwargs)
+
+    async def _run_to_completion(self, klass: RequestClass, method: str, args: tuple, kwargs: dict):
+        # nothing has reached the broker while waiting for admission, so giving up there is safe
+        await asyncio.wait_for(self._acquire(klass), klass.timeout)
+        sent = asyncio.ensure_future(self._send(klass, method, args, kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(sent), klass.timeout)
+        except asyncio.TimeoutError:
+            klass.timeouts += 1
+            logger.warning(f"Broker call {method}{args}{kwargs} is taking over {klass.timeout}s, still waiting for its result")
+            return await asyncio.shield(sent)
+        except asyncio.CancelledError:
+            sent.add_done_callback(lambda done: self._orphaned(method, args, kwargs, done))
+            raise
+
+    def _orphaned(self, method: str, args: tuple, kwargs: dict, sent: asyncio.Future) -> None:
+        if sent.cancelled():
+            return
+        if sent.exception() is not None:
+            logger.error(f"Broker call {method}{args}{kwargs} failed after its caller gave up: {sent.exception()}")
+        else:
+            logger.error(f"Broker call {method}{args}{kwargs} completed after its caller gave up: {sent.result()}")
+
+    async def call(self, priority: int, method: str, *args, coalesce: bool = False, **kwargs):
+        klass = self.classes[priority]
+        klass.calls += 1
+        if coalesce:
+            key = (method, args, tuple(sorted(kwargs.items())))
+            shared = self._inflight_reads.get(key)
+            if shared is None:
+                shared = asyncio.ensure_future(self._timed(klass, method, args, kwargs))
+                self._inflight_reads[key] = shared
+                shared.add_done_callback(lambda _: self._inflight_reads.pop(key, None))
+            else:
+                klass.coalesced += 1
+            # one waiter giving up must not cancel the call for the others
+            return await asyncio.shield(shared)
+        return await self._timed(klass, method, args, kwargs)
+
+    async def _timed(self, klass: RequestClass, method: str, args: tuple, kwargs: dict):
+        try:
+            if klass.timeout is None:
+                return await self._run(klass, method, args, kwargs)
+            if not klass.cancellable:
+                return await self._run_to_completion(klass, method, args, kwargs)
+            return await asyncio.wait_for(self._run(klass, method, args, kwargs), klass.timeout)
+        except asyncio.TimeoutError:
+            klass.timeouts += 1
+            logger.error(f"Broker call {method}{args} timed out after {klass.timeout}s")
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            klass.errors += 1
+            raise
+
+    # scheduled client methods
+    async def buy(self, **order):
+        return await self.call(ORDER, "buy", **order)
+
+    async def sell(self, **order):
+        return await self.call(ORDER, "sell", **order)
+
+    async def check_win(self, trade_id: str):
+        return await self.call(RESULT, "check_win", trade_id, coalesce=True)
+
+    async def balance(self):
+        return await self.call(BALANCE, "balance", coalesce=True)
+
+    async def opened_deals(self):
+        return await self.call(BALANCE, "opened_deals", coalesce=True)
+
+    async def get_candles(self, asset: str, period: int, offset: int):
+        return await self.call(MARKET, "get_candles", asset, period, offset, coalesce=True)
+
+    async def payout(self, *args):
+        return await self.call(MARKET, "payout", *args, coalesce=True)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "classes": {CLASS_NAMES[p]: {
+                "calls": k.calls, "coalesced": k.coalesced, "timeouts": k.timeouts, "errors": k.errors,
+                "queued": sum(1 for w in k.waiters if not w.done()), "max_wait_ms": round(k.max_wait * 1000, 1),
+                "rate": k.rate, "burst": k.burst, "timeout": k.timeout, "cancellable": k.cancellable,
+            } for p, k in sorted(self.classes.items())},
+        }
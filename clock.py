@@ -0,0 +1,61 @@
+import asyncio
+import time
+from datetime import datetime, tzinfo
+
+
+class Clock:
+    """Wall clock read by the trading code.
+
+    Sleeping goes through the event loop as usual; replay swaps in a
+    VirtualClock whose event loop advances time instead of waiting.
+    """
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self, tz: tzinfo | None = None) -> datetime:
+        return datetime.fromtimestamp(self.time(), tz)
+
+
+class VirtualClock(Clock):
+    """Clock that only moves when the event loop would otherwise wait.
+
+    Run coroutines on `new_event_loop()`: whenever every task is waiting on
+    a timer, the loop jumps straight to the next one, so `asyncio.sleep(300)`
+    returns at once and `time()` reads 300 seconds later. Results depend only
+    on the order of events, not on how fast the host is.
+    """
+
+    def __init__(self, start: float):
+        self.start = start
+        self.elapsed = 0.0
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+    def advance(self, seconds: float) -> None:
+        self.elapsed += seconds
+
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        return _VirtualTimeLoop(self)
+
+
+class _VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self._virtual_clock = clock
+        select = self._selector.select  # type: ignore
+
+        def virtual_select(timeout=None):
+            # None means nothing is scheduled, so only real I/O can wake the loop
+            if timeout is None or timeout <= 0:
+                return select(timeout)
+            events = select(0)
+            if not events:
+                clock.advance(timeout)
+            return events
+
+        self._selector.select = virtual_select  # type: ignore
+
+    def time(self) -> float:
+        return self._virtual_clock.elapsed
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# intended-vs-actual open histogram covers -MAX..+MAX whole seconds, with overflow buckets on both sides
+MAX_ERROR_SECONDS = 5
+
+
+class ClockSync:
+    """Estimate the broker clock offset and round-trip time.
+
+    Samples come from `get_server_time` probes and from every order (the time
+    we sent it, the time the reply arrived and the broker's openTime). Broker
+    timestamps are truncated to whole seconds, so each sample only bounds the
+    offset to a one-second interval; intersecting the intervals of recent
+    samples narrows it down. If they stop overlapping (drift, an asymmetric
+    round trip) the median bounds are used instead.
+
+    offset = broker clock - local clock, in seconds.
+    """
+
+    def __init__(self, window: int = 50, probe_interval: float = 60.0):
+        self.probe_interval = probe_interval
+        self.bounds: deque[tuple[float, float]] = deque(maxlen=window)
+        self.rtts: deque[float] = deque(maxlen=window)
+        self.errors: dict[int, int] = {}
+        self.entries = 0
+        self._task: asyncio.Task | None = None
+
+    def offset_bounds(self) -> tuple[float, float]:
+        if not self.bounds:
+            return 0.0, 0.0
+        low = max(b[0] for b in self.bounds)
+        high = min(b[1] for b in self.bounds)
+        if low > high:
+            low = statistics.median(b[0] for b in self.bounds)
+            high = statistics.median(b[1] for b in self.bounds)
+        return low, high
+
+    @property
+    def offset(self) -> float:
+        low, high = self.offset_bounds()
+        return (low + high) / 2
+
+    @property
+    def rtt(self) -> float:
+        return statistics.median(self.rtts) if self.rtts else 0.0
+
+    def observe(self, sent_at: float, received_at: float, broker_ts: float) -> None:
+        """Add a sample from a request sent at `sent_at` that the broker stamped `broker_ts`."""
+        rtt = received_at - sent_at
+        if rtt < 0:
+            return
+        self.rtts.append(rtt)
+        # assume the broker stamped the request halfway through the round trip
+        stamped_at = sent_at + rtt / 2
+        self.bounds.append((broker_ts - stamped_at, broker_ts + 1 - stamped_at))
+
+    def fire_at(self, target_ts: float) -> float:
+        """Local timestamp at which to send so the order reaches the broker at `target_ts` broker time.
+
+        Uses the low end of the offset interval, so the order is never early
+        and at most the width of the interval late.
+        """
+        return target_ts - self.offset_bounds()[0] - self.rtt / 2
+
+    def record_entry(self, intended_ts: float, opened_ts: float) -> int:
+        """Record how many seconds the broker open second is from the intended entry second."""
+        error = int(opened_ts // 1 - intended_ts // 1)
+        bucket = max(-MAX_ERROR_SECONDS - 1, min(MAX_ERROR_SECONDS + 1, error))
+        self.errors[bucket] = self.errors.get(bucket, 0) + 1
+        self.entries += 1
+        return error
+
+    async def probe(self, api) -> bool:
+        get_server_time = getattr(api, "get_server_time", None)
+        if get_server_time is None:
+            return False
+        sent_at = time.time()
+        server_time = await get_server_time()
+        self.observe(sent_at, time.time(), float(server_time))
+        return True
+
+    async def run(self, api) -> None:
+        while True:
+            try:
+                if not await self.probe(api):
+                    logger.info("Broker client has no get_server_time, calibrating from order open times only")
+                    return
+                logger.debug(f"Clock offset {self.offset * 1000:+.0f} ms, rtt {self.rtt * 1000:.0f} ms")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Clock probe failed: {e}")
+            await asyncio.sleep(self.probe_interval)
+
+    def start(self, api) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(api))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> dict:
+        labels = {-MAX_ERROR_SECONDS - 1: f"<-{MAX_ERROR_SECONDS}s", MAX_ERROR_SECONDS + 1: f">+{MAX_ERROR_SECONDS}s"}
+        histogram = {labels.get(b, f"{b:+d}s"): self.errors.get(b, 0)
+                     for b in range(-MAX_ERROR_SECONDS - 1, MAX_ERROR_SECONDS + 2)}
+        return {
+            "offset_ms": round(self.offset * 1000, 1),
+            "rtt_ms": round(self.rtt * 1000, 1),
+            "offset_uncertainty_ms": round((lambda b: b[1] - b[0])(self.offset_bounds()) * 1000, 1),
+            "samples": len(self.bounds),
+            "entries": self.entries,
+            "on_time": round(self.errors.get(0, 0) / self.entries, 4) if self.entries else None,
+            "open_time_error": histogram,
+        }
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+class LayeredConfig:
+    """Build a pydantic settings model from layered sources.
+
+    Later layers win: model defaults, then the JSON file at `path`, then
+    environment variables named `<env_prefix><FIELD>` (e.g. PO_RISK_INITIAL_AMOUNT),
+    then overrides set through the API. The file is polled for changes; a
+    new model is only published once the merged values validate, so a bad
+    edit keeps the previous settings in place.
+    """
+
+    def __init__(self, model: type[BaseModel], path: str, env_prefix: str,
+                 on_change: Callable[[BaseModel], None] | None = None, poll_interval: float = 1.0):
+        self.model = model
+        self.path = path
+        self.env_prefix = env_prefix
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.file_values: dict[str, Any] = {}
+        self.api_values: dict[str, Any] = {}
+        self._mtime: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def env_values(self) -> dict[str, Any]:
+        values = {}
+        for name in self.model.model_fields:
+            raw = os.getenv(f"{self.env_prefix}{name.upper()}")
+            if raw is not None and raw != "":
+                values[name] = raw
+        return values
+
+    def _read_file(self) -> dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{self.path} must contain a JSON object")
+        unknown = set(data) - set(self.model.model_fields)
+        if unknown:
+            logger.warning(f"Ignoring unknown config keys in {self.path}: {sorted(unknown)}")
+        return {k: v for k, v in data.items() if k in self.model.model_fields}
+
+    def _file_mtime(self) -> float | None:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def build(self) -> BaseModel:
+        return self.model(**(self.file_values | self.env_values() | self.api_values))
+
+    def load(self) -> BaseModel:
+        """Read every layer and publish the result. Raises if the merged values are invalid.
+
+        Nothing is kept from a file that fails to read or validate, and its
+        mtime is not recorded, so the watcher tries it again.
+        """
+        mtime = self._file_mtime()
+        file_values = self._read_file()
+        settings = self.model(**(file_values | self.env_values() | self.api_values))
+        self.file_values = file_values
+        self._mtime = mtime
+        return self._publish(settings)
+
+    def set_overrides(self, values: dict[str, Any]) -> BaseModel:
+        merged = self.api_values | values
+        settings = self.model(**(self.file_values | self.env_values() | merged))
+        self.api_values = merged
+        return self._publish(settings)
+
+    def reload(self) -> BaseModel | None:
+        self._mtime = self._file_mtime()
+        try:
+            file_values = self._read_file()
+            settings = self.model(**(file_values | self.env_values() | self.api_values))
+        except (OSError, ValueError, ValidationError) as e:
+            logger.error(f"Config reload from {self.path} failed, keeping current settings: {e}")
+            return None
+        self.file_values = file_values
+        logger.info(f"Config reloaded from {self.path}")
+        return self._publish(settings)
+
+    def _publish(self, settings: BaseModel) -> BaseModel:
+        if self.on_change is not None:
+            self.on_change(settings)
+        return settings
+
+    def sources(self) -> dict[str, dict[str, Any]]:
+        return {"file": dict(self.file_values), "env": self.env_values(), "api": dict(self.api_values)}
+
+    async def watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._file_mtime() != self._mtime:
+                self.reload()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.watch())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,162 @@
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable
+
+from consolidation import side
+
+logger = logging.getLogger(__name__)
+
+# Netting rules
+ALLOW = "allow"
+SKIP_BOTH = "skip_both"
+KEEP_RANKED = "keep_ranked"
+NET = "net"
+
+# Rejection reason code returned to webhook callers
+OPPOSING_SIGNAL = "OPPOSING_SIGNAL"
+
+MAX_RESOLVED = 200
+
+
+class PendingSignal:
+    """A scheduled signal that has not sent its order yet."""
+    __slots__ = ("signal_id", "provider", "asset", "side", "slot", "amount", "reduction")
+
+    def __init__(self, signal_id: str, provider: str, asset: str, direction: str, slot: int, amount: float):
+        self.signal_id = signal_id
+        self.provider = provider
+        self.asset = asset
+        self.side = side(direction)
+        self.slot = slot
+        self.amount = amount
+        # netted away by opposing signals, taken off the order when it is sent
+        self.reduction = 0.0
+
+    @property
+    def net_amount(self) -> float:
+        return round(self.amount - self.reduction, 2)
+
+    def describe(self) -> dict:
+        return {"signal_id": self.signal_id, "provider": self.provider, "side": self.side, "amount": self.net_amount}
+
+
+class Resolution:
+    __slots__ = ("accept", "cancel")
+
+    def __init__(self, accept: bool, cancel: list[str]):
+        # whether the incoming signal goes ahead, and the pending signal ids to cancel
+        self.accept = accept
+        self.cancel = cancel
+
+
+class ConflictIndex:
+    """Pending signals by asset and entry slot, so an opposing signal is found on arrival.
+
+    `check` looks up the other side of the incoming signal's (asset, slot)
+    and applies the rule: SKIP_BOTH cancels the pending side and rejects
+    the new signal; KEEP_RANKED keeps whichever side has the higher
+    provider score (the pending side on a tie); NET takes the smaller side
+    off the larger one, cancelling both when they are equal. Signals leave
+    the index when their order is sent, so only positions that have not
+    been opened yet are netted.
+    """
+
+    def __init__(self, now: Callable[[], float] = time.time):
+        self.now = now
+        # (asset, slot) -> side -> signal id -> pending signal
+        self.slots: dict[tuple[str, int], dict[str, dict[str, PendingSignal]]] = {}
+        self._by_id: dict[str, PendingSignal] = {}
+        self.counts: dict[str, int] = {}
+        self.resolved: deque[dict] = deque(maxlen=MAX_RESOLVED)
+
+    @staticmethod
+    def slot(entry_time: datetime, window: int = 60) -> int:
+        return int(entry_time.timestamp() // max(1, window))
+
+    def add(self, pending: PendingSignal) -> None:
+        self.slots.setdefault((pending.asset, pending.slot), {}).setdefault(pending.side, {})[pending.signal_id] = pending
+        self._by_id[pending.signal_id] = pending
+
+    def grow(self, signal_id: str, amount: float, reduction: float = 0.0) -> None:
+        """A signal (netted by `reduction`) was merged into this one's order."""
+        pending = self._by_id.get(signal_id)
+        if pending is not None:
+            pending.amount += amount
+            pending.reduction += reduction
+
+    def remove(self, signal_id: str) -> PendingSignal | None:
+        pending = self._by_id.pop(signal_id, None)
+        if pending is None:
+            return None
+        key = (pending.asset, pending.slot)
+        sides = self.slots.get(key)
+        if sides is not None:
+            entries = sides.get(pending.side)
+            if entries is not None:
+                entries.pop(signal_id, None)
+                if not entries:
+                    del sides[pending.side]
+            if not sides:
+                del self.slots[key]
+        return pending
+
+    def opposing(self, pending: PendingSignal) -> list[PendingSignal]:
+        sides = self.slots.get((pending.asset, pending.slot))
+        if not sides:
+            return []
+        return list(sides.get("PUT" if pending.side == "CALL" else "CALL", {}).values())
+
+    def check(self, incoming: PendingSignal, rule: str, score: Callable[[str], float]) -> Resolution:
+        """Resolve `incoming` against pending opposing signals; the caller cancels the returned ids."""
+        opposing = self.opposing(incoming) if rule != ALLOW else []
+        if not opposing:
+            return Resolution(True, [])
+        if rule == SKIP_BOTH:
+            resolution = Resolution(False, [p.signal_id for p in opposing])
+        elif rule == KEEP_RANKED:
+            best = max(score(p.provider) for p in opposing)
+            if score(incoming.provider) > best:
+                resolution = Resolution(True, [p.signal_id for p in opposing])
+            else:
+                resolution = Resolution(False, [])
+        elif rule == NET:
+            against = round(sum(p.net_amount for p in opposing), 2)
+            if incoming.net_amount > against:
+                incoming.reduction += against
+                resolution = Resolution(True, [p.signal_id for p in opposing])
+            else:
+                # take the incoming stake off the pending side, oldest first; cancel what is netted to zero
+                left, cancel = incoming.net_amount, []
+                for p in opposing:
+                    take = min(left, p.net_amount)
+                    p.reduction += take
+                    left = round(left - take, 2)
+                    if p.net_amount <= 0:
+                        cancel.append(p.signal_id)
+                    if left <= 0:
+                        break
+                resolution = Resolution(False, cancel)
+        else:
+            raise ValueError(f"Unknown conflict rule '{rule}'")
+        for signal_id in resolution.cancel:
+            self.remove(signal_id)
+        if rule == NET:
+            outcome = "netted"
+        else:
+            outcome = "kept_new" if resolution.accept else ("skipped_both" if resolution.cancel else "kept_pending")
+        self.counts[f"{rule}:{outcome}"] = self.counts.get(f"{rule}:{outcome}", 0) + 1
+        self.resolved.append({
+            "at": self.now(), "asset": incoming.asset, "slot": incoming.slot, "rule": rule, "outcome": outcome,
+            "incoming": incoming.describe(), "opposing": [p.describe() for p in opposing], "cancelled": list(resolution.cancel),
+        })
+        logger.warning(f"Opposing signals on {incoming.asset}: {rule} -> {outcome} (incoming {incoming.signal_id}, cancelled {resolution.cancel})")
+        return resolution
+
+    def snapshot(self, limit: int = 50) -> dict:
+        return {
+            "pending": len(self._by_id),
+            "counts": dict(sorted(self.counts.items())),
+            "resolved": list(self.resolved)[-limit:][::-1] if limit > 0 else [],
+        }
@@ -0,0 +1,128 @@
+import logging
+from datetime import datetime
+from typing import Callable
+
+from orders import CALL_DIRECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Merge policies
+SEPARATE = "separate"
+COMBINED = "combined"
+WEIGHTED = "weighted"
+POLICIES = (SEPARATE, COMBINED, WEIGHTED)
+
+
+def side(direction: str) -> str:
+    """BUY and CALL (SELL and PUT) are the same order."""
+    return "CALL" if direction.upper() in CALL_DIRECTIONS else "PUT"
+
+
+class SignalGroup:
+    """Signals for one asset, side and entry slot that share a single order."""
+    __slots__ = ("key", "leader", "signal_ids", "providers", "amounts", "contributions", "fired")
+
+    def __init__(self, key: tuple, signal_id: str, provider: str, amount: float):
+        self.key = key
+        self.leader = signal_id
+        self.signal_ids = [signal_id]
+        self.providers = [provider]
+        self.amounts = [amount]
+        # what each member put into the order, fixed when the order is sent
+        self.contributions = [amount]
+        self.fired = False
+
+    def add(self, signal_id: str, provider: str, amount: float) -> None:
+        self.signal_ids.append(signal_id)
+        self.providers.append(provider)
+        self.amounts.append(amount)
+
+    def __len__(self) -> int:
+        return len(self.signal_ids)
+
+    @property
+    def amount(self) -> float:
+        return round(sum(self.contributions), 2)
+
+    def shares(self) -> list[tuple[str, str, float]]:
+        """(signal id, provider, fraction of the order) for every member."""
+        total = sum(self.contributions)
+        return [(signal_id, provider, contribution / total if total else 1 / len(self))
+                for signal_id, provider, contribution in zip(self.signal_ids, self.providers, self.contributions)]
+
+
+class SignalConsolidator:
+    """Merge correlated signals into one order and one martingale chain.
+
+    Signals are grouped by asset, side and entry slot (`window` seconds, the
+    entry minute by default). The first signal of a group schedules the
+    trade; later ones join the group until the leader fires, at which point
+    the group is closed and the order amount is taken from its members:
+    the sum of their amounts (COMBINED) or each amount scaled by its
+    provider's score (WEIGHTED). The sequence result is shared among the
+    members in proportion to what each contributed.
+    """
+
+    def __init__(self):
+        # (asset, side, slot) -> group still waiting for its entry time
+        self.pending: dict[tuple, SignalGroup] = {}
+        # leader signal id -> group, until the sequence ends
+        self.groups: dict[str, SignalGroup] = {}
+        self.merged = 0
+        self.orders_saved = 0
+
+    @staticmethod
+    def key(asset: str, direction: str, entry_time: datetime, window: int = 60) -> tuple:
+        return (asset, side(direction), int(entry_time.timestamp() // max(1, window)))
+
+    def add(self, signal_id: str, provider: str, asset: str, direction: str, entry_time: datetime,
+            amount: float, window: int = 60) -> tuple[SignalGroup, bool]:
+        """Group a signal; returns the group and whether this signal leads it (and must be traded)."""
+        key = self.key(asset, direction, entry_time, window)
+        group = self.pending.get(key)
+        if group is not None:
+            group.add(signal_id, provider, amount)
+            self.merged += 1
+            logger.info(f"Signal {signal_id} merged into {group.leader} ({len(group)} signals)")
+            return group, False
+        group = self.pending[key] = self.groups[signal_id] = SignalGroup(key, signal_id, provider, amount)
+        return group, True
+
+    def fire(self, leader: str, policy: str, score: Callable[[str], float]) -> SignalGroup | None:
+        """Close the group to new members just before its order is sent and fix each member's contribution."""
+        group = self.groups.get(leader)
+        if group is None or group.fired:
+            return group
+        group.fired = True
+        if self.pending.get(group.key) is group:
+            del self.pending[group.key]
+        if policy == WEIGHTED:
+            group.contributions = [amount * score(provider) for provider, amount in zip(group.providers, group.amounts)]
+        else:
+            group.contributions = list(group.amounts)
+        self.orders_saved += len(group) - 1
+        return group
+
+    def restore(self, leader: str, signal_ids: list[str], providers: list[str], contributions: list[float]) -> SignalGroup:
+        """Rebuild a group whose order was already sent, e.g. when resuming a handed-off sequence."""
+        # a sent group is no longer pending, so it needs no slot key
+        group = SignalGroup((), leader, providers[0], contributions[0])
+        group.signal_ids, group.providers = list(signal_ids), list(providers)
+        group.amounts, group.contributions = list(contributions), list(contributions)
+        group.fired = True
+        self.groups[leader] = group
+        return group
+
+    def done(self, leader: str) -> SignalGroup | None:
+        group = self.groups.pop(leader, None)
+        if group is not None and self.pending.get(group.key) is group:
+            del self.pending[group.key]
+        return group
+
+    def snapshot(self) -> dict:
+        return {
+            "pending_groups": sum(1 for g in self.pending.values() if len(g) > 1),
+            "open_groups": sum(1 for g in self.groups.values() if len(g) > 1),
+            "merged_signals": self.merged,
+            "orders_saved": self.orders_saved,
+        }
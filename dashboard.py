@@ -0,0 +1,65 @@
+import logging
+import uuid
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("account", "signals", "open_trades", "closed_trades", "risk")
+# removed rows remembered for diffs; a client further behind gets the full state
+MAX_REMOVED = 500
+
+
+class DashboardFeed:
+    """Versioned dashboard rows, so the UI only fetches and patches what changed.
+
+    Every `update` compares a section's rows with the last ones by key; a
+    row that is new, changed or gone gets the next version. `diff(epoch,
+    since)` returns the rows changed after `since` and the keys removed
+    since then. The epoch is random per process: a client that saw another
+    worker or a previous process, or is further behind than the removals
+    remembered, gets the full state instead.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        # section -> key -> (version, row)
+        self.rows: dict[str, dict[str, tuple[int, Any]]] = {name: {} for name in SECTIONS}
+        # (version, section, key), oldest first
+        self.removed: list[tuple[int, str, str]] = []
+        # versions before this are no longer covered by `removed`
+        self.horizon = 0
+
+    def update(self, section: str, rows: dict[str, Any]) -> None:
+        """Replace a section's rows; unchanged rows keep their version."""
+        current = self.rows[section]
+        for key, row in rows.items():
+            old = current.get(key)
+            if old is None or old[1] != row:
+                self.version += 1
+                current[key] = (self.version, row)
+        for key in [key for key in current if key not in rows]:
+            self.version += 1
+            del current[key]
+            self.removed.append((self.version, section, key))
+        if len(self.removed) > MAX_REMOVED:
+            drop = len(self.removed) - MAX_REMOVED
+            self.horizon = self.removed[drop - 1][0]
+            del self.removed[:drop]
+
+    def diff(self, epoch: str | None, since: int = 0) -> dict:
+        full = epoch != self.epoch or since < self.horizon or since > self.version
+        if full:
+            since = 0
+        elif since == self.version:
+            return {"epoch": self.epoch, "version": self.version, "changed": False}
+        sections = {}
+        for name, current in self.rows.items():
+            upsert = {key: row for key, (version, row) in current.items() if version > since}
+            remove = [key for version, section, key in self.removed if section == name and version > since] if not full else []
+            if upsert or remove or full:
+                sections[name] = {"upsert": upsert, "remove": remove}
+        return {"epoch": self.epoch, "version": self.version, "changed": True, "full": full, "sections": sections}
+
+    def stats(self) -> dict:
+        return {"epoch": self.epoch, "version": self.version, "rows": {name: len(rows) for name, rows in self.rows.items()}}
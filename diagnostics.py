@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the lag histogram buckets, in milliseconds; the last bucket is open ended
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _thread_stack(thread_id: int) -> list[str] | None:
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    return traceback.format_stack(frame)
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes a sleeping task.
+
+    A task sleeps `interval` seconds and records how much later than that it
+    resumed. A watchdog thread watches the task's heartbeat; when the loop has
+    been stuck for more than `threshold` seconds it logs the loop thread's
+    stack, taken while the blocking code is still running.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.samples = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def record(self, lag: float) -> None:
+        self.buckets[bisect_left(LAG_BUCKETS_MS, lag * 1000)] += 1
+        self.samples += 1
+        self.total_lag += lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._heartbeat = time.monotonic()
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - started - self.interval))
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled <= self.threshold or heartbeat == reported or self._loop_thread is None:
+                continue
+            # one warning per stall
+            reported = heartbeat
+            self.stalls += 1
+            stack = _thread_stack(self._loop_thread)
+            logger.warning(f"Event loop blocked for {stalled * 1000:.0f} ms, loop thread stack:\n{''.join(stack or ['<unavailable>'])}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop_thread = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._task = asyncio.create_task(self._measure())
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop_lag_watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound}ms" for bound in LAG_BUCKETS_MS] + [f">{LAG_BUCKETS_MS[-1]}ms"]
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "samples": self.samples,
+            "mean_ms": round(self.total_lag / self.samples * 1000, 3) if self.samples else 0.0,
+            "max_ms": round(self.max_lag * 1000, 3),
+            "stalls": self.stalls,
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class SamplingProfiler:
+    """Sample the stacks of every thread from a background thread.
+
+    Samples are aggregated as collapsed stacks ("outer;inner;leaf count"),
+    the input format of flamegraph.pl and speedscope. The profiled code is
+    never instrumented, so it can run against production load.
+    """
+
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _sample(self, own_id: int) -> None:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+
+    def _run(self, seconds: float, interval: float) -> None:
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self._stop.wait(interval):
+            self._sample(own_id)
+        self.finished_at = time.time()
+        logger.info(f"Profiler finished with {self.samples} samples")
+
+    def start(self, seconds: float, interval: float = 0.005) -> None:
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(seconds, interval), name="sampling_profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def status(self) -> dict:
+        return {"running": self.running, "samples": self.samples, "started_at": self.started_at,
+                "finished_at": self.finished_at, "unique_stacks": len(self.stacks)}
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -0,0 +1,178 @@
+import logging
+import math
+from collections import deque
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Decisions
+ENTER = "ENTER"
+LATE_ENTER = "LATE_ENTER"
+SHIFT = "SHIFT"
+DROP = "DROP"
+
+# lateness buckets (upper bounds in seconds) used for acceptance and outcome stats
+LATENESS_BUCKETS = ((0.0, "on_time"), (1.0, "0-1s"), (2.0, "1-2s"), (5.0, "2-5s"), (10.0, "5-10s"), (60.0, "10-60s"), (math.inf, ">60s"))
+# a shifted entry needs at least this long to arm and send the order
+MIN_SHIFT_LEAD = 1.0
+# outcomes needed in a lateness bucket before its win rate can veto late entries
+MIN_OUTCOMES = 20
+# lead times recorded for a provider before its usual lateness can veto a shift
+MIN_LEADS = 20
+
+
+def lateness_bucket(late: float) -> str:
+    for bound, label in LATENESS_BUCKETS:
+        if late <= bound:
+            return label
+    return LATENESS_BUCKETS[-1][1]
+
+
+def entry_deadline(target: datetime, settings) -> datetime:
+    """Latest arrival time at which `decide` can still do something other than DROP."""
+    grace = settings.late_entry_seconds
+    if settings.shift_to_next_candle:
+        # the next boundary must be at least MIN_SHIFT_LEAD away and within max_shift_seconds of the target
+        grace = max(grace, settings.max_shift_seconds - MIN_SHIFT_LEAD)
+    return target + timedelta(seconds=grace)
+
+
+class EntryDecision:
+    __slots__ = ("action", "entry_time", "lead", "late", "bucket")
+
+    def __init__(self, action: str, entry_time: datetime, lead: float):
+        self.action = action
+        self.entry_time = entry_time
+        # seconds from receipt to the intended entry, negative when the signal arrived late
+        self.lead = lead
+        self.late = max(0.0, -lead)
+        self.bucket = lateness_bucket(self.late)
+
+    def __repr__(self) -> str:
+        return f"EntryDecision({self.action}, late {self.late:.2f}s, entry {self.entry_time.isoformat()})"
+
+
+class _Outcomes:
+    __slots__ = ("decisions", "wins", "losses", "pnl")
+
+    def __init__(self):
+        self.decisions = 0
+        self.wins = 0
+        self.losses = 0
+        self.pnl = 0.0
+
+    def snapshot(self) -> dict:
+        closed = self.wins + self.losses
+        return {"decisions": self.decisions, "wins": self.wins, "losses": self.losses,
+                "win_rate": round(self.wins / closed, 4) if closed else None, "pnl": round(self.pnl, 2)}
+
+
+class EntryPolicy:
+    """Decide what to do with a signal given how late it arrived.
+
+    ENTER when it arrives before its entry time, LATE_ENTER when it is late by
+    no more than `late_entry_seconds`, SHIFT to the next `entry_candle_seconds`
+    boundary when enabled and no more than `max_shift_seconds` after the
+    intended entry, otherwise DROP. With `late_entry_min_win_rate` set, a
+    provider's lateness bucket that has lost too often falls through to
+    SHIFT/DROP. With `shift_lateness_percentile` set, a signal is only
+    shifted if it is no later than that percentile of its provider's recorded
+    lateness; anything later is unusual for the provider (a stuck or
+    re-delivered notification) and is dropped.
+
+    Every decision is counted per provider, action and lateness bucket, and
+    the sequence outcome is attached when it closes. Each provider's
+    receipt-to-entry lead time is kept as a distribution.
+    """
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self.leads: dict[str, deque[float]] = {}
+        self.outcomes: dict[tuple[str, str, str], _Outcomes] = {}
+        # signal id -> (provider, action, bucket) until the sequence closes
+        self._open: dict[str, tuple[str, str, str]] = {}
+
+    def _late_window_vetoed(self, provider: str, bucket: str, min_win_rate: float) -> bool:
+        if not min_win_rate:
+            return False
+        stats = self.outcomes.get((provider, LATE_ENTER, bucket))
+        if stats is None or stats.wins + stats.losses < MIN_OUTCOMES:
+            return False
+        return stats.wins / (stats.wins + stats.losses) < min_win_rate
+
+    def usual_lateness(self, provider: str, percentile: float) -> float | None:
+        """Lateness in seconds that `percentile` of the provider's signals do not exceed, None until MIN_LEADS are recorded."""
+        leads = self.leads.get(provider, ())
+        if len(leads) < MIN_LEADS:
+            return None
+        lateness = sorted(-lead for lead in leads)
+        return lateness[min(len(lateness) - 1, int(len(lateness) * percentile))]
+
+    def _shift_vetoed(self, provider: str, late: float, percentile: float) -> bool:
+        if not percentile:
+            return False
+        usual = self.usual_lateness(provider, percentile)
+        return usual is not None and late > usual
+
+    def decide(self, provider: str, target: datetime, now: datetime, settings) -> EntryDecision:
+        lead = (target - now).total_seconds()
+        if lead >= 0:
+            return EntryDecision(ENTER, target, lead)
+        late = -lead
+        if late <= settings.late_entry_seconds and not self._late_window_vetoed(provider, lateness_bucket(late), settings.late_entry_min_win_rate):
+            return EntryDecision(LATE_ENTER, target, lead)
+        if settings.shift_to_next_candle and not self._shift_vetoed(provider, late, settings.shift_lateness_percentile):
+            step = settings.entry_candle_seconds
+            next_boundary = math.ceil((now.timestamp() + MIN_SHIFT_LEAD) / step) * step
+            if next_boundary - target.timestamp() <= settings.max_shift_seconds:
+                return EntryDecision(SHIFT, datetime.fromtimestamp(next_boundary, target.tzinfo), lead)
+        return EntryDecision(DROP, target, lead)
+
+    def record(self, signal_id: str, provider: str, decision: EntryDecision) -> None:
+        self.leads.setdefault(provider, deque(maxlen=self.window)).append(decision.lead)
+        key = (provider, decision.action, decision.bucket)
+        stats = self.outcomes.get(key)
+        if stats is None:
+            stats = self.outcomes[key] = _Outcomes()
+        stats.decisions += 1
+        if decision.action != DROP:
+            self._open[signal_id] = key
+
+    def record_outcome(self, signal_id: str, won: bool, pnl: float) -> None:
+        key = self._open.pop(signal_id, None)
+        if key is None:
+            return
+        stats = self.outcomes[key]
+        if won:
+            stats.wins += 1
+        else:
+            stats.losses += 1
+        stats.pnl += pnl
+
+    def forget(self, signal_id: str) -> None:
+        """The signal was accepted here but rejected later, so no outcome will arrive."""
+        self._open.pop(signal_id, None)
+
+    def lead_distribution(self, provider: str) -> dict:
+        leads = sorted(self.leads.get(provider, ()))
+        if not leads:
+            return {"samples": 0}
+
+        def pct(p: float) -> float:
+            return round(leads[min(len(leads) - 1, int(len(leads) * p))], 3)
+
+        return {"samples": len(leads), "late_share": round(sum(1 for v in leads if v < 0) / len(leads), 4),
+                "p01": pct(0.01), "p10": pct(0.10), "p50": pct(0.50), "p90": pct(0.90)}
+
+    def snapshot(self) -> dict:
+        providers: dict[str, dict] = {}
+        for (provider, action, bucket), stats in sorted(self.outcomes.items()):
+            entry = providers.setdefault(provider, {"lead_seconds": self.lead_distribution(provider), "decisions": {}})
+            entry["decisions"].setdefault(action, {})[bucket] = stats.snapshot()
+        for provider in self.leads:
+            providers.setdefault(provider, {"lead_seconds": self.lead_distribution(provider), "decisions": {}})
+        for entry in providers.values():
+            total = sum(s["decisions"] for buckets in entry["decisions"].values() for s in buckets.values())
+            dropped = sum(s["decisions"] for s in entry["decisions"].get(DROP, {}).values())
+            entry["acceptance_rate"] = round(1 - dropped / total, 4) if total else None
+        return providers
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from dataclasses import asdict
+from datetime import UTC, datetime
+from typing import Callable
+
+from models import Signal, SignalFields, Trade, TradeFields
+
+logger = logging.getLogger(__name__)
+
+# Handoff item kinds
+PENDING = "pending"  # signal still waiting for its entry time
+LEG = "leg"          # open martingale leg waiting for its result
+RAW = "raw"          # webhook body queued before the broker connected
+RECONCILE = "reconcile"  # order still in flight when the drain timed out, looked up among the broker's open deals
+
+# an in-flight order's deal may carry an open time this much before the send, by clock offset
+DEAL_SKEW_SECONDS = 5.0
+
+_DATETIME_FIELDS = ("entry_time", "signal_time")
+
+
+class Drain:
+    """Shutdown coordination for in-flight trades.
+
+    A sequence is at a safe point whenever it is waiting: for its entry
+    time, or for the result of an open leg. The only unsafe window is an
+    order in flight, between sending it and recording the broker's trade
+    id; callers mark it with `enter`/`leave`. Once `start` is called no
+    new signal is accepted, and `wait_idle` returns when no order is in
+    flight, so every sequence can be cancelled and described in a handoff
+    that the next process resumes. Orders still in flight when the wait
+    times out are described by the callable given to `enter`, so the next
+    process can look them up at the broker.
+    """
+
+    def __init__(self):
+        self.draining = False
+        # signal ids with an order in flight -> describes the order for reconciliation
+        self.busy: dict[str, Callable[[], dict] | None] = {}
+        self._idle: asyncio.Event | None = None
+
+    def start(self) -> None:
+        self.draining = True
+
+    def enter(self, signal_id: str, describe: Callable[[], dict] | None = None) -> None:
+        self.busy[signal_id] = describe
+
+    def leave(self, signal_id: str) -> None:
+        self.busy.pop(signal_id, None)
+        if not self.busy and self._idle is not None:
+            self._idle.set()
+
+    def in_flight(self) -> list[dict]:
+        """Reconciliation payloads of the orders still in flight."""
+        payloads = []
+        for signal_id, describe in self.busy.items():
+            if describe is None:
+                logger.error(f"Order in flight for {signal_id} cannot be described, check it at the broker")
+                continue
+            payloads.append(describe())
+        return payloads
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no order is in flight; False if orders were still in flight after `timeout`."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.busy:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            self._idle = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return not self.busy
+        return True
+
+
+def _encode(fields) -> dict:
+    data = asdict(fields)
+    for name in _DATETIME_FIELDS:
+        if isinstance(data.get(name), datetime):
+            data[name] = data[name].isoformat()
+    return data
+
+
+def _decode(data: dict) -> dict:
+    data = dict(data)
+    for name in _DATETIME_FIELDS:
+        if isinstance(data.get(name), str):
+            data[name] = datetime.fromisoformat(data[name])
+    return data
+
+
+def signal_payload(signal_id: str, fields: SignalFields) -> dict:
+    return {"signal_id": signal_id, "signal": _encode(fields)}
+
+
+def decode_signal(payload: dict) -> Signal:
+    return Signal(signal_id=payload["signal_id"], signal_details=SignalFields(**_decode(payload["signal"])))
+
+
+def leg_payload(trade_id: str, details: TradeFields, signal: SignalFields | None, group=None) -> dict:
+    payload = {"trade_id": trade_id, "trade": _encode(details), "signal": _encode(signal) if signal is not None else None}
+    if group is not None and len(group) > 1:
+        payload["group"] = {"signal_ids": list(group.signal_ids), "providers": list(group.providers),
+                            "contributions": list(group.contributions)}
+    return payload
+
+
+def decode_leg(payload: dict) -> tuple[Trade, SignalFields | None, dict | None]:
+    trade = Trade(trade_id=payload["trade_id"], trade_details=TradeFields(**_decode(payload["trade"])))
+    signal = SignalFields(**_decode(payload["signal"])) if payload.get("signal") else None
+    return trade, signal, payload.get("group")
+
+
+def reconcile_payload(details: TradeFields, signal: SignalFields | None, group, sent_at: float) -> dict:
+    """An order in flight: the leg it opens (broker fields filled in once found) and when it was sent."""
+    payload = leg_payload("", details, signal, group)
+    payload["sent_at"] = sent_at
+    return payload
+
+
+def deal_opened(deal: dict) -> datetime | None:
+    """A broker deal's open time as naive UTC, like the order replies."""
+    value = deal.get("openTime")
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, UTC).replace(tzinfo=None)
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+    return None
+
+
+def match_deal(deals, details: TradeFields, sent_at: float, known: set[str]) -> dict | None:
+    """The open deal an in-flight order became: same asset and amount, opened after the send, not tracked yet."""
+    candidates = []
+    for deal in deals.values() if isinstance(deals, dict) else deals:
+        opened = deal_opened(deal)
+        if opened is None or str(deal.get("id")) in known or deal.get("asset") != details.asset:
+            continue
+        if abs(float(deal.get("amount") or 0) - details.amount) > 0.005:
+            continue
+        if opened.replace(tzinfo=UTC).timestamp() < sent_at - DEAL_SKEW_SECONDS:
+            continue
+        candidates.append((opened, deal))
+    return min(candidates, key=lambda candidate: candidate[0])[1] if candidates else None
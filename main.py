@@ -1,27 +1,54 @@
 import asyncio
-import pytz
 from fastapi import FastAPI, Request, HTTPException, status
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from datetime import date, datetime, timedelta
-from typing import Optional, AsyncIterator, Any
+from datetime import UTC, date, datetime, timedelta
+from typing import Optional, AsyncIterator, Any, Literal
 from contextlib import asynccontextmanager
+from dataclasses import replace
 from dotenv import load_dotenv
-from BinaryOptionsToolsV2.pocketoption import PocketOptionAsync
 from parse_data import parse_macrodroid_trade_data
+from asset_catalog import AssetCatalog, ASSET_UNKNOWN, ASSET_CLOSED, PAYOUT_TOO_LOW
+from orders import PreArmedOrder, arm_order
+from analytics import ProviderAnalytics
+from risk_engine import RiskEngine, DAILY_DRAWDOWN
+from price_series import PriceStore, price_points, live_pnl
+from market_data import MarketData
+from config import LayeredConfig
+from state_backend import StateBackend, backend_from_env, worker_identity
+from trade_store import TradeStore, MAX_QUERY_ROWS
+from pnl_ledger import PnlLedger, SLOT_SECONDS
+from diagnostics import LoopLagMonitor, SamplingProfiler
+from clock_sync import ClockSync
+from broker_gateway import BrokerGateway
+from signal_sources import SignalIngestor, sources_from_env
+from clock import Clock
+from models import Signal, SignalFields, Trade, TradeFields
+from state import StateManager
+from handoff import Drain, PENDING, LEG, RAW, RECONCILE, signal_payload, decode_signal, leg_payload, decode_leg, reconcile_payload, match_deal, deal_opened
+from entry_policy import EntryPolicy, DROP, ENTER, entry_deadline
+from consolidation import SignalConsolidator, SEPARATE
+from conflicts import ConflictIndex, PendingSignal, OPPOSING_SIGNAL, MAX_RESOLVED
+from dashboard import DashboardFeed
+from admission import AdmissionControl, AdmissionQueue, QUEUE_FULL
 import os
+import math
 from pydantic import BaseModel, Field
 
-from rich.logging import RichHandler
 import logging
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
-from typing import Callable, Tuple
+from typing import Awaitable, Callable, Tuple
 
 load_dotenv()
 
-logging.basicConfig(level="DEBUG", handlers=[RichHandler()])
+if os.getenv("PO_LOG_RICH", "1") != "0":
+    # Rich is the slowest import at startup; PO_LOG_RICH=0 uses plain logging (e.g. in containers)
+    from rich.logging import RichHandler
+    logging.basicConfig(level="DEBUG", handlers=[RichHandler()])
+else:
+    logging.basicConfig(level="DEBUG", format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger("PO_Signal")
 
 class RISK_MANAGEMENT(BaseModel):
@@ -31,144 +58,473 @@ class RISK_MANAGEMENT(BaseModel):
     drawback_threshold: int = -16
     timeframe:  int = 300
     local_timezone: str = 'Etc/GMT-2'
-
-class ACCOUNT_DETAILS(BaseModel):
-    balance: float=0.0
-    P_n_L_day: float=0.0
-    lifespan: float=0.0
-    async def update_balance(self,api):
-        self.balance = await api.balance()
-        
+    min_payout: int = 0
+    # exposure limits, 0 means unlimited
+    max_concurrent_sequences: int = 0
+    max_sequences_per_provider: int = 0
+    max_sequences_per_asset: int = 0
+    max_open_martingale_amount: float = 0
+    loss_streak_cooldown: int = 0
+    cooldown_seconds: int = 0
+    # late signals: enter up to late_entry_seconds past the entry time, else optionally
+    # shift to the next entry_candle_seconds boundary within max_shift_seconds, else drop
+    late_entry_seconds: float = 1
+    shift_to_next_candle: bool = False
+    entry_candle_seconds: int = 60
+    max_shift_seconds: int = 60
+    # only shift signals no later than this percentile (e.g. 0.95) of their provider's recorded lateness, 0 disables
+    shift_lateness_percentile: float = 0
+    # stop entering late in a provider's lateness bucket once its win rate falls below this, 0 disables
+    late_entry_min_win_rate: float = 0
+    # signals for the same asset, direction and merge_window_seconds entry slot from several providers:
+    # separate orders, one order for the combined amount, or one order with amounts weighted by provider score
+    signal_merge_policy: Literal["separate", "combined", "weighted"] = "separate"
+    merge_window_seconds: int = 60
+    # opposite-direction signals on the same asset and conflict_window_seconds entry slot that have not been sent:
+    # allow both, skip both, keep the higher-ranked provider, or net the amounts
+    conflict_rule: Literal["allow", "skip_both", "keep_ranked", "net"] = "allow"
+    conflict_window_seconds: int = 60
 
 class QueueMiddleware(BaseHTTPMiddleware):
-    """Queue incoming HTTP requests and process them sequentially.
+    """Queue incoming HTTP requests for `paths` and process them one at a time, earliest deadline first.
 
-    - max_queue: 0 means unlimited queue size. Set >0 to limit queue length.
+    Other requests run concurrently; shared state is owned by StateManager.
+    - queue: admission queue shared with the other signal sources; requests it
+      cannot finish before their deadline are rejected at once with a reason.
+    - deadline: cheap look at a request body, returning the time it must be processed by (None if unknown).
+    - paths: request paths to serialize, e.g. the signal webhook.
     """
-    def __init__(self, app, max_queue: int = 0):
+    def __init__(self, app, queue: AdmissionQueue, deadline: Callable[[str], float|None] | None = None, paths: Tuple[str, ...] = ()):
         super().__init__(app)
-        self._queue: asyncio.Queue[Tuple[Callable, Request, asyncio.Future]] = asyncio.Queue(maxsize=max_queue)
-        self._worker_task: asyncio.Task | None = None
+        self._queue = queue
+        self._deadline = deadline
+        self._paths = frozenset(paths)
 
     async def dispatch(self, request: Request, call_next: Callable):
-        # start worker lazily on first request (safe for startup ordering)
-        if self._worker_task is None or self._worker_task.done():
-            self._worker_task = asyncio.create_task(self._worker())
-
-        loop = asyncio.get_event_loop()
-        response_future: asyncio.Future = loop.create_future()
-        # enqueue the work item: (call_next coroutine factory, request, future to set result)
-        await self._queue.put((call_next, request, response_future))
-        # wait until worker sets the result (Response) or raises
-        response = await response_future
-        return response
-
-    async def _worker(self):
-        while True:
-            call_next, request, response_future = await self._queue.get()
+        if request.url.path not in self._paths:
+            return await call_next(request)
+        deadline = None
+        if self._deadline is not None:
             try:
-                # call_next(request) returns a coroutine that yields a Response when awaited
-                response = await call_next(request)
-                if not response_future.cancelled():
-                    response_future.set_result(response)
+                deadline = self._deadline((await request.body()).decode("utf-8", errors="replace"))
             except Exception as e:
-                if not response_future.cancelled():
-                    response_future.set_exception(e)
-            finally:
-                self._queue.task_done()
-
-class TRADE_FIELDS( BaseModel):
-    signal_provider: str
-    asset:str
-    direction:str
-    entry_time:datetime
-    level:int
-    open_price:float
-    amount:float
-class TRADE(BaseModel):
-    trade_id:str
-    trade_details:TRADE_FIELDS
-class SIGNAL_FIELDS(BaseModel):
-    signal_provider: str
-    asset:str
-    direction:str
-    entry_time:datetime
-class SIGNAL(BaseModel):
-    # map Tsid to signal details
-    signal_id:str
-    signal_details:SIGNAL_FIELDS
-
-account_details:ACCOUNT_DETAILS = ACCOUNT_DETAILS()
+                logger.warning(f"Could not read a deadline from the request: {e}")
+        response, reason, wait = await self._queue.run(lambda: call_next(request), deadline)
+        if reason is not None:
+            return admission_rejection(reason, wait)
+        return response
+
+def admission_rejection(reason:str, wait:float)->JSONResponse:
+    if reason == QUEUE_FULL:
+        return JSONResponse(status_code=status.HTTP_429_TOO_MANY_REQUESTS, content={"message": "Too many signals waiting, send it again later.", "reason": reason},
+                            headers={"Retry-After": str(max(1, math.ceil(wait)))})
+    # retrying would only be later still
+    logger.warning(f"Signal shed by admission control: {reason}")
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"message": "Signal cannot be processed before its entry time.", "reason": reason})
+
+# live signals, open trades and balance; change them only through its commands
+state:StateManager = StateManager()
+# wall clock for trade timing; replay.py swaps in a virtual clock
+clock:Clock = Clock()
+# webhook signals waiting to be processed, earliest entry first; at most PO_SIGNAL_QUEUE_MAX (0 = unlimited)
+admission:AdmissionControl = AdmissionControl(int(os.getenv("PO_SIGNAL_QUEUE_MAX", "100")), now=lambda: clock.time())
+# the webhook, the ingested sources and signals forwarded by other workers all wait in this one queue
+signal_queue:AdmissionQueue = AdmissionQueue(admission)
 risk_management:RISK_MANAGEMENT = RISK_MANAGEMENT()
-Signals:dict = {}
-trade_details:dict = {}
+
+def apply_risk_management(settings:RISK_MANAGEMENT):
+    # swap the whole model in one assignment so readers never see a half-applied update
+    global risk_management
+    risk_management = settings
+
+risk_config:LayeredConfig = LayeredConfig(RISK_MANAGEMENT, os.getenv("PO_CONFIG_FILE", "config.json"), env_prefix="PO_RISK_", on_change=apply_risk_management) #type: ignore
+asset_catalog:AssetCatalog = AssetCatalog(refresh_interval=60)
+provider_analytics:ProviderAnalytics = ProviderAnalytics()
+risk_engine:RiskEngine = RiskEngine()
+price_store:PriceStore = PriceStore()
+MAX_CANDLES = 500
+market_data:MarketData = MarketData(now=lambda: clock.time())
+trade_store:TradeStore = TradeStore(os.getenv("PO_TRADE_DB", "trades.db"))
+pnl_ledger:PnlLedger = PnlLedger()
+loop_monitor:LoopLagMonitor = LoopLagMonitor(threshold=float(os.getenv("PO_LOOP_LAG_THRESHOLD", "0.1")))
+profiler:SamplingProfiler = SamplingProfiler()
+MAX_PROFILE_SECONDS = 300
+clock_sync:ClockSync = ClockSync()
+entry_policy:EntryPolicy = EntryPolicy()
+consolidator:SignalConsolidator = SignalConsolidator()
+conflicts:ConflictIndex = ConflictIndex()
+# signal id -> task running its trade, so pending signals can be cancelled
+signal_tasks:dict[str, asyncio.Task] = {}
+# on shutdown, in-flight sequences are handed off to the next process within PO_DRAIN_SECONDS
+drain:Drain = Drain()
+dashboard_feed:DashboardFeed = DashboardFeed()
+# polls from several dashboard tabs within this window share one refresh
+DASHBOARD_REFRESH_SECONDS = 1.0
+dashboard_refreshed_at:float|None = None
+DRAIN_SECONDS = float(os.getenv("PO_DRAIN_SECONDS", "5"))
+signal_ingestor:SignalIngestor = SignalIngestor(lambda raw_data: ingest_signal(raw_data), record_path=os.getenv("PO_SIGNAL_RECORD"))
 # closed_trades:dict = {}
 
+api = None
+broker_ready:bool = False
+broker_task:asyncio.Task|None = None
+background_tasks:list = []
+# raw webhook bodies that arrived before the broker connected
+pending_signals:list = []
+MAX_PENDING_SIGNALS = 50
+RETRY_AFTER_SECONDS = 5
+# several uvicorn workers share state through PO_STATE_BACKEND=sqlite:<path>; one of them executes trades
+state_backend:StateBackend = backend_from_env(os.getenv("PO_STATE_BACKEND"))
+WORKER_ID = worker_identity()
+LEADER_LEASE_SECONDS = 10
+is_leader:bool = False
+followers_task:asyncio.Task|None = None
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
-    global api,account_details,risk_management
-    #connect client
+    global api,broker_task,broker_ready,is_leader
+    logger.info("FastAPI lifespan startup event: Initializing Pocket Option client.")
+    #App startup values: config file, then PO_RISK_* env vars, then POST /set_risk_management
+    try:
+        risk_config.load()
+    except (OSError, ValueError) as e:
+        logger.error(f"Invalid risk management config, using defaults: {e}")
+    # the serving loop owns the live state from here on
+    state.bind()
+    risk_config.start()
+    loop_monitor.start()
+    try:
+        for source in sources_from_env(os.getenv("PO_SIGNAL_SOURCES"), os.getenv("PO_SIGNAL_TIMEZONE") or risk_management.local_timezone):
+            signal_ingestor.add(source)
+    except ValueError as e:
+        logger.error(f"Invalid PO_SIGNAL_SOURCES, only the webhook will receive signals: {e}")
+    try:
+        await trade_store.open()
+        await load_history()
+    except Exception as e:
+        logger.error(f"Failed to open trade history at {trade_store.path}: {e}", exc_info=True)
+    #connect client in the background so the HTTP server binds immediately
     ssid = os.getenv("ssid")
     if not ssid:
         logger.critical("SSID not found in .env. Please ensure run scraper usin ./run_scaper.ps1 in in powershell, uv run scraper.py, pyhton scraper.py, or ensure .env is correctly set.")
-        return
-    
-    logger.info("FastAPI lifespan startup event: Initializing Pocket Option client.")
-    # risk_management:object|None = None
-    #App startup values
-    set_risk_management = input("Do you want to set risk managment values? (y/n): ").strip().lower()
-    if set_risk_management == "y" or set_risk_management == "yes":
-        for _ in range(3):
-            intial_amount = input("Enter initial amount: ").strip()
-            martingale_levels = input("Enter martingale levels: ").strip()
-            martingale_multiplier = input("Enter martingale multiplier: ").strip()
-            timeframe = input("Enter timeframe: ").strip()
-            drawback_threshold = input("Enter drawback threshold: ").strip()
-            if intial_amount and martingale_levels and martingale_multiplier and timeframe and drawback_threshold:
-                risk_management = RISK_MANAGEMENT(
-                    initial_amount = float(intial_amount),
-                    martingale_levels=int(martingale_levels),
-                    martingale_multiplier=int(martingale_multiplier),
-                    drawback_threshold=int(drawback_threshold),
-                    timeframe= int(timeframe)
-                    )
-                break
-            else:
-                logger.warning("Please enter all the required details.")
-                if _ >= 3:
-                    logger.info("not all values have been set for the app, will use default values for missing values..")
-                    risk_management = RISK_MANAGEMENT()
-            await asyncio.sleep(5)
-    
-    try:
-        api = PocketOptionAsync(ssid) #type: ignore
-        await asyncio.sleep(5)
-        for _ in range(3):
-            logger.info(f"${api}")
-            balance = await api.balance()
-            if balance:
-                logger.info("FastAPI lifespan startup event: Connected to Pocket Option client.")
-                logger.info(f"Startup Balance: {balance}")
-                logger.info(f"\n\n\n== Risk management values == \n - Initial entry amount: ${risk_management.initial_amount}\n - max martingale level: {risk_management.martingale_levels}\n - Martingale multiplier: {risk_management.martingale_multiplier}\n - drawback threshol: {risk_management.drawback_threshold}\n - Timeframe: {risk_management.timeframe}\n\n-----use POST : /set_risk_management to change settings \n\n") #type: ignore
-                account_details = ACCOUNT_DETAILS(balance=balance,P_n_L_day= 0,lifespan=0)
-                break
-            else:
-                logger.error("FastAPI lifespan startup event: Failed to connect to Pocket Option client.")
-                logger.info("Attempting to reconnect...")
-                if _ >= 3:
-                    logger.error("Failed to reconnect to Pocket Option client after 3 attempts.")
-                    return
-                await api.reconnect() #type: ignore
-            await asyncio.sleep(5)
-    except Exception or KeyboardInterrupt as e:
-        logger.error(f"Failed to connect to Pocket Option client: {e}", exc_info=True)
-        return   
-    asyncio.create_task(reset_P_n_L_day()) 
+    leadership_task = asyncio.create_task(run_leadership(ssid))
     yield
+    # Drain: stop taking signals, let orders in flight land, then hand open sequences to the next process
+    drain.start()
+    signal_ingestor.stop()
+    if followers_task is not None:
+        followers_task.cancel()
+    if is_leader:
+        await hand_off(DRAIN_SECONDS)
     # Disconnect
-    await api.disconnect()
+    broker_ready = False
+    leadership_task.cancel()
+    if is_leader:
+        is_leader = False
+        await state_backend.release_leadership(WORKER_ID)
+    state_backend.close()
+    risk_config.stop()
+    loop_monitor.stop()
+    profiler.stop()
+    clock_sync.stop()
+    await trade_store.close()
+    if broker_task is not None:
+        broker_task.cancel()
+    for task in background_tasks:
+        task.cancel()
+    asset_catalog.stop()
+    market_data.stop()
+    if api is not None:
+        await api.disconnect()
     return
 
+async def load_history():
+    # day P&L and provider stats from the trade history; another worker may have traded since we last read it
+    global provider_analytics,pnl_ledger
+    analytics = ProviderAnalytics()
+    analytics.extend(await trade_store.sequence_rows())
+    provider_analytics = analytics
+    pnl_ledger.load(await trade_store.pnl_slots(SLOT_SECONDS))
+
+async def run_leadership(ssid:str|None):
+    # hold or compete for the executor lease; only the leader talks to the broker
+    global is_leader,broker_task,broker_ready,followers_task
+    while True:
+        try:
+            leading = await state_backend.acquire_leadership(WORKER_ID, LEADER_LEASE_SECONDS)
+        except Exception as e:
+            logger.error(f"Executor lease renewal failed: {e}")
+            leading = False
+        if leading and not is_leader:
+            is_leader = True
+            logger.info(f"Worker {WORKER_ID} is the trade executor.")
+            # the drawdown guard must see what the previous executor booked before any trade is taken
+            try:
+                await load_history()
+            except Exception as e:
+                logger.error(f"Failed to reload trade history on taking the executor lease: {e}", exc_info=True)
+            if ssid:
+                broker_task = asyncio.create_task(connect_broker(ssid))
+            # only the executor reads the signal sources, so no message is ingested twice
+            signal_ingestor.start()
+            if state_backend.shared and (followers_task is None or followers_task.done()):
+                followers_task = asyncio.create_task(serve_followers())
+        elif not leading and is_leader:
+            logger.critical(f"Worker {WORKER_ID} lost the executor lease, no longer accepting trades.")
+            is_leader = False
+            await step_down()
+        await asyncio.sleep(LEADER_LEASE_SECONDS / 3)
+
+async def serve_followers(poll:float = 0.1, publish_every:float = 1.0):
+    # leader side of a shared backend: take signals other workers received and publish dashboard state
+    global pending_signals
+    last_publish = 0.0
+    while is_leader:
+        try:
+            for raw_data in await state_backend.claim_signals(WORKER_ID):
+                if broker_ready:
+                    asyncio.create_task(forward_signal(raw_data))
+                else:
+                    pending_signals.append(raw_data)
+            now = asyncio.get_running_loop().time()
+            if now - last_publish >= publish_every:
+                last_publish = now
+                await state_backend.publish("status", {"broker_ready": broker_ready, "leader": WORKER_ID})
+                await state_backend.publish("account_details", account_details_payload())
+                await state_backend.publish("current_signals", current_signals_payload())
+                for key, payload in diagnostics_payloads().items():
+                    await state_backend.publish(key, payload)
+                if broker_ready:
+                    await state_backend.publish("open_trades", await collect_open_trades())
+                    # sequences handed off by a worker that lost the lease (the trade history file is shared)
+                    await resume_handoff()
+        except Exception as e:
+            logger.error(f"Failed to serve follower workers: {e}", exc_info=True)
+        await asyncio.sleep(poll)
+
+async def connect_broker(ssid:str, retry_seconds:float = 30):
+    global api,broker_ready
+    # imported here so the app can start serving before the broker client loads
+    from BinaryOptionsToolsV2.pocketoption import PocketOptionAsync
+    while True:
+        try:
+            client = PocketOptionAsync(ssid) #type: ignore
+            balance = await wait_for_balance(client)
+            if balance:
+                # every broker call from here on is scheduled by priority
+                api = BrokerGateway(client, max_in_flight=int(os.getenv("PO_BROKER_MAX_IN_FLIGHT", "4")))
+                break
+            logger.error("Failed to reconnect to Pocket Option client after 3 attempts.")
+        except Exception as e:
+            logger.error(f"Failed to connect to Pocket Option client: {e}", exc_info=True)
+        logger.info(f"Retrying broker connection in {retry_seconds}s")
+        await asyncio.sleep(retry_seconds)
+    logger.info("FastAPI lifespan startup event: Connected to Pocket Option client.")
+    logger.info(f"Startup Balance: {balance}")
+    logger.info(f"\n\n\n== Risk management values == \n - Initial entry amount: ${risk_management.initial_amount}\n - max martingale level: {risk_management.martingale_levels}\n - Martingale multiplier: {risk_management.martingale_multiplier}\n - drawback threshol: {risk_management.drawback_threshold}\n - Timeframe: {risk_management.timeframe}\n\n-----edit {risk_config.path} or use POST : /set_risk_management to change settings \n\n") #type: ignore
+    state.set_balance(balance)
+    background_tasks.append(asyncio.create_task(watch_market_data()))
+    asset_catalog.start(api)
+    clock_sync.start(api)
+    broker_ready = True
+    await resume_handoff()
+    await drain_pending_signals()
+
+async def drain_pending_signals():
+    global pending_signals
+    queued, pending_signals = pending_signals, []
+    if queued:
+        logger.info(f"Broker ready, processing {len(queued)} queued signal(s)")
+    for raw_data in queued:
+        try:
+            response = await process_signal(raw_data)
+            logger.info(f"Queued signal processed with status {response.status_code}")
+        except HTTPException as e:
+            logger.error(f"Queued signal failed: {e.detail}")
+
+def handoff_items(signal_ids:list)->list:
+    # describe sequences at a safe point: an open leg waiting for its result, or signals waiting for their entry
+    snapshot = state.snapshot()
+    open_legs = {details.signal_id: (trade_id, details) for trade_id, details in snapshot.trades.items()}
+    items = []
+    for signal_id in signal_ids:
+        group = consolidator.groups.get(signal_id)
+        if signal_id in open_legs:
+            trade_id, details = open_legs[signal_id]
+            items.append((LEG, leg_payload(trade_id, details, snapshot.signals.get(signal_id), group)))
+            continue
+        for member in group.signal_ids if group else [signal_id]:
+            if member in snapshot.signals:
+                items.append((PENDING, signal_payload(member, snapshot.signals[member])))
+    return items
+
+async def cancel_signal_tasks(signal_ids:list):
+    tasks = [signal_tasks[signal_id] for signal_id in signal_ids if signal_id in signal_tasks]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def hand_off(timeout:float):
+    global pending_signals
+    # sequences at a safe point are described and cancelled first, so none of them sends another order
+    # while the ones with an order in flight land
+    waiting = [signal_id for signal_id in signal_tasks if signal_id not in drain.busy]
+    items = handoff_items(waiting)
+    await cancel_signal_tasks(waiting)
+    if not await drain.wait_idle(timeout):
+        # the broker may still fill them: the next process looks them up among its open deals
+        logger.error(f"Drain timed out with orders in flight for {sorted(drain.busy)}; handing them off for reconciliation")
+        items.extend((RECONCILE, payload) for payload in drain.in_flight())
+    landed = [signal_id for signal_id in signal_tasks if signal_id not in drain.busy]
+    items.extend(handoff_items(landed))
+    await cancel_signal_tasks(list(signal_tasks))
+    items.extend((RAW, {"raw": raw_data}) for raw_data in pending_signals)
+    pending_signals = []
+    trade_store.save_handoff(items)
+    counts = {kind: sum(1 for k, _ in items if k == kind) for kind in (LEG, RECONCILE, PENDING, RAW)}
+    logger.info(f"Handed off {counts[LEG]} open sequence(s), {counts[RECONCILE]} order(s) in flight, {counts[PENDING]} pending signal(s) and {counts[RAW]} queued webhook(s)")
+
+async def step_down():
+    # fence a worker that lost the executor lease: nothing of ours may place another order.
+    # Its sequences and queued signals go to the new executor through the handoff.
+    global api,broker_task,broker_ready,followers_task,background_tasks
+    broker_ready = False
+    signal_ingestor.stop()
+    if followers_task is not None:
+        followers_task.cancel()
+        followers_task = None
+    if broker_task is not None:
+        broker_task.cancel()
+        broker_task = None
+    await hand_off(DRAIN_SECONDS)
+    # everything live is in the handoff now; the new executor owns it
+    state.reset()
+    for task in background_tasks:
+        task.cancel()
+    background_tasks = []
+    asset_catalog.stop()
+    market_data.stop()
+    clock_sync.stop()
+    if api is not None:
+        client, api = api, None
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.error(f"Failed to disconnect from the broker after losing the executor lease: {e}")
+
+async def resume_handoff():
+    # pick up what the previous process handed off: open legs first, then signals still waiting for their entry
+    global pending_signals
+    try:
+        items = await trade_store.take_handoff()
+    except Exception as e:
+        logger.error(f"Failed to read the handoff from the previous process: {e}", exc_info=True)
+        return
+    if not items:
+        return
+    raw = []
+    P_n_L_day = pnl_ledger.today(risk_management.local_timezone)
+    order = {LEG: 0, RECONCILE: 1}
+    deals = None
+    for kind, payload in sorted(items, key=lambda item: order.get(item[0], 2)):
+        try:
+            if kind == LEG:
+                resume_leg(payload)
+            elif kind == RECONCILE:
+                if deals is None:
+                    deals = await broker_open_deals()
+                resume_in_flight(payload, deals)
+            elif kind == PENDING:
+                resume_signal(payload, P_n_L_day)
+            elif kind == RAW:
+                raw.append(payload["raw"])
+        except Exception as e:
+            logger.error(f"Failed to resume handed-off {kind} {payload}: {e}", exc_info=True)
+    pending_signals = raw + pending_signals
+    logger.info(f"Resumed {len(items)} handed-off item(s)")
+
+async def broker_open_deals():
+    global api
+    try:
+        async with asyncio.timeout(10):
+            return await api.opened_deals() #type: ignore
+    except Exception as e:
+        logger.error(f"Failed to read open deals to reconcile handed-off orders: {e}", exc_info=True)
+        return []
+
+def resume_in_flight(payload:dict, deals):
+    # an order the previous process sent but never saw the reply for: resume its leg if the broker filled it
+    trade, signal_fields, group = decode_leg(payload)
+    details = trade.trade_details
+    deal = match_deal(deals, details, payload["sent_at"], set(state.snapshot().trades))
+    if deal is None:
+        logger.error(f"Order in flight for {details.signal_id} (level {details.level}, {details.direction} {details.asset} ${details.amount}) "
+                     f"is not among the broker's open deals: it was not filled or has already closed, check it at the broker")
+        return
+    opened_at = deal_opened(deal)
+    details = replace(details, entry_time=opened_at, open_price=float(deal.get("openPrice") or 0), amount=float(deal["amount"]))
+    if details.level == 0 and details.signal_time is not None:
+        details = replace(details, entry_slippage=opened_at.replace(tzinfo=UTC).timestamp() - details.signal_time.timestamp()) #type: ignore
+    trade = Trade(trade_id=str(deal["id"]), trade_details=details)
+    logger.warning(f"Order in flight for {details.signal_id} found at the broker as trade {trade.trade_id}")
+    record_leg_open(trade)
+    open_leg(trade, signal_fields, group)
+
+def resume_leg(payload:dict):
+    open_leg(*decode_leg(payload))
+
+def open_leg(trade:Trade, signal_fields:SignalFields|None, group:dict|None):
+    details = trade.trade_details
+    signal_id = details.signal_id
+    if signal_fields is not None:
+        state.add_signal(signal_id, signal_fields)
+    state.open_trade(trade.trade_id, details)
+    if group:
+        consolidator.restore(signal_id, group["signal_ids"], group["providers"], group["contributions"])
+        for member, provider in zip(group["signal_ids"], group["providers"]):
+            risk_engine.open(member, provider, details.asset, details.amount if member == signal_id else 0)
+    else:
+        risk_engine.open(signal_id, details.signal_provider, details.asset, details.amount)
+    logger.info(f"Resuming sequence {signal_id} at level {details.level} on trade {trade.trade_id}")
+    signal_tasks[signal_id] = asyncio.create_task(resume_sequence(trade))
+
+def resume_signal(payload:dict, P_n_L_day:float):
+    signal = decode_signal(payload)
+    details = signal.signal_details
+    decision = entry_policy.decide(details.signal_provider, details.entry_time, clock.now(details.entry_time.tzinfo), risk_management)
+    if decision.action == DROP:
+        logger.warning(f"Handed-off signal {signal.signal_id} expired during the restart ({decision.late:.1f}s late), dropping it")
+        return
+    details.entry_time = decision.entry_time
+    if not state.add_signal(signal.signal_id, details):
+        return
+    entry_policy.record(signal.signal_id, details.signal_provider, decision)
+    response = schedule_signal(signal, P_n_L_day)
+    logger.info(f"Handed-off signal {signal.signal_id} rescheduled with status {response.status_code}")
+
+def require_broker():
+    if not broker_ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Broker not connected yet.", headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+async def wait_for_balance(api, attempts:int = 3, timeout:float = 5.0, poll:float = 0.1)->float|None:
+    # poll until the client reports a balance instead of sleeping a fixed time
+    for attempt in range(attempts):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            try:
+                balance = await api.balance()
+                if balance:
+                    return balance
+            except Exception as e:
+                logger.debug(f"Balance not available yet: {e}")
+            await asyncio.sleep(poll)
+        logger.error("FastAPI lifespan startup event: Failed to connect to Pocket Option client.")
+        if attempt < attempts - 1:
+            logger.info("Attempting to reconnect...")
+            await api.reconnect()
+    return None
+
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
@@ -177,12 +533,67 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(QueueMiddleware, max_queue=0)
+app.add_middleware(QueueMiddleware, queue=signal_queue, deadline=lambda raw_data: signal_deadline(raw_data), paths=("/trade_signal",))
 
 # Enable CORS so browser pages served from file:// (origin 'null') or other origins can reach the API.
 # For local development it's fine to allow all origins; tighten this in production.
 
 app.mount("/ui", StaticFiles(directory="ui", html=True), name="ui")
+@app.get("/healthz", response_class=JSONResponse)
+async def healthz():
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "ok"})
+
+@app.get("/readyz", response_class=JSONResponse)
+async def readyz():
+    if is_follower():
+        leader_status = await state_backend.read("status")
+        if await state_backend.leader() and leader_status and leader_status.get("broker_ready"):
+            return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "ready", "leader": leader_status.get("leader")})
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "waiting for executor"}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    if drain.draining:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "draining"}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    if not broker_ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "starting", "pending_signals": len(pending_signals)}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "ready"})
+
+def require_admin(request:Request):
+    # diagnostics are open unless PO_ADMIN_TOKEN is set
+    token = os.getenv("PO_ADMIN_TOKEN")
+    if token and request.headers.get("X-Admin-Token") != token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token.")
+
+@app.get("/diagnostics/loop_lag", response_class=JSONResponse)
+async def get_loop_lag(request: Request):
+    require_admin(request)
+    return JSONResponse(status_code=status.HTTP_200_OK, content=loop_monitor.snapshot())
+
+@app.post("/diagnostics/profile/start", response_class=JSONResponse)
+async def start_profile(request: Request, seconds: float = 30, interval: float = 0.005):
+    require_admin(request)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and interval in [0.001, 1]")
+    try:
+        profiler.start(seconds, interval)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    logger.info(f"Sampling profiler started for {seconds}s every {interval * 1000:.0f} ms")
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=profiler.status())
+
+@app.post("/diagnostics/profile/stop", response_class=JSONResponse)
+async def stop_profile(request: Request):
+    require_admin(request)
+    profiler.stop()
+    return JSONResponse(status_code=status.HTTP_200_OK, content=profiler.status())
+
+@app.get("/diagnostics/profile")
+async def download_profile(request: Request):
+    require_admin(request)
+    if profiler.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Profiler is still running.")
+    if not profiler.samples:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profile recorded yet.")
+    return PlainTextResponse(profiler.collapsed(), headers={"Content-Disposition": f"attachment; filename=profile-{int(profiler.started_at or 0)}.folded"})
+
 @app.get("/", response_class=HTMLResponse)
 async def root_index():
     ui_dir = os.path.join(os.path.dirname(__file__), "ui")
@@ -209,7 +620,10 @@ async def ui_styles():
 
 @app.get("/account_details", response_class=JSONResponse)
 async def get_account_details():
-    global api,account_details
+    global api,state
+    if is_follower():
+        return await follower_snapshot("account_details")
+    require_broker()
     balance = None
     try:
         balance = await api.balance()
@@ -221,117 +635,468 @@ async def get_account_details():
                     break
                 if retries == 9:
                     logger.error("Failed to reconnect and get a valid balance after 10 attempts.")
-        account_details.balance = balance
+        state.set_balance(balance)
     except Exception as e:
         balance = "fetch failed"
-    P_n_L_day = account_details.P_n_L_day
-    lifespan  = account_details.lifespan
-    jsonResponse = JSONResponse(status_code= status.HTTP_200_OK,content={"balance": balance,"P_n_L_day": P_n_L_day, "lifespan": lifespan})
+    jsonResponse = JSONResponse(status_code= status.HTTP_200_OK,content=account_details_payload() | {"balance": balance})
     return jsonResponse
 
-@app.get("/open_trades", response_class=JSONResponse)
-async def get_open_trades():
-    global api,risk_management,trade_details
+def account_details_payload()->dict:
+    return {"balance": state.balance} | pnl_ledger.summary(risk_management.local_timezone)
+
+@app.get("/pnl", response_class=JSONResponse)
+async def get_pnl(day: Optional[str] = None):
+    global pnl_ledger
+    try:
+        day_date = date.fromisoformat(day) if day else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="day must be YYYY-MM-DD")
+    if is_follower():
+        # the executor writes the ledger; followers read its persisted slots
+        pnl_ledger.load(await trade_store.pnl_slots(SLOT_SECONDS))
+    return JSONResponse(status_code=status.HTTP_200_OK, content=pnl_ledger.summary(risk_management.local_timezone, day_date))
+
+async def follower_snapshot(key:str)->JSONResponse:
+    return JSONResponse(status_code=status.HTTP_200_OK, content=await follower_content(key))
+
+async def follower_content(key:str)->Any:
+    # followers serve what the leader last published
+    content = await state_backend.read(key)
+    if content is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Executor has not published state yet.", headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return content
+
+def is_follower()->bool:
+    return not is_leader and state_backend.shared
+
+def diagnostics_payloads()->dict:
+    # the executor's in-memory views; followers never trade, so theirs would never change
+    return {
+        "provider_stats": provider_analytics.stats(),
+        "entry_policy": entry_policy.snapshot(),
+        "risk_status": risk_engine.snapshot(),
+        "conflicts": conflicts.snapshot(MAX_RESOLVED),
+        "consolidation": consolidator.snapshot(),
+        "entry_precision": clock_sync.snapshot(),
+    }
+
+def candle_request_window()->Tuple[int,int]:
     # Ensure integer values are passed to get_candles (period and offset must be ints)
     period = int(risk_management.timeframe) // (int(risk_management.timeframe)//10)
     if period <= 0:
         period = 1
-    offset = period * 5
-    
-        
+    return period, period * 5
+
+@app.get("/open_trades", response_class=JSONResponse)
+async def get_open_trades():
+    if is_follower():
+        return await follower_snapshot("open_trades")
+    require_broker()
     try:
-        async with asyncio.timeout(10):
-            openTrades = await api.opened_deals()
-        # print(f"Fetched open trades: {openTrades}\n\n\n")
-        # # handle dict or list responses from the API
-        trades_list = []
-        for tid,data in openTrades.items(): #type: ignore
-            async with asyncio.timeout(10):  # Set a 3-second timeout
-                current_price = await api.get_candles(data.get("asset"), period, offset)
-            trades_list.append({
-                "trade_id": data.get("id"),
-                "asset": data.get("asset"),
-                "amount": data.get("amount"),
-                "direction": trade_details[data.get("id")].direction if data.get("id") in trade_details else "-",
-                "profit": data.get("profit"),
-                "openedTime": data.get("openTime"),
-                "open_price": data.get("openPrice"),
-                # current_price may be non-serializable depending on API; include as-is and let caller handle
-                "current_price": current_price #type: ignore
-            })
-        # print(f"Compiled open trades list: {trades_list}")
+        trades_list = await collect_open_trades()
         return JSONResponse(status_code=status.HTTP_200_OK, content={"open_trades": trades_list})
     except (Exception, KeyboardInterrupt) as e:
         logger.error(f"Error fetching open trades: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error fetching open trades: {e}")
 
-# @app.get("/closed_trades")
-# async def get_closed_trades():
-#     global closed_trades
-#     close_list = {}
-#     for Tsid in closed_trades:
-#         close_list[Tsid] = closed_trades[Tsid]
-#     return JSONResponse(status_code=status.HTTP_200_OK, content={"closed_trades": close_list})
+async def collect_open_trades()->list:
+    global api,risk_management,state,price_store,asset_catalog
+    period, offset = candle_request_window()
+    async with asyncio.timeout(10):
+        openTrades = await api.opened_deals() #type: ignore
+    trades_list = []
+    for tid,data in openTrades.items(): #type: ignore
+        asset = data.get("asset")
+        current_price = market_data.last_price(asset)
+        if current_price is None:
+            # no live ticks for this asset yet, fall back to polling candles
+            async with asyncio.timeout(10):
+                candles = await api.get_candles(asset, period, offset)
+            price_store.series(asset).update_from_candles(candles, clock.time())
+            current_price = price_store.last_price(asset)
+        trade = state.trade(data.get("id"))
+        direction = trade.direction if trade is not None else "-"
+        open_price = data.get("openPrice")
+        points = None
+        pnl = None
+        for price in (open_price, current_price):
+            if price is not None:
+                asset_catalog.observe_price(asset, float(price))
+        if current_price is not None and open_price is not None and direction != "-":
+            points = price_points(float(open_price), current_price, direction, asset_catalog.decimals(asset))
+            pnl = live_pnl(float(open_price), current_price, direction, float(data.get("amount") or 0), asset_catalog.payout(asset))
+        trades_list.append({
+            "trade_id": data.get("id"),
+            "asset": asset,
+            "amount": data.get("amount"),
+            "direction": direction,
+            "profit": data.get("profit"),
+            "openedTime": data.get("openTime"),
+            "open_price": open_price,
+            "current_price": current_price,
+            "points": points,
+            "live_pnl": pnl
+        })
+    return trades_list
+
+@app.get("/candles", response_class=JSONResponse)
+async def get_candle_history(asset: str, limit: int = 100):
+    global api,price_store
+    if limit < 1 or limit > MAX_CANDLES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"limit must be between 1 and {MAX_CANDLES}")
+    # a series per queried string would grow the store without bound
+    if asset not in price_store and asset_catalog.payout(asset) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown asset {asset}")
+    series = price_store.series(asset)
+    period, offset = candle_request_window()
+    # refetch once the newest candle may have closed since the last fetch
+    if len(series) < limit or clock.time() - series.fetched_at >= period:
+        require_broker()
+        try:
+            async with asyncio.timeout(10):
+                series.update_from_candles(await api.get_candles(asset, period, max(offset, period * limit)), clock.time())
+        except (Exception, KeyboardInterrupt) as e:
+            logger.error(f"Error fetching candles for {asset}: {e}", exc_info=True)
+            if not len(series):
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Error fetching candles: {e}")
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"asset": asset, "candles": series.window(limit)})
+
+@app.get("/broker_stats", response_class=JSONResponse)
+async def get_broker_stats():
+    global api
+    require_broker()
+    return JSONResponse(status_code=status.HTTP_200_OK, content=api.stats() if isinstance(api, BrokerGateway) else {})
+
+@app.get("/entry_precision", response_class=JSONResponse)
+async def get_entry_precision():
+    global clock_sync
+    if is_follower():
+        return await follower_snapshot("entry_precision")
+    return JSONResponse(status_code=status.HTTP_200_OK, content=clock_sync.snapshot())
+
+@app.get("/entry_policy", response_class=JSONResponse)
+async def get_entry_policy(provider: Optional[str] = None, asset: Optional[str] = None,
+                           since: Optional[float] = None, until: Optional[float] = None):
+    global entry_policy,trade_store
+    if provider is None and asset is None and since is None and until is None:
+        if is_follower():
+            return await follower_snapshot("entry_policy")
+        return JSONResponse(status_code=status.HTTP_200_OK, content=entry_policy.snapshot())
+    rows = await trade_store.entry_decision_stats(provider, asset, since, until)
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"decisions": rows})
+
+@app.get("/consolidation", response_class=JSONResponse)
+async def get_consolidation():
+    global consolidator
+    if is_follower():
+        return await follower_snapshot("consolidation")
+    return JSONResponse(status_code=status.HTTP_200_OK, content=consolidator.snapshot())
+
+@app.get("/admission_stats", response_class=JSONResponse)
+async def get_admission_stats():
+    global admission
+    return JSONResponse(status_code=status.HTTP_200_OK, content=admission.snapshot())
+
+@app.get("/conflicts", response_class=JSONResponse)
+async def get_conflicts(limit: int = 50):
+    global conflicts
+    if limit < 0 or limit > MAX_RESOLVED:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"limit must be between 0 and {MAX_RESOLVED}")
+    if is_follower():
+        content = await follower_content("conflicts")
+        # published with every remembered resolution, newest first
+        return JSONResponse(status_code=status.HTTP_200_OK, content=content | {"resolved": content["resolved"][:limit]})
+    return JSONResponse(status_code=status.HTTP_200_OK, content=conflicts.snapshot(limit))
+
+@app.get("/provider_stats", response_class=JSONResponse)
+async def get_provider_stats(by: Optional[str] = None, provider: Optional[str] = None, asset: Optional[str] = None,
+                             since: Optional[float] = None, until: Optional[float] = None):
+    global provider_analytics,trade_store
+    try:
+        if provider is None and asset is None and since is None and until is None:
+            # unfiltered totals are kept incrementally in memory, by the executor
+            if is_follower():
+                stats = await follower_content("provider_stats")
+                if by is not None:
+                    if by not in stats or by == "total_sequences":
+                        raise ValueError(f"Unknown grouping '{by}', expected one of ['asset', 'hour', 'provider']")
+                    stats = {by: stats[by], "total_sequences": stats["total_sequences"]}
+            else:
+                stats = provider_analytics.stats(by)
+        else:
+            groups = [by] if by else ["provider", "asset", "hour"]
+            stats = {group: await trade_store.sequence_stats(group, provider, asset, since, until) for group in groups}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return JSONResponse(status_code=status.HTTP_200_OK, content=stats)
+
+@app.get("/closed_trades", response_class=JSONResponse)
+async def get_closed_trades(provider: Optional[str] = None, asset: Optional[str] = None,
+                            since: Optional[float] = None, until: Optional[float] = None, limit: int = 50):
+    global trade_store
+    if limit < 1 or limit > MAX_QUERY_ROWS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"limit must be between 1 and {MAX_QUERY_ROWS}")
+    legs = await trade_store.closed_legs(provider, asset, since, until, limit)
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"closed_trades": closed_trade_rows(legs)})
+
+def closed_trade_rows(legs:list)->dict:
+    close_list = {}
+    for leg in legs:
+        close_list[leg["trade_id"]] = {"trade_details": {
+            "signal_provider": leg["provider"],
+            "result": leg["result"],
+            "asset": leg["asset"],
+            "direction": leg["direction"],
+            "entry_time": datetime.fromtimestamp(leg["opened_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+            "amount": leg["amount"],
+            "level": leg["level"],
+            "open_price": leg["open_price"],
+            "profit": leg["profit"],
+            "signal_id": leg["signal_id"]
+        }}
+    return close_list
 
 @app.get("/current_signals", response_class=JSONResponse)
 async def get_current_signals():
-    global Signals
-    signals_get = Signals.copy()
-    logger.info(f"current Signals {signals_get}")
+    if is_follower():
+        return await follower_snapshot("current_signals")
+    return JSONResponse(status_code=status.HTTP_200_OK, content=current_signals_payload())
+
+def current_signals_payload()->dict:
+    global state
+    signals_get = state.snapshot().signals
+    logger.info(f"current Signals {dict(signals_get)}")
     signal_list = []
     for signal_id, signal_details in signals_get.items(): #type: ignore
         signal_list.append({
+            "signal_id": signal_id,
             "signal_provider": signal_details.signal_provider,
             "entry_time": str(signal_details.entry_time),
             "direction": signal_details.direction,
             "asset": signal_details.asset
         })
         
-    return JSONResponse(status_code=status.HTTP_200_OK, content={"signals": signal_list})
+    return {"signals": signal_list}
 
 
     #
     # return JSONResponse(status_code= status.HTTP_200_OK,content={f"message:{Signals.get_signal(returnAll=True)}"})
+@app.get("/dashboard", response_class=JSONResponse)
+async def get_dashboard(epoch: Optional[str] = None, since: int = 0):
+    # everything the UI shows, as the rows changed after version `since`
+    global dashboard_feed
+    await refresh_dashboard()
+    return JSONResponse(status_code=status.HTTP_200_OK, content=dashboard_feed.diff(epoch, since))
+
+async def refresh_dashboard():
+    global dashboard_feed,dashboard_refreshed_at,api,state
+    now = asyncio.get_running_loop().time()
+    if dashboard_refreshed_at is not None and now - dashboard_refreshed_at < DASHBOARD_REFRESH_SECONDS:
+        return
+    dashboard_refreshed_at = now
+    follower = is_follower()
+    try:
+        if follower:
+            account = await state_backend.read("account_details")
+            signals = (await state_backend.read("current_signals") or {}).get("signals", [])
+        else:
+            if broker_ready:
+                state.set_balance(await api.balance()) #type: ignore
+            account = account_details_payload()
+            signals = current_signals_payload()["signals"]
+        if account is not None:
+            dashboard_feed.update("account", {"account": account})
+        dashboard_feed.update("signals", {signal["signal_id"]: signal for signal in signals})
+    except Exception as e:
+        logger.error(f"Failed to refresh dashboard account and signals: {e}", exc_info=True)
+    try:
+        trades = await state_backend.read("open_trades") if follower else (await collect_open_trades() if broker_ready else None)
+        if trades is not None:
+            dashboard_feed.update("open_trades", {str(trade["trade_id"]): trade for trade in trades})
+    except Exception as e:
+        logger.error(f"Failed to refresh dashboard open trades: {e}", exc_info=True)
+    try:
+        dashboard_feed.update("closed_trades", closed_trade_rows(await trade_store.closed_legs(limit=50)))
+    except Exception as e:
+        logger.error(f"Failed to refresh dashboard closed trades: {e}", exc_info=True)
+    dashboard_feed.update("risk", {"risk": {"message": f"Risk managment values: {risk_management}"}})
+
 @app.post("/set_risk_management", response_class=JSONResponse  )
 async def set_risk_management(Risk: RISK_MANAGEMENT):
     global risk_management
     if Risk.initial_amount and Risk.martingale_levels and Risk.martingale_multiplier and Risk.drawback_threshold and Risk.timeframe:
-        risk_management.initial_amount = Risk.initial_amount
-        risk_management.martingale_levels = Risk.martingale_levels
-        risk_management.martingale_multiplier = Risk.martingale_multiplier
-        risk_management.drawback_threshold = Risk.drawback_threshold
-        risk_management.timeframe = Risk.timeframe
+        try:
+            risk_config.set_overrides(Risk.model_dump(exclude_unset=True))
+        except ValueError as e:
+            return JSONResponse(status_code= status.HTTP_400_BAD_REQUEST,content={"message": f"Risk managment values not set: {e}"})
         return JSONResponse(status_code= status.HTTP_200_OK,content={f"message": "Risk managment values successfully set to: {risk_management}"})
     else:
         return JSONResponse(status_code= status.HTTP_400_BAD_REQUEST,content={f"message": "Risk managment values not set.Please ensure schema : {initial_amount,martingale_levels,martingale_multiplier,drawback_threshold,timeframe}"})
 @app.get("/get_risk_management", response_class=JSONResponse)
 async def get_risk_management():
     global risk_management
-    return JSONResponse(status_code= status.HTTP_200_OK,content={f"message": f"Risk managment values: {risk_management}"})
+    return JSONResponse(status_code= status.HTTP_200_OK,content={f"message": f"Risk managment values: {risk_management}", "sources": risk_config.sources()})
+
+@app.get("/risk_status", response_class=JSONResponse)
+async def get_risk_status():
+    global risk_engine
+    if is_follower():
+        return await follower_snapshot("risk_status")
+    return JSONResponse(status_code= status.HTTP_200_OK,content=risk_engine.snapshot())
 
 @app.post("/trade_signal")
 async def trade_signal_webhook(request: Request)->JSONResponse:
-    global api,risk_management,account_details
-    account_details.balance = await api.balance()
     raw_data = (await request.body()).decode('utf-8')
+    # senders that stamp the message let us compare the webhook path with the other sources
+    sent_at = request.headers.get("X-Signal-Timestamp")
+    try:
+        signal_ingestor.record_latency("webhook", float(sent_at) if sent_at else None)
+    except ValueError:
+        signal_ingestor.record_latency("webhook", None)
+    return await accept_signal(raw_data)
+
+@app.get("/signal_sources", response_class=JSONResponse)
+async def get_signal_sources():
+    global signal_ingestor
+    return JSONResponse(status_code=status.HTTP_200_OK, content=signal_ingestor.snapshot())
+
+async def ingest_signal(raw_data:str):
+    response = await queue_signal(raw_data, accept_signal)
+    if response.status_code >= 400:
+        logger.warning(f"Ingested signal not accepted, status {response.status_code}: {bytes(response.body).decode('utf-8')}")
+
+async def queue_signal(raw_data:str, handler:Callable[[str], Awaitable[JSONResponse]])->JSONResponse:
+    # signals that did not come through the webhook take the same admission queue
+    global signal_queue
+    response, reason, wait = await signal_queue.run(lambda: handler(raw_data), signal_deadline(raw_data))
+    if reason is not None:
+        return admission_rejection(reason, wait)
+    return response
+
+async def forward_signal(raw_data:str):
+    response = await queue_signal(raw_data, process_signal)
+    if response.status_code >= 400:
+        logger.warning(f"Forwarded signal not accepted, status {response.status_code}: {bytes(response.body).decode('utf-8')}")
+
+async def accept_signal(raw_data:str)->JSONResponse:
+    # every signal source ends here: forward to the executor, queue until the broker is ready, or process
+    global pending_signals
+    if drain.draining:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"message": "Shutting down, send the signal again.", "reason": "DRAINING"}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    if not is_leader:
+        if not state_backend.shared:
+            return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"message": "Executor not started yet.", "reason": "NOT_READY"}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        await state_backend.submit_signal(raw_data)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"message": "Signal forwarded to the executor worker."})
+    if not broker_ready:
+        if len(pending_signals) >= MAX_PENDING_SIGNALS:
+            logger.warning("Broker not ready and pending signal queue is full, rejecting signal.")
+            return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"message": "Broker not connected yet.", "reason": "NOT_READY"}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        pending_signals.append(raw_data)
+        logger.info(f"Broker not ready, queued signal ({len(pending_signals)} pending)")
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"message": "Broker not connected yet, signal queued."})
+    return await process_signal(raw_data)
+
+async def process_signal(raw_data:str)->JSONResponse:
+    global api,risk_management,state
+    state.set_balance(await api.balance()) #type: ignore
     logger.info(f"\n\nReceived raw data from notification: {raw_data}\n\n")
-    if account_details.P_n_L_day <= risk_management.drawback_threshold:
+    P_n_L_day = pnl_ledger.today(risk_management.local_timezone)
+    if P_n_L_day <= risk_management.drawback_threshold:
         logger.warning("P_n_L_day is below the threshold. Trade signal processing halted.")
-        return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"message": "Trade signal processing halted due to P_n_L_day threshold."})
+        return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"message": "Trade signal processing halted due to P_n_L_day threshold.", "reason": DAILY_DRAWDOWN})
     try:
         trade_data = parse_signal(text=raw_data)
         if not trade_data:
             #type: ignore
             return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": "Invalid trade signal data."})
-        asyncio.create_task(take_trade(trade_data))#type: ignore
+        return schedule_signal(trade_data, P_n_L_day) #type: ignore
+    except SignalRejected as e:
+        return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"message": e.message, "reason": e.reason})
     except (Exception,KeyboardInterrupt) as e:
         logger.error(f"Error taking trade: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error taking trade: {e}")
+
+def schedule_signal(trade_data:Signal, P_n_L_day:float)->JSONResponse:
+    # arm, risk-check and schedule a signal already registered in state
+    global api,risk_management,state
+    try:
+        order = arm_order(api, trade_data.signal_details.asset+"_otc", trade_data.signal_details.direction, risk_management.initial_amount, risk_management.timeframe) #type: ignore
+    except ValueError as e:
+        logger.error(f"Could not arm order for signal {trade_data.signal_id}: {e}") #type: ignore
+        state.remove_signal(trade_data.signal_id) #type: ignore
+        entry_policy.forget(trade_data.signal_id) #type: ignore
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": f"Invalid trade signal data: {e}"})
+    signal_details = trade_data.signal_details #type: ignore
+    reason = risk_engine.check(signal_details.signal_provider, order.asset, order.amount, P_n_L_day, risk_management)
+    if reason:
+        logger.warning(f"Signal {trade_data.signal_id} rejected by risk engine: {reason}") #type: ignore
+        state.remove_signal(trade_data.signal_id) #type: ignore
+        entry_policy.forget(trade_data.signal_id) #type: ignore
+        return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"message": "Trade signal rejected by risk management.", "reason": reason})
+    pending = PendingSignal(trade_data.signal_id, signal_details.signal_provider, order.asset, order.direction, #type: ignore
+                            ConflictIndex.slot(signal_details.entry_time, risk_management.conflict_window_seconds), order.amount)
+    resolution = conflicts.check(pending, risk_management.conflict_rule, provider_analytics.score)
+    for signal_id in resolution.cancel:
+        cancel_signal(signal_id)
+    if not resolution.accept:
+        state.remove_signal(trade_data.signal_id) #type: ignore
+        entry_policy.forget(trade_data.signal_id) #type: ignore
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"message": f"Trade signal resolved against an opposing signal ({risk_management.conflict_rule}).", "reason": OPPOSING_SIGNAL})
+    risk_engine.open(trade_data.signal_id, signal_details.signal_provider, order.asset, order.amount) #type: ignore
+    trade_store.record_signal(trade_data.signal_id, signal_details.signal_provider, order.asset, order.direction, signal_details.entry_time, order.amount) #type: ignore
+    if risk_management.signal_merge_policy != SEPARATE:
+        group, leads = consolidator.add(trade_data.signal_id, signal_details.signal_provider, order.asset, order.direction, #type: ignore
+                                        signal_details.entry_time, order.amount, risk_management.merge_window_seconds)
+        if not leads:
+            conflicts.grow(group.leader, pending.amount, pending.reduction)
+            return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Trade signal merged into a pending order.", "merged_into": group.leader})
+    conflicts.add(pending)
+    signal_tasks[trade_data.signal_id] = asyncio.create_task(take_trade(trade_data, order)) #type: ignore
     return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Trade signal received and processed successfully."})
     
 # Helper functions
-def parse_signal(text:str = "")->SIGNAL|bool:
-    global risk_management,Signals
+def zone(name:str):
+    # pytz is imported on first use, not while the server is starting
+    import pytz
+    return pytz.timezone(name)
+
+class SignalRejected(Exception):
+    """A parsed signal that must not be traded, with the reason code for the webhook caller."""
+    def __init__(self, reason:str, message:str):
+        super().__init__(f"{reason}: {message}")
+        self.reason = reason
+        self.message = message
+
+def signal_entry_time(entryTime:str, timezone:str, current_local_dt:datetime)->datetime:
+    # signal's HH:MM in its own timezone -> local entry datetime
+    SIGNAL_TIMEZONE = zone(str(timezone))
+    signal_time_obj = datetime.strptime(entryTime, "%H:%M").time()
+    signal_dt_in_signal_tz = SIGNAL_TIMEZONE.localize(datetime(current_local_dt.year, current_local_dt.month, current_local_dt.day,signal_time_obj.hour, signal_time_obj.minute, 0))
+    # Check if local time is before 6 AM
+    signal_tz_number = int(timezone[-2:])
+    local_tz_number = int(risk_management.local_timezone[-2:])
+    minTimezone = min(signal_tz_number,local_tz_number)
+    maxTimezone = max(signal_tz_number,local_tz_number)
+    rangeTimezone = range(minTimezone,maxTimezone)
+    if current_local_dt.hour < len(rangeTimezone):
+        signal_dt_in_signal_tz = signal_dt_in_signal_tz - timedelta(days=1)
+    return signal_dt_in_signal_tz.astimezone(zone(str(risk_management.local_timezone)))
+
+def signal_deadline(raw_data:str)->float|None:
+    # cheap look at a webhook body for admission: when is it too late to process it?
+    parsed_data = parse_macrodroid_trade_data(raw_data)
+    if not parsed_data.get("time") or not parsed_data.get("timezone"):
+        return None
+    current_local_dt = clock.now(zone(str(risk_management.local_timezone)))
+    try:
+        target_local_dt = signal_entry_time(parsed_data["time"], parsed_data["timezone"], current_local_dt)
+    except ValueError:
+        return None
+    return entry_deadline(target_local_dt, risk_management).timestamp()
+
+def parse_signal(text:str = "")->Signal|bool:
+    global risk_management,state
     #parse signal data
     parsed_data = parse_macrodroid_trade_data(text)
     logger.info(f"Parsed trade data: {parsed_data}")  
@@ -348,45 +1113,37 @@ def parse_signal(text:str = "")->SIGNAL|bool:
     # Validate direction
     if not direction.upper() in {"CALL", "PUT", "BUY", "SELL"}:
         return False
+    # Reject assets the broker is not offering right now
+    rejection = asset_catalog.check(asset_name_for_po+"_otc", risk_management.min_payout)
+    if rejection:
+        payout = asset_catalog.payout(asset_name_for_po+"_otc")
+        logger.warning(f"Signal for {asset_name_for_po} {direction} at {entryTime} from {signal_provider} rejected: {rejection} (payout {payout}, minimum {risk_management.min_payout})")
+        messages = {ASSET_UNKNOWN: f"{asset_name_for_po} is not offered by the broker.",
+                    ASSET_CLOSED: f"{asset_name_for_po} is closed for trading now.",
+                    PAYOUT_TOO_LOW: f"{asset_name_for_po} payout {payout}% is below the minimum {risk_management.min_payout}%."}
+        raise SignalRejected(rejection, messages[rejection])
     # Convert entry time to local timezone
-    LOCAL_TIMEZONE = pytz.timezone(str(risk_management.local_timezone))
-    current_local_dt = datetime.now(LOCAL_TIMEZONE)
-    SIGNAL_TIMEZONE = pytz.timezone(str(timezone))
+    LOCAL_TIMEZONE = zone(str(risk_management.local_timezone))
+    current_local_dt = clock.now(LOCAL_TIMEZONE)
     try:
-        signal_time_obj = datetime.strptime(entryTime, "%H:%M").time()
-        signal_dt_in_signal_tz = SIGNAL_TIMEZONE.localize(datetime(current_local_dt.year, current_local_dt.month, current_local_dt.day,signal_time_obj.hour, signal_time_obj.minute, 0))        
-        # Check if local time is before 6 AM
-        signal_tz_number = int(timezone[-2:])
-        logger.info(f"signal_tz_number: {timezone}")
-        local_tz_number = int(risk_management.local_timezone[-2:])
-        minTimezone = min(signal_tz_number,local_tz_number)
-        maxTimezone = max(signal_tz_number,local_tz_number)
-        rangeTimezone = range(minTimezone,maxTimezone)
-        logger.info(f"local_tz_number: {len(rangeTimezone)}")
-        if current_local_dt.hour < len(rangeTimezone):
-            signal_dt_in_signal_tz = signal_dt_in_signal_tz - timedelta(days=1)
-        target_local_dt = signal_dt_in_signal_tz.astimezone(LOCAL_TIMEZONE)
+        target_local_dt = signal_entry_time(entryTime, timezone, current_local_dt)
     except (Exception, KeyboardInterrupt) as e:
         logger.error(f"Error parsing or converting signal entry time '{entryTime}': {e}", exc_info=True)
         return False
-    logger.info(f"Signal entry time {signal_dt_in_signal_tz.tzinfo}: {entryTime}. Calculated local target entry time: {target_local_dt.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    logger.info(f"Signal entry time {timezone}: {entryTime}. Calculated local target entry time: {target_local_dt.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    decision = entry_policy.decide(signal_provider, target_local_dt, current_local_dt, risk_management)
     
-    data = {
-        "signal_id":f"{signal_provider}|{entryTime}|{asset_name_for_po}",
-        "signal_details":{"signal_provider": signal_provider,
-        "asset":asset_name_for_po,
-        "direction":direction,
-        "entry_time": target_local_dt
-            }
-        }
-    
-    signal_data = SIGNAL(**data)
+    signal_data = Signal(
+        signal_id=f"{signal_provider}|{entryTime}|{asset_name_for_po}",
+        signal_details=SignalFields(
+            signal_provider=signal_provider,
+            asset=asset_name_for_po,
+            direction=direction,
+            entry_time=decision.entry_time))
     
     logger.info(f"New signal received:{asset_name_for_po} {direction}. Initiating a new trade sequence. Initial Amount: ${risk_management.initial_amount}")
     try:
-        if signal_data.signal_id not in Signals:
-            Signals[signal_data.signal_id] = signal_data.signal_details
-        else:
+        if not state.add_signal(signal_data.signal_id, signal_data.signal_details):
             logger.warning(f"Signal for {asset_name_for_po} {direction} at {entryTime} from {signal_provider} already exists. Skipping duplicate signal.")
             return False
     except (Exception,KeyboardInterrupt) as e:
@@ -394,177 +1151,329 @@ def parse_signal(text:str = "")->SIGNAL|bool:
         del signal_data
         return False
     
-    if current_local_dt > target_local_dt + timedelta(seconds=1): # Allow a small buffer for late signals, e.g., up to 5 seconds past target entry time.
-            logger.warning(f"Signal for {asset_name_for_po} {direction} (Entry: {entryTime}) arrived late. "
+    entry_policy.record(signal_data.signal_id, signal_provider, decision)
+    trade_store.record_entry_decision(signal_data.signal_id, signal_provider, asset_name_for_po, decision.action, decision.late,
+                                      decision.bucket, target_local_dt, decision.entry_time, clock.time())
+    if decision.action == DROP:
+            logger.warning(f"Signal for {asset_name_for_po} {direction} (Entry: {entryTime}) arrived {decision.late:.1f}s late. "
                        f"Current local time: {current_local_dt.strftime('%d-%m-%Y %H:%M:%S')}, Target local time: {target_local_dt.strftime('%d-%m-%Y %H:%M:%S')}. "
                        f"Skipping trade.")
-            Signals.pop(signal_data.signal_id)
+            state.remove_signal(signal_data.signal_id)
             return False
+    if decision.action != ENTER:
+        logger.warning(f"Signal for {asset_name_for_po} {direction} (Entry: {entryTime}) arrived {decision.late:.1f}s late: {decision.action} at {decision.entry_time.strftime('%H:%M:%S')}")
     return signal_data
     
-async def take_trade(signal:SIGNAL):
-    global risk_management,api,trade_details,Signals
+async def take_trade(signal:Signal, order:PreArmedOrder):
+    global risk_management,risk_engine
+    won = None
+    try:
+        won = await place_signal_trade(signal, order)
+    finally:
+        release_signal(signal.signal_id, won)
+
+async def resume_sequence(trade:Trade):
+    # continue a sequence handed off by the previous process from its open leg
+    won = None
+    try:
+        won = await manage_martingale(trade=trade)
+    finally:
+        release_signal(trade.trade_details.signal_id, won)
+
+def release_signal(leader:str, won:bool|None):
+    global risk_management,risk_engine
+    signal_tasks.pop(leader, None)
+    drain.leave(leader)
+    conflicts.remove(leader)
+    group = consolidator.done(leader)
+    for signal_id in group.signal_ids if group else [leader]:
+        risk_engine.close(signal_id, won, risk_management)
+        if won is None:
+            entry_policy.forget(signal_id)
+        state.remove_signal(signal_id)
+
+def cancel_signal(signal_id:str):
+    """Cancel a signal whose order has not been sent; take_trade releases everything it held."""
+    global signal_tasks
+    task = signal_tasks.get(signal_id)
+    if task is not None and not task.done():
+        logger.warning(f"Cancelling pending signal {signal_id}")
+        task.cancel()
+
+async def place_signal_trade(signal:Signal, order:PreArmedOrder)->bool|None:
+    global risk_management,api,state
         # Place the initial trade
-    current_local_dt = datetime.now(pytz.timezone(str(risk_management.local_timezone)))
+    current_local_dt = clock.now(zone(str(risk_management.local_timezone)))
     try:
         #check entry status of trade_data        
         signal_data = signal.signal_details
-        time_to_wait_seconds = (signal_data.entry_time - current_local_dt- timedelta(milliseconds=0)).total_seconds()
+        # send early enough for the order to reach the broker at entry time on the broker's clock
+        fire_at = clock_sync.fire_at(signal_data.entry_time.timestamp())
+        time_to_wait_seconds = fire_at - current_local_dt.timestamp()
         if time_to_wait_seconds > 0:
-            logger.info(f"Waiting {time_to_wait_seconds:.2f} seconds until target entry time: {signal_data.entry_time.strftime('%H:%M:%S')}")
+            logger.info(f"Waiting {time_to_wait_seconds:.2f} seconds until target entry time: {signal_data.entry_time.strftime('%H:%M:%S')} (clock offset {clock_sync.offset * 1000:+.0f} ms, rtt {clock_sync.rtt * 1000:.0f} ms)")
             await asyncio.sleep(time_to_wait_seconds)
         else:
             logger.info(f"Signal arrived exactly at or slightly past target entry time ({current_local_dt.strftime('%H:%M:%S')} vs {signal_data.entry_time.strftime('%H:%M:%S')}). Placing trade immediately.")        
+        order = final_order(order, signal.signal_id)
+        if order is None:
+            return None
         try:
-            signal_direction = signal_data.direction
-            if signal_direction.upper() == "BUY" or signal_direction.upper() == "CALL": #type: ignore
-                (buy_id, Details) = await api.buy(
-                    asset=signal_data.asset+"_otc", 
-                    amount= risk_management.initial_amount, 
-                    time= risk_management.timeframe,
-                    check_win=False )
-            elif signal_direction.upper() == "SELL" or signal_direction.upper() == "PUT":
-                (buy_id, Details) = await api.sell(
-                    asset=signal_data.asset+"_otc",  
-                    amount= risk_management.initial_amount, 
-                    time= risk_management.timeframe, 
-                    check_win=False )
+            sent_at = clock.time()
+            drain.enter(signal.signal_id, lambda: reconcile_payload(
+                TradeFields(signal_provider=signal_data.signal_provider, asset=order.asset, direction=signal_data.direction,
+                            entry_time=signal_data.entry_time, level=0, open_price=0.0, amount=order.amount,
+                            signal_time=signal_data.entry_time, signal_id=signal.signal_id),
+                signal_data, consolidator.groups.get(signal.signal_id), sent_at))
+            (buy_id, Details) = await order.send()
+            received_at = clock.time()
         except (Exception,KeyboardInterrupt) as e:
             logger.error(f"Error placing trade for {signal_data.asset+"_otc", } {signal_data.direction}: {e}", exc_info=True)
-            Signals.pop(signal.signal_id)
+            state.remove_signal(signal.signal_id)
             del signal_data
             del signal
-            return
+            return None
         
         logger.info(f"\n\n======Trade placed successfully.=======\n -Trade ID: {buy_id}\n-Details: {Details}\n\n")
-        data = {
-        "trade_id":buy_id,
-        "trade_details":{"signal_provider": signal_data.signal_provider,
-        "asset":Details["asset"],
-        "direction":signal_data.direction,
-        "entry_time": datetime.strptime(Details["openTime"], "%Y-%m-%d %H:%M:%S"),
-        "level":0,
-        "open_price":Details["openPrice"],
-        "amount":float(Details["amount"])
-            }
-        }
-        trade = TRADE(**data)
+        opened_at = datetime.strptime(Details["openTime"], "%Y-%m-%d %H:%M:%S")
+        # broker open times are UTC
+        opened_ts = opened_at.replace(tzinfo=UTC).timestamp()
+        entry_slippage = opened_ts - signal_data.entry_time.timestamp()
+        clock_sync.observe(sent_at, received_at, opened_ts)
+        open_error = clock_sync.record_entry(signal_data.entry_time.timestamp(), opened_ts)
+        if open_error:
+            logger.warning(f"Trade for {Details['asset']} opened {open_error:+d}s from its intended entry second")
+        price_slippage = market_data.slippage(Details["asset"], signal_data.entry_time.timestamp(), float(Details["openPrice"]))
+        if price_slippage is not None:
+            logger.info(f"Entry slippage for {Details['asset']}: {entry_slippage:.3f}s, {price_slippage:+.6f} vs market at intended entry")
+        trade = Trade(
+            trade_id=buy_id,
+            trade_details=TradeFields(
+                signal_provider=signal_data.signal_provider,
+                asset=Details["asset"],
+                direction=signal_data.direction,
+                entry_time=opened_at,
+                level=0,
+                open_price=float(Details["openPrice"]),
+                amount=float(Details["amount"]),
+                signal_time=signal_data.entry_time,
+                entry_slippage=entry_slippage,
+                signal_id=signal.signal_id,
+                price_slippage=price_slippage))
         logger.info(f"trade details: {trade.trade_details}")
-        trade_details[trade.trade_id] = trade.trade_details
+        state.open_trade(trade.trade_id, trade.trade_details)
+        drain.leave(signal.signal_id)
+        record_leg_open(trade)
         # try:
         trade_results = await manage_martingale(trade=trade)
         if trade_results:
             logger.info(f"Signal for {trade.trade_details.signal_provider} at {signal_data.entry_time} was a success")
-            Signals.pop(signal.signal_id)
+            state.remove_signal(signal.signal_id)
             del signal_data
             del signal
         else:
             logger.info(f"Signal for {trade.trade_details.signal_provider} at {signal_data.entry_time}  Failed")
-            Signals.pop(signal.signal_id)
+            state.remove_signal(signal.signal_id)
             del signal_data
             del signal
-            
+        return trade_results
+
     except(Exception,KeyboardInterrupt) as e:
             logger.error(f"Error placing trade for {signal_data.asset+"_otc", } {signal_data.direction}: {e}", exc_info=True)
-            Signals.pop(signal.signal_id)
+            state.remove_signal(signal.signal_id)
             del trade
             del signal_data
             del signal
-            return
+            return None
 
     
-async def manage_martingale(trade:TRADE)-> bool:
-    global api,risk_management,account_details,trade_details,closed_trades
+def final_order(order:PreArmedOrder, signal_id:str)->PreArmedOrder|None:
+    """Apply consolidation and netting to a signal's order just before it is sent. None if nothing is left to send."""
+    global api,risk_engine,consolidator,conflicts
+    group = consolidator.fire(signal_id, risk_management.signal_merge_policy, provider_analytics.score)
+    pending = conflicts.remove(signal_id)
+    merged = group is not None and len(group) > 1
+    reduction = pending.reduction if pending is not None else 0.0
+    if not merged and not reduction:
+        return order
+    amount = round((group.amount if merged else order.amount) - reduction, 2) #type: ignore
+    if amount <= 0:
+        logger.warning(f"Order for {signal_id} was netted to nothing by opposing signals, not sending it")
+        return None
+    try:
+        final = arm_order(api, order.asset, order.direction, amount, order.timeframe)
+    except ValueError as e:
+        logger.error(f"Could not arm the adjusted order for {signal_id}, sending the original order: {e}")
+        return order
+    if merged:
+        logger.info(f"Sending one {final.direction} {final.asset} order for {len(group)} signals from {', '.join(group.providers)}") #type: ignore
+    if reduction:
+        logger.info(f"Netted ${reduction} of {signal_id} against opposing signals")
+    logger.info(f"Adjusted order for {signal_id}: ${order.amount} -> ${final.amount}")
+    # the whole stake now rides on the leader's sequence
+    for member in group.signal_ids if merged else [signal_id]: #type: ignore
+        risk_engine.stake(member, final.amount if member == signal_id else 0)
+    return final
+
+async def manage_martingale(trade:Trade)-> bool:
+    global api,risk_management,state
     current_trade = trade.trade_details
     logger.info(f"waiting for trade to end: {trade.trade_id}")
     logger.info(f"current trade details: {current_trade}")
+    # Arm the next martingale leg while this one is still open
+    next_order = None
+    if current_trade.level < risk_management.martingale_levels:
+        try:
+            next_order = arm_order(api, current_trade.asset, current_trade.direction, current_trade.amount * risk_management.martingale_multiplier, risk_management.timeframe)
+        except ValueError as e:
+            logger.error(f"Could not arm martingale order for {trade.trade_id}: {e}")
     try:
         status = await api.check_win(trade.trade_id)
         result = status["result"]
     except (Exception,KeyboardInterrupt) as e:
         logger.error(f"Error checking trade result for {trade.trade_id}: {e}", exc_info=True)
+        trade_store.record_leg_close(trade.trade_id, "UNKNOWN", None)
         # closed_trades[trade.trade_id] = {"trade_details":trade.trade_details,"result":"LOSS","from_server":None}
-        trade_details.pop(trade.trade_id)
+        state.close_trade(trade.trade_id)
         del current_trade
         del trade
         return False
     logger.info(status)
+    trade_store.record_leg_close(trade.trade_id, str(result).upper(), status.get("profit"))
     if result.upper() == "LOSS":
         # closed_trades[trade.trade_id] = {"trade_details":trade.trade_details,"result":"LOSS","from_server":status}
-        account_details.P_n_L_day = account_details.P_n_L_day - status["amount"]
-        account_details.lifespan = account_details.lifespan - status["amount"]
-        current_trade.level = current_trade.level + 1
-        if current_trade.level > risk_management.martingale_levels:
+        book_pnl(-status["amount"], trade.trade_id)
+        # TradeFields in state are shared with snapshots: never change them, swap in a new leg instead
+        current_trade = replace(current_trade, sequence_pnl=current_trade.sequence_pnl - status["amount"])
+        if next_order is not None:
+            # the next leg replaces this one's stake; it must still fit the open exposure cap
+            reason = risk_engine.check_leg(current_trade.signal_id, next_order.amount, risk_management)
+            if reason:
+                logger.warning(f"Martingale leg of ${next_order.amount} for {current_trade.signal_id} refused by risk engine: {reason}. Ending martingale sequence.")
+                next_order = None
+        if current_trade.level >= risk_management.martingale_levels or next_order is None:
             logger.warning(f"Max martingale levels reached for trade {trade.trade_id}. Ending martingale sequence.")
+            record_sequence(current_trade, won=False)
             # closed_trades[trade.trade_id] = {"trade_details":trade.trade_details,"result":"LOSS","from_server":status}
-            trade_details.pop(trade.trade_id)
+            state.close_trade(trade.trade_id)
             del current_trade
             del trade
             return False
-        logger.info(f"Trade {trade.trade_id} lost. Initiating martingale sequence. level: {int(current_trade.level)}")#type: ignore
-        new_amount = current_trade.amount * risk_management.martingale_multiplier
-        current_trade.amount = new_amount
-        logger.info(f"Placing martingale trade level {current_trade.level} for amount: ${new_amount}")
+        level = current_trade.level + 1
+        logger.info(f"Trade {trade.trade_id} lost. Initiating martingale sequence. level: {level}")
+        logger.info(f"Placing martingale trade level {level} for amount: ${next_order.amount}")
         try:
-            if current_trade.direction.upper() == "BUY" or current_trade.direction.upper() == "CALL": #type: ignore
-                (buy_id, Details) = await api.buy(
-                    asset=current_trade.asset, 
-                    amount= new_amount, 
-                    time= risk_management.timeframe, 
-                    check_win=False )
-            elif current_trade.direction.upper() == "SELL" or current_trade.direction.upper() == "PUT":
-                (buy_id, Details) = await api.sell(
-                    asset=current_trade.asset, 
-                    amount= new_amount, 
-                    time= risk_management.timeframe, 
-                    check_win=False )
+            sent_at = clock.time()
+            drain.enter(current_trade.signal_id, lambda: reconcile_payload(
+                replace(current_trade, level=level, amount=next_order.amount),
+                state.snapshot().signals.get(current_trade.signal_id), consolidator.groups.get(current_trade.signal_id), sent_at))
+            (buy_id, Details) = await next_order.send()
         except (Exception,KeyboardInterrupt) as e:
             logger.error(f"Error placing martingale trade for {current_trade.asset} {current_trade.direction}: {e}", exc_info=True)
             # closed_trades[trade.trade_id] = {"trade_details":trade.trade_details,"result":"LOSS","from_server":status}
-            account_details.P_n_L_day = float(account_details.P_n_L_day) - current_trade.amount
-            account_details.lifespan = float(account_details.lifespan) - current_trade.amount
-            trade_details.pop(trade.trade_id)
+            book_pnl(-next_order.amount, None)
+            record_sequence(replace(current_trade, level=level, amount=next_order.amount,
+                                    sequence_pnl=current_trade.sequence_pnl - next_order.amount), won=False)
+            state.close_trade(trade.trade_id)
             del current_trade
             del trade
             return False
         logger.info(f"\n\n======Martingale Trade placed successfully.=======\n -Trade ID: {buy_id}\n-Details: {Details}\n\n")
-        data = {
-        "trade_id":buy_id,
-        "trade_details":{"signal_provider": current_trade.signal_provider,
-        "asset":Details["asset"],
-        "direction":current_trade.direction,
-        "entry_time": datetime.strptime(Details["openTime"], "%Y-%m-%d %H:%M:%S"),
-        "level":current_trade.level,
-        "open_price":Details["openPrice"],
-        "entry_id":buy_id,
-        "amount":float(Details["amount"])
-            }
-        }
-        trade_details.pop(trade.trade_id)
-        trade = TRADE(**data)
-        trade_details[trade.trade_id] = trade.trade_details
+        previous_trade_id = trade.trade_id
+        trade = Trade(
+            trade_id=buy_id,
+            trade_details=replace(
+                current_trade,
+                asset=Details["asset"],
+                entry_time=datetime.strptime(Details["openTime"], "%Y-%m-%d %H:%M:%S"),
+                level=level,
+                open_price=float(Details["openPrice"]),
+                amount=float(Details["amount"])))
+        state.replace_trade(previous_trade_id, trade.trade_id, trade.trade_details)
+        drain.leave(current_trade.signal_id)
+        record_leg_open(trade)
+        risk_engine.stake(current_trade.signal_id, trade.trade_details.amount)
         status_results = await manage_martingale(trade=trade)
         return status_results
     else:
         logger.info(f"Trade {trade.trade_id} won or tied. Martingale sequence completed.")
         print(f"==trade result==\n -Asset:{current_trade.asset}\n -lastest amount: {current_trade.amount}\n -martingale level: {current_trade.level}\n -profit/loss: {status["profit"]}\n")
         # closed_trades[trade.trade_id] = {"trade_details":trade.trade_details,"result":"WON","from_server":status}
-        trade_details.pop(trade.trade_id)
+        state.close_trade(trade.trade_id)
+        book_pnl(status["profit"], trade.trade_id)
+        record_sequence(replace(current_trade, sequence_pnl=current_trade.sequence_pnl + status["profit"]), won=True)
         del current_trade
         del trade
-        account_details.P_n_L_day = account_details.P_n_L_day + status["profit"]
-        account_details.lifespan = account_details.lifespan + status["profit"]
         return True
+
+def record_sequence(current_trade:TradeFields, won:bool):
+    global provider_analytics,consolidator
+    hour = current_trade.signal_time.hour if current_trade.signal_time else current_trade.entry_time.hour
+    # a merged order's result is shared among its signals in proportion to their stakes
+    group = consolidator.groups.get(current_trade.signal_id)
+    shares = group.shares() if group is not None else [(current_trade.signal_id, current_trade.signal_provider, 1.0)]
+    # each signal's own decided entry time identifies this occurrence of its (daily repeating) id
+    signals = state.snapshot().signals
+    sequence_entry = current_trade.signal_time or current_trade.entry_time.replace(tzinfo=UTC)
+    try:
+        for signal_id, provider, share in shares:
+            pnl = round(current_trade.sequence_pnl * share, 2)
+            provider_analytics.record(
+                provider=provider,
+                asset=current_trade.asset,
+                hour=hour,
+                won=won,
+                depth=current_trade.level,
+                pnl=pnl,
+                slippage=current_trade.entry_slippage)
+            entry_policy.record_outcome(signal_id, won, pnl)
+            trade_store.record_sequence(
+                signal_id=signal_id,
+                provider=provider,
+                asset=current_trade.asset,
+                hour=hour,
+                won=won,
+                depth=current_trade.level,
+                pnl=pnl,
+                entry_slippage=current_trade.entry_slippage,
+                price_slippage=current_trade.price_slippage,
+                entry_time=signals[signal_id].entry_time if signal_id in signals else sequence_entry)
+    except Exception as e:
+        logger.error(f"Failed to record sequence analytics: {e}", exc_info=True)
+
+def record_leg_open(trade:Trade):
+    global trade_store
+    details = trade.trade_details
+    trade_store.record_leg_open(
+        trade_id=trade.trade_id,
+        signal_id=details.signal_id,
+        provider=details.signal_provider,
+        asset=details.asset,
+        direction=details.direction,
+        level=details.level,
+        amount=details.amount,
+        open_price=details.open_price,
+        # broker open times are UTC
+        opened_at=details.entry_time.replace(tzinfo=UTC))
     
-async def reset_P_n_L_day():
-    
-    global account_details
+async def watch_market_data():
+    global api,market_data,state
     while True:
-        now = datetime.now(pytz.timezone(risk_management.local_timezone))
-        next_reset = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        wait_seconds = (next_reset - now).total_seconds()
-        await asyncio.sleep(wait_seconds)
-        account_details.P_n_L_day = 0
+        try:
+            snapshot = state.snapshot()
+            assets = {signal.asset+"_otc" for signal in snapshot.signals.values()}
+            assets.update(trade.asset for trade in snapshot.trades.values())
+            market_data.sync(api, assets)
+        except Exception as e:
+            logger.error(f"Failed to sync market data subscriptions: {e}", exc_info=True)
+        await asyncio.sleep(1)
+
+def book_pnl(amount:float, trade_id:str|None):
+    global pnl_ledger,trade_store
+    # every P/L change goes through the ledger; day and week totals are derived from it
+    ts = clock.time()
+    pnl_ledger.record(amount, ts)
+    trade_store.record_pnl(amount, ts, trade_id)
         
         
         
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from array import array
+from typing import Callable
+
+from price_series import candle_time
+
+logger = logging.getLogger(__name__)
+
+RING_SIZE = 4096
+
+
+class TickRing:
+    """Fixed-size ring buffer of (timestamp, price) ticks.
+
+    Both arrays are allocated once; writing a tick overwrites a slot in place.
+    """
+    __slots__ = ("times", "prices", "size", "head", "count")
+
+    def __init__(self, size: int = RING_SIZE):
+        self.times = array("d", bytes(8 * size))
+        self.prices = array("d", bytes(8 * size))
+        self.size = size
+        self.head = 0
+        self.count = 0
+
+    def write(self, ts: float, price: float) -> None:
+        head = self.head
+        self.times[head] = ts
+        self.prices[head] = price
+        self.head = head + 1 if head + 1 < self.size else 0
+        if self.count < self.size:
+            self.count += 1
+
+    def last(self) -> tuple[float, float] | None:
+        if not self.count:
+            return None
+        i = self.head - 1 if self.head else self.size - 1
+        return self.times[i], self.prices[i]
+
+    def price_at(self, ts: float) -> float | None:
+        """Last price at or before `ts`, found by binary search over the ring."""
+        if not self.count:
+            return None
+        start = (self.head - self.count) % self.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[(start + mid) % self.size] <= ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        return self.prices[(start + lo - 1) % self.size]
+
+
+class MarketData:
+    """Live tick subscriptions for the assets we currently care about.
+
+    `sync` is given the set of broker symbols with open trades or pending
+    signals; it subscribes to new ones and drops the rest. Readers get the
+    latest price from the ring without a broker round-trip.
+    """
+
+    def __init__(self, ring_size: int = RING_SIZE, now: Callable[[], float] = time.time):
+        self.ring_size = ring_size
+        self.now = now
+        self.rings: dict[str, TickRing] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def ring(self, asset: str) -> TickRing:
+        ring = self.rings.get(asset)
+        if ring is None:
+            ring = self.rings[asset] = TickRing(self.ring_size)
+        return ring
+
+    def last_price(self, asset: str, max_age: float = 10.0) -> float | None:
+        ring = self.rings.get(asset)
+        last = ring.last() if ring is not None else None
+        if last is None or self.now() - last[0] > max_age:
+            return None
+        return last[1]
+
+    def slippage(self, asset: str, ts: float, open_price: float) -> float | None:
+        """Difference between the broker open price and the market price at `ts`."""
+        ring = self.rings.get(asset)
+        price = ring.price_at(ts) if ring is not None else None
+        if price is None:
+            return None
+        return open_price - price
+
+    async def _stream(self, api, asset: str) -> None:
+        ring = self.ring(asset)
+        while True:
+            try:
+                async for tick in await api.subscribe_symbol(asset):
+                    ts = candle_time(tick)
+                    price = tick.get("close", tick.get("price"))
+                    if ts is None or price is None:
+                        continue
+                    ring.write(ts, float(price))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Tick stream for {asset} failed: {e}")
+            await asyncio.sleep(1)
+
+    def watch(self, api, asset: str) -> None:
+        task = self._tasks.get(asset)
+        if task is None or task.done():
+            self._tasks[asset] = asyncio.create_task(self._stream(api, asset))
+
+    def sync(self, api, assets: set[str]) -> None:
+        for asset in assets:
+            self.watch(api, asset)
+        for asset in list(self._tasks):
+            if asset not in assets:
+                self._tasks.pop(asset).cancel()
+                unsubscribe = getattr(api, "unsubscribe", None)
+                if unsubscribe is not None:
+                    asyncio.create_task(self._unsubscribe(unsubscribe, asset))
+
+    async def _unsubscribe(self, unsubscribe, asset: str) -> None:
+        try:
+            await unsubscribe(asset)
+        except Exception as e:
+            logger.debug(f"Unsubscribe from {asset} failed: {e}")
+
+    def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
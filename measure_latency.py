@@ -0,0 +1,110 @@
+# measure_latency.py - startup latency measurements and budget guard
+#
+#   python measure_latency.py            print import and startup timings
+#   python measure_latency.py --check    exit with status 1 if a budget is exceeded
+#
+# Startup is measured from launching uvicorn to the first successful
+# GET /healthz. No ssid is passed, so the broker connection is never
+# attempted and the number reflects only our own startup path. The trade
+# history goes to a temporary directory, never into the checkout.
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_BUDGET_SECONDS = 1.0
+STARTUP_BUDGET_SECONDS = 2.0
+
+
+def _env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env["ssid"] = ""
+    env["PO_LOG_RICH"] = "0"
+    env["PO_TRADE_DB"] = os.path.join(workdir, "trades.db")
+    return env
+
+
+def measure_import(workdir: str, runs: int = 3) -> float:
+    """Best-of-N wall time of `import main` in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=_env(workdir), capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return min(timings)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def measure_startup(workdir: str, timeout: float = 30.0) -> tuple[float, int]:
+    """Seconds from process launch to a 200 from /healthz, plus the /readyz status at that point."""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=HERE, env=_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if _get(f"http://127.0.0.1:{port}/healthz") == 200:
+                    elapsed = time.perf_counter() - started
+                    return elapsed, _get(f"http://127.0.0.1:{port}/readyz")
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {proc.returncode}")
+            time.sleep(0.01)
+        raise TimeoutError(f"/healthz did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure import and startup latency of the signal bot.")
+    parser.add_argument("--check", action="store_true", help="fail if a budget is exceeded")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_SECONDS)
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="po-latency-") as workdir:
+        import_seconds = measure_import(workdir)
+        startup_seconds, ready_status = measure_startup(workdir)
+    print(f"import main:          {import_seconds * 1000:8.1f} ms (budget {args.import_budget * 1000:.0f} ms)")
+    print(f"launch -> /healthz:   {startup_seconds * 1000:8.1f} ms (budget {args.startup_budget * 1000:.0f} ms)")
+    print(f"/readyz without broker: {ready_status}")
+
+    if not args.check:
+        return 0
+    failures = []
+    if import_seconds > args.import_budget:
+        failures.append(f"import took {import_seconds:.3f}s > {args.import_budget}s")
+    if startup_seconds > args.startup_budget:
+        failures.append(f"startup took {startup_seconds:.3f}s > {args.startup_budget}s")
+    if ready_status != 503:
+        failures.append(f"/readyz returned {ready_status} without a broker, expected 503")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+# Runtime records for live signals and trades. One is built per signal and per
+# martingale leg, so they are slotted dataclasses without validation; pydantic
+# models stay at the HTTP and config boundary.
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+
+@dataclass(slots=True)
+class SignalFields:
+    signal_provider: str
+    asset: str
+    direction: str
+    entry_time: datetime
+
+
+@dataclass(slots=True)
+class Signal:
+    signal_id: str
+    signal_details: SignalFields
+
+
+@dataclass(slots=True)
+class TradeFields:
+    signal_provider: str
+    asset: str
+    direction: str
+    entry_time: datetime
+    level: int
+    open_price: float
+    amount: float
+    # carried across martingale legs for analytics
+    signal_time: Optional[datetime] = None
+    entry_slippage: float = 0.0
+    sequence_pnl: float = 0.0
+    signal_id: str = ""
+    price_slippage: Optional[float] = None
+
+
+@dataclass(slots=True)
+class Trade:
+    trade_id: str
+    trade_details: TradeFields
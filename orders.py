@@ -0,0 +1,51 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+CALL_DIRECTIONS = frozenset({"BUY", "CALL"})
+PUT_DIRECTIONS = frozenset({"SELL", "PUT"})
+
+
+class PreArmedOrder:
+    """An order whose broker call is fully prepared before entry time.
+
+    Direction mapping, symbol building, amount calculation and validation all
+    happen in `arm_order`; `send()` only awaits the bound broker method.
+    """
+    __slots__ = ("asset", "amount", "timeframe", "direction", "_place", "_kwargs")
+
+    def __init__(self, place, asset: str, amount: float, timeframe: int, direction: str):
+        self.asset = asset
+        self.amount = amount
+        self.timeframe = timeframe
+        self.direction = direction
+        self._place = place
+        self._kwargs = {"asset": asset, "amount": amount, "time": timeframe, "check_win": False}
+
+    async def send(self):
+        return await self._place(**self._kwargs)
+
+    def __repr__(self) -> str:
+        return f"PreArmedOrder({self.direction} {self.asset} ${self.amount} {self.timeframe}s)"
+
+
+def arm_order(api, asset: str, direction: str, amount: float, timeframe: int) -> PreArmedOrder:
+    """Validate the order parameters and bind the matching broker call.
+
+    `asset` is the broker symbol (already suffixed with `_otc` where needed).
+    Raises ValueError when the order could never be placed.
+    """
+    side = direction.upper()
+    if side in CALL_DIRECTIONS:
+        place = api.buy
+    elif side in PUT_DIRECTIONS:
+        place = api.sell
+    else:
+        raise ValueError(f"Unknown trade direction: {direction}")
+    if not asset:
+        raise ValueError("Order asset is empty")
+    if amount <= 0:
+        raise ValueError(f"Order amount must be positive, got {amount}")
+    if timeframe <= 0:
+        raise ValueError(f"Order timeframe must be positive, got {timeframe}")
+    return PreArmedOrder(place, asset, float(amount), int(timeframe), side)
@@ -0,0 +1,90 @@
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable
+
+
+# deltas are bucketed into UTC quarter hours, the finest offset any timezone uses
+SLOT_SECONDS = 900
+
+
+def _zone(name: str):
+    # imported on first use to keep it off the startup path
+    import pytz
+    return pytz.timezone(name)
+
+
+class _CalendarView:
+    """Day and week totals for one timezone."""
+    __slots__ = ("tz", "days", "weeks")
+
+    def __init__(self, tz):
+        self.tz = tz
+        self.days: dict[date, float] = {}
+        self.weeks: dict[date, float] = {}
+
+    def add(self, slot: int, amount: float) -> None:
+        day = datetime.fromtimestamp(slot * SLOT_SECONDS, self.tz).date()
+        week = day - timedelta(days=day.weekday())
+        self.days[day] = self.days.get(day, 0.0) + amount
+        self.weeks[week] = self.weeks.get(week, 0.0) + amount
+
+
+class PnlLedger:
+    """Running P/L totals built from timestamped deltas.
+
+    Every delta lands in a UTC quarter-hour slot and updates the lifetime
+    total and the day/week totals of each timezone that has been read, so
+    recording is O(1) and there is no midnight reset to schedule. Calendar
+    days are resolved in the timezone passed on read; the first read in a
+    new timezone builds its totals once from the slots, never from entries.
+    """
+
+    def __init__(self, now: Callable[[], float] = time.time):
+        self.now = now
+        self.slots: dict[int, float] = {}
+        self.lifetime = 0.0
+        self._views: dict[str, _CalendarView] = {}
+
+    def load(self, slots: Iterable[tuple[int, float]]) -> None:
+        """Seed from persisted (slot, total) pairs, e.g. `TradeStore.pnl_slots`."""
+        self.slots = {}
+        self.lifetime = 0.0
+        self._views = {}
+        for slot, amount in slots:
+            self.slots[slot] = self.slots.get(slot, 0.0) + amount
+            self.lifetime += amount
+
+    def record(self, amount: float, ts: float | None = None) -> None:
+        slot = int((self.now() if ts is None else ts) // SLOT_SECONDS)
+        self.slots[slot] = self.slots.get(slot, 0.0) + amount
+        self.lifetime += amount
+        for view in self._views.values():
+            view.add(slot, amount)
+
+    def _view(self, timezone: str) -> _CalendarView:
+        view = self._views.get(timezone)
+        if view is None:
+            view = _CalendarView(_zone(timezone))
+            for slot, amount in self.slots.items():
+                view.add(slot, amount)
+            self._views[timezone] = view
+        return view
+
+    def local_date(self, timezone: str, ts: float | None = None) -> date:
+        return datetime.fromtimestamp(self.now() if ts is None else ts, _zone(timezone)).date()
+
+    def day(self, timezone: str, day: date | None = None) -> float:
+        day = day or self.local_date(timezone)
+        return round(self._view(timezone).days.get(day, 0.0), 2)
+
+    def week(self, timezone: str, day: date | None = None) -> float:
+        day = day or self.local_date(timezone)
+        return round(self._view(timezone).weeks.get(day - timedelta(days=day.weekday()), 0.0), 2)
+
+    def today(self, timezone: str) -> float:
+        return self.day(timezone)
+
+    def summary(self, timezone: str, day: date | None = None) -> dict:
+        day = day or self.local_date(timezone)
+        return {"day": day.isoformat(), "P_n_L_day": self.day(timezone, day),
+                "P_n_L_week": self.week(timezone, day), "lifespan": round(self.lifetime, 2)}
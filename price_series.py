@@ -0,0 +1,135 @@
+import logging
+from array import array
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MAX_POINTS = 2000
+
+
+def candle_time(candle: dict) -> float | None:
+    value = candle.get("time", candle.get("timestamp"))
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def _candle_price(candle: dict, *keys: str) -> float:
+    for key in keys:
+        value = candle.get(key)
+        if value is not None:
+            return float(value)
+    return float("nan")
+
+
+class PriceSeries:
+    """Candle history for one asset stored as parallel float arrays."""
+    __slots__ = ("times", "opens", "highs", "lows", "closes", "max_points", "fetched_at")
+
+    def __init__(self, max_points: int = MAX_POINTS):
+        self.times = array("d")
+        self.opens = array("d")
+        self.highs = array("d")
+        self.lows = array("d")
+        self.closes = array("d")
+        self.max_points = max_points
+        # when candles were last fetched from the broker, 0 if never
+        self.fetched_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def last_price(self) -> float | None:
+        return self.closes[-1] if self.closes else None
+
+    def add(self, ts: float, open_: float, high: float, low: float, close: float) -> None:
+        # the broker repeats the still-forming candle, overwrite it in place
+        if self.times and ts <= self.times[-1]:
+            if ts < self.times[-1]:
+                return
+            self.highs[-1] = max(self.highs[-1], high)
+            self.lows[-1] = min(self.lows[-1], low)
+            self.closes[-1] = close
+            return
+        self.times.append(ts)
+        self.opens.append(open_)
+        self.highs.append(high)
+        self.lows.append(low)
+        self.closes.append(close)
+        if len(self.times) > self.max_points:
+            drop = len(self.times) - self.max_points
+            for column in (self.times, self.opens, self.highs, self.lows, self.closes):
+                del column[:drop]
+
+    def update_from_candles(self, candles, fetched_at: float | None = None) -> None:
+        """Merge a raw `get_candles()` result into the series, fetched at `fetched_at`."""
+        if fetched_at is not None:
+            self.fetched_at = fetched_at
+        if not isinstance(candles, list):
+            return
+        for candle in candles:
+            if not isinstance(candle, dict):
+                continue
+            ts = candle_time(candle)
+            if ts is None:
+                continue
+            close = _candle_price(candle, "close", "c", "price", "open")
+            self.add(
+                ts,
+                _candle_price(candle, "open", "o", "price", "close"),
+                _candle_price(candle, "high", "h", "close", "price"),
+                _candle_price(candle, "low", "l", "close", "price"),
+                close)
+
+    def window(self, limit: int) -> dict:
+        start = max(len(self.times) - limit, 0)
+        return {
+            "time": self.times[start:].tolist(),
+            "open": self.opens[start:].tolist(),
+            "high": self.highs[start:].tolist(),
+            "low": self.lows[start:].tolist(),
+            "close": self.closes[start:].tolist(),
+        }
+
+
+class PriceStore:
+    """Per-asset price series keyed by broker symbol."""
+
+    def __init__(self, max_points: int = MAX_POINTS):
+        self.max_points = max_points
+        self._series: dict[str, PriceSeries] = {}
+
+    def __contains__(self, asset: str) -> bool:
+        return asset in self._series
+
+    def series(self, asset: str) -> PriceSeries:
+        series = self._series.get(asset)
+        if series is None:
+            series = self._series[asset] = PriceSeries(self.max_points)
+        return series
+
+    def last_price(self, asset: str) -> float | None:
+        series = self._series.get(asset)
+        return series.last_price if series is not None else None
+
+
+def price_points(open_price: float, price: float, direction: str, decimals: int) -> int:
+    """Price move in the trade's favour, in units of the asset's last quoted decimal (`decimals` places)."""
+    diff = price - open_price if direction.upper() in ("BUY", "CALL") else open_price - price
+    return round(diff * 10 ** decimals)
+
+
+def live_pnl(open_price: float, price: float, direction: str, amount: float, payout: float | None) -> float:
+    """What the trade would return if it closed at `price`."""
+    diff = price - open_price if direction.upper() in ("BUY", "CALL") else open_price - price
+    if diff > 0:
+        return round(amount * (payout or 0) / 100, 2)
+    if diff < 0:
+        return -round(amount, 2)
+    return 0.0
@@ -0,0 +1,278 @@
+# replay.py - replay recorded signals through the trading pipeline on a virtual clock
+#
+#   python replay.py generate day.jsonl --signals 400 --date 2026-10-19
+#   python replay.py run day.jsonl --output run.json
+#   python replay.py run day.jsonl --compare run.json
+#
+# A log is JSON lines with "ts" (unix seconds or ISO 8601) and "text" (the raw
+# notification), the format written by PO_SIGNAL_RECORD. Every signal goes
+# through process_signal -> parse_signal -> take_trade -> manage_martingale
+# exactly as in production, against a fake broker whose outcomes depend only
+# on the seed and the trade (asset, direction, open time, level), so the same
+# log and seed always give the same results.
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from clock import VirtualClock
+from parse_data import parse_macrodroid_trade_data
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ASSETS = ("EURUSD", "GBPJPY", "USDJPY", "AUDUSD", "USDCHF", "EURGBP", "AUDCAD", "NZDUSD")
+DEFAULT_PROVIDERS = ("alpha", "bravo", "charlie")
+
+
+class FakeBroker:
+    """Deterministic stand-in for PocketOptionAsync, driven by the replay clock."""
+
+    def __init__(self, clock: VirtualClock, assets, seed: int = 0, win_rate: float = 0.55, payout: int = 85,
+                 balance: float = 1000.0, latency: float = 0.05):
+        self.clock = clock
+        self.seed = seed
+        self.win_rate = win_rate
+        self.payouts = {f"{asset}_otc": payout for asset in assets}
+        self._balance = balance
+        self.latency = latency
+        self.trades: dict[str, dict] = {}
+
+    async def payout(self):
+        return dict(self.payouts)
+
+    async def balance(self):
+        return round(self._balance, 2)
+
+    async def opened_deals(self):
+        # keyed by trade id, like the real client
+        return {t["id"]: t for t in self.trades.values() if "result" not in t}
+
+    async def get_candles(self, asset, period, offset):
+        return []
+
+    async def get_server_time(self):
+        await asyncio.sleep(self.latency)
+        return int(self.clock.time())
+
+    async def _place(self, side: str, asset: str, amount: float, time: int, check_win: bool = False):
+        await asyncio.sleep(self.latency)
+        opened = int(self.clock.time())
+        trade_id = f"{side}-{len(self.trades) + 1}"
+        self._balance -= amount
+        details = {"asset": asset, "openTime": datetime.fromtimestamp(opened, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                   "openPrice": 1.0, "amount": amount}
+        self.trades[trade_id] = {"id": trade_id, "side": side, "opened": opened, "time": time} | details
+        return trade_id, details
+
+    async def buy(self, asset: str, amount: float, time: int, check_win: bool = False):
+        return await self._place("buy", asset, amount, time, check_win)
+
+    async def sell(self, asset: str, amount: float, time: int, check_win: bool = False):
+        return await self._place("sell", asset, amount, time, check_win)
+
+    async def check_win(self, trade_id: str):
+        trade = self.trades[trade_id]
+        await asyncio.sleep(max(0.0, trade["opened"] + trade["time"] - self.clock.time()) + self.latency)
+        if "result" not in trade:
+            # keyed by the trade itself, not by call order, so scheduling changes cannot reshuffle outcomes
+            roll = random.Random(f"{self.seed}|{trade['asset']}|{trade['side']}|{trade['opened']}|{trade['amount']}").random()
+            won = roll < self.win_rate
+            profit = round(trade["amount"] * self.payouts.get(trade["asset"], 0) / 100, 2) if won else -trade["amount"]
+            if won:
+                self._balance += trade["amount"] + profit
+            trade["result"] = {"result": "win" if won else "loss", "profit": profit, "amount": trade["amount"]}
+        return trade["result"]
+
+
+def _parse_ts(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.fromisoformat(str(value))
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def load_log(path: str) -> list[tuple[float, str]]:
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries.append((_parse_ts(entry["ts"]), entry["text"]))
+    # stable sort keeps the recorded order of signals that share a timestamp
+    return sorted(entries, key=lambda e: e[0])
+
+
+def generate_log(path: str, signals: int, day: str, seed: int = 0, tz: str = "Etc/GMT-2") -> None:
+    """Write a synthetic day of signals: arrivals spread over the day, entries 1-3 minutes ahead."""
+    rng = random.Random(seed)
+    signal_tz = pytz.timezone(tz)
+    start = signal_tz.localize(datetime.fromisoformat(day))
+    arrivals = sorted(rng.uniform(0, 86400 - 600) for _ in range(signals))
+    with open(path, "w", encoding="utf-8") as f:
+        for offset in arrivals:
+            arrival = start + timedelta(seconds=offset)
+            entry = (arrival + timedelta(minutes=rng.randint(1, 3))).replace(second=0, microsecond=0)
+            asset = rng.choice(DEFAULT_ASSETS)
+            text = (f"{asset[:3]}/{asset[3:]} OTC\nEntry at {entry.strftime('%H:%M')}\n{rng.choice(('BUY', 'SELL'))}\n"
+                    f'signal_provider="{rng.choice(DEFAULT_PROVIDERS)}"\ntimezone="{tz}"')
+            f.write(json.dumps({"ts": round(arrival.timestamp(), 3), "text": text}) + "\n")
+
+
+async def _replay(entries, vclock: VirtualClock, broker: FakeBroker, settings: dict) -> dict:
+    # imported here so generate/compare do not pay for the app import
+    import main
+    from analytics import ProviderAnalytics
+    from asset_catalog import AssetCatalog
+    from broker_gateway import BrokerGateway
+    from clock_sync import ClockSync
+    from conflicts import ConflictIndex
+    from consolidation import SignalConsolidator
+    from entry_policy import EntryPolicy
+    from market_data import MarketData
+    from pnl_ledger import PnlLedger
+    from risk_engine import RiskEngine
+    from state import StateManager
+    from trade_store import TradeStore
+
+    # fresh pipeline state on the virtual clock; the trade store is never opened, so nothing touches disk
+    main.clock = vclock
+    main.api = BrokerGateway(broker)
+    main.state = StateManager()
+    main.risk_engine = RiskEngine(now=vclock.time)
+    main.pnl_ledger = PnlLedger(now=vclock.time)
+    main.provider_analytics = ProviderAnalytics()
+    main.clock_sync = ClockSync()
+    main.entry_policy = EntryPolicy()
+    main.consolidator = SignalConsolidator()
+    main.conflicts = ConflictIndex(now=vclock.time)
+    main.signal_tasks = {}
+    main.market_data = MarketData(now=vclock.time)
+    main.trade_store = TradeStore(":memory:")
+    main.asset_catalog = AssetCatalog()
+    await main.asset_catalog.refresh(main.api)
+    main.apply_risk_management(main.RISK_MANAGEMENT(**settings))
+    main.broker_ready = True
+    main.is_leader = True
+
+    responses: dict[str, int] = {}
+    for ts, text in entries:
+        delay = ts - vclock.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            response = await main.process_signal(text)
+            body = json.loads(bytes(response.body))
+            key = body.get("reason") or str(response.status_code)
+        except main.HTTPException as e:
+            key = str(e.status_code)
+        responses[key] = responses.get(key, 0) + 1
+    # let every scheduled trade and martingale sequence finish
+    current = asyncio.current_task()
+    while pending := [t for t in asyncio.all_tasks() if t is not current]:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    legs = [t for t in broker.trades.values() if "result" in t]
+    by_provider = main.provider_analytics.stats("provider")["provider"]
+    return {
+        "signals": len(entries),
+        "responses": dict(sorted(responses.items())),
+        "sequences": sum(row["trades"] for row in by_provider),
+        "legs": len(legs),
+        "legs_won": sum(1 for t in legs if t["result"]["result"] == "win"),
+        "pnl": round(main.pnl_ledger.lifetime, 2),
+        "final_balance": await broker.balance(),
+        "providers": by_provider,
+        "entry_precision": main.clock_sync.snapshot()["open_time_error"],
+        "entry_policy": main.entry_policy.snapshot(),
+        "consolidation": main.consolidator.snapshot(),
+        "conflicts": main.conflicts.snapshot(0)["counts"],
+    }
+
+
+def run(path: str, seed: int = 0, win_rate: float = 0.55, settings: dict | None = None, verbose: bool = False) -> dict:
+    entries = load_log(path)
+    if not entries:
+        raise ValueError(f"{path} contains no signals")
+    assets = set(DEFAULT_ASSETS)
+    assets.update(p["asset"] for p in (parse_macrodroid_trade_data(text) for _, text in entries) if p.get("asset"))
+    vclock = VirtualClock(start=entries[0][0] - 1)
+    broker = FakeBroker(vclock, sorted(assets), seed=seed, win_rate=win_rate)
+    loop = vclock.new_event_loop()
+    if not verbose:
+        logging.disable(logging.WARNING)
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) if not verbose else contextlib.nullcontext():
+            results = loop.run_until_complete(_replay(entries, vclock, broker, settings or {}))
+    finally:
+        loop.close()
+        logging.disable(logging.NOTSET)
+    wall = time.perf_counter() - started
+    return {
+        "results": results,
+        "performance": {
+            "wall_seconds": round(wall, 3),
+            "virtual_seconds": round(vclock.elapsed, 1),
+            "speedup": round(vclock.elapsed / wall, 1) if wall else None,
+            "signals_per_second": round(len(entries) / wall, 1) if wall else None,
+        },
+    }
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """Differences between the deterministic results of two runs."""
+    diffs = []
+    old, new = baseline.get("results", {}), current.get("results", {})
+    for key in sorted(set(old) | set(new)):
+        if old.get(key) != new.get(key):
+            diffs.append(f"{key}: {json.dumps(old.get(key))} -> {json.dumps(new.get(key))}")
+    return diffs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded signals against a fake broker on a virtual clock.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gen = commands.add_parser("generate", help="write a synthetic signal log")
+    gen.add_argument("path")
+    gen.add_argument("--signals", type=int, default=400)
+    gen.add_argument("--date", default=datetime.now().date().isoformat())
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--timezone", default="Etc/GMT-2")
+    rep = commands.add_parser("run", help="replay a signal log")
+    rep.add_argument("path")
+    rep.add_argument("--seed", type=int, default=0)
+    rep.add_argument("--win-rate", type=float, default=0.55)
+    rep.add_argument("--set", action="append", default=[], metavar="FIELD=VALUE", help="override a RISK_MANAGEMENT field")
+    rep.add_argument("--output", help="write the run summary to this file")
+    rep.add_argument("--compare", help="exit with status 1 if the results differ from this earlier summary")
+    rep.add_argument("--verbose", action="store_true", help="keep the app's logging and prints")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate_log(args.path, args.signals, args.date, args.seed, args.timezone)
+        return 0
+    settings = dict(item.split("=", 1) for item in args.set)
+    summary = run(args.path, seed=args.seed, win_rate=args.win_rate, settings=settings, verbose=args.verbose)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            diffs = compare(json.load(f), summary)
+        for diff in diffs:
+            print(f"DIFF {diff}")
+        return 1 if diffs else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import logging
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Rejection reason codes returned to webhook callers
+DAILY_DRAWDOWN = "DAILY_DRAWDOWN"
+PROVIDER_COOLDOWN = "PROVIDER_COOLDOWN"
+PROVIDER_EXPOSURE = "PROVIDER_EXPOSURE"
+ASSET_EXPOSURE = "ASSET_EXPOSURE"
+CONCURRENT_SEQUENCES = "CONCURRENT_SEQUENCES"
+MARTINGALE_EXPOSURE = "MARTINGALE_EXPOSURE"
+
+
+class RiskEngine:
+    """Exposure caps, concurrency limits and loss-streak cool-downs.
+
+    Every counter is updated incrementally when a sequence opens, moves to a
+    new martingale leg or closes, so `check` (new sequences) and `check_leg`
+    (each further martingale leg) are a few dict lookups and comparisons. Limits are read from the RISK_MANAGEMENT model on each call;
+    a limit of 0 means unlimited.
+    """
+
+    def __init__(self, now: Callable[[], float] = time.monotonic):
+        self.now = now
+        self.open_by_provider: dict[str, int] = {}
+        self.open_by_asset: dict[str, int] = {}
+        self.open_sequences = 0
+        self.open_amount = 0.0
+        self.loss_streak: dict[str, int] = {}
+        self.cooldown_until: dict[str, float] = {}
+        # sequence id -> (provider, asset, current stake)
+        self._sequences: dict[str, tuple[str, str, float]] = {}
+
+    def check(self, provider: str, asset: str, amount: float, pnl_day: float, limits) -> str | None:
+        """Return a reason code if a new sequence must be rejected, else None."""
+        if pnl_day <= limits.drawback_threshold:
+            return DAILY_DRAWDOWN
+        until = self.cooldown_until.get(provider)
+        if until is not None and self.now() < until:
+            return PROVIDER_COOLDOWN
+        if limits.max_concurrent_sequences and self.open_sequences >= limits.max_concurrent_sequences:
+            return CONCURRENT_SEQUENCES
+        if limits.max_sequences_per_provider and self.open_by_provider.get(provider, 0) >= limits.max_sequences_per_provider:
+            return PROVIDER_EXPOSURE
+        if limits.max_sequences_per_asset and self.open_by_asset.get(asset, 0) >= limits.max_sequences_per_asset:
+            return ASSET_EXPOSURE
+        if limits.max_open_martingale_amount and self.open_amount + amount > limits.max_open_martingale_amount:
+            return MARTINGALE_EXPOSURE
+        return None
+
+    def check_leg(self, sequence_id: str, amount: float, limits) -> str | None:
+        """Return a reason code if an open sequence must not move to a leg staking `amount`, else None."""
+        entry = self._sequences.get(sequence_id)
+        current = entry[2] if entry is not None else 0.0
+        if limits.max_open_martingale_amount and self.open_amount - current + amount > limits.max_open_martingale_amount:
+            return MARTINGALE_EXPOSURE
+        return None
+
+    def open(self, sequence_id: str, provider: str, asset: str, amount: float) -> None:
+        if sequence_id in self._sequences:
+            return
+        self._sequences[sequence_id] = (provider, asset, amount)
+        self.open_by_provider[provider] = self.open_by_provider.get(provider, 0) + 1
+        self.open_by_asset[asset] = self.open_by_asset.get(asset, 0) + 1
+        self.open_sequences += 1
+        self.open_amount += amount
+
+    def stake(self, sequence_id: str, amount: float) -> None:
+        """Move an open sequence to the stake of its current martingale leg."""
+        entry = self._sequences.get(sequence_id)
+        if entry is None:
+            return
+        provider, asset, previous = entry
+        self._sequences[sequence_id] = (provider, asset, amount)
+        self.open_amount += amount - previous
+
+    def close(self, sequence_id: str, won: bool | None, limits) -> None:
+        """Release a sequence. `won` is None when it ended without a result."""
+        entry = self._sequences.pop(sequence_id, None)
+        if entry is None:
+            return
+        provider, asset, amount = entry
+        self.open_by_provider[provider] -= 1
+        self.open_by_asset[asset] -= 1
+        self.open_sequences -= 1
+        self.open_amount -= amount
+        if won is None:
+            return
+        if won:
+            self.loss_streak[provider] = 0
+            return
+        streak = self.loss_streak.get(provider, 0) + 1
+        if limits.loss_streak_cooldown and streak >= limits.loss_streak_cooldown:
+            self.cooldown_until[provider] = self.now() + limits.cooldown_seconds
+            logger.warning(f"Provider {provider} lost {streak} sequences in a row, cooling down for {limits.cooldown_seconds}s")
+            streak = 0
+        self.loss_streak[provider] = streak
+
+    def snapshot(self) -> dict:
+        now = self.now()
+        return {
+            "open_sequences": self.open_sequences,
+            "open_amount": round(self.open_amount, 2),
+            "open_by_provider": {k: v for k, v in self.open_by_provider.items() if v},
+            "open_by_asset": {k: v for k, v in self.open_by_asset.items() if v},
+            "loss_streak": dict(self.loss_streak),
+            "cooldowns": {k: round(v - now, 1) for k, v in self.cooldown_until.items() if v > now},
+        }
@@ -0,0 +1,374 @@
+# signal_sources.py - signal ingestion adapters
+#
+# Every adapter yields RawSignal objects carrying the notification text in the
+# format parse_signal expects, plus the time the message was created at the
+# source, so the ingest latency of each path can be compared.
+#
+#   python signal_sources.py append signals.log "EUR/USD OTC Entry at 10:05 BUY"
+#   python signal_sources.py record signals.log replay.jsonl
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import stat
+import statistics
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from types import SimpleNamespace
+from typing import AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_TAG = re.compile(r'signal_provider="')
+TIMEZONE_TAG = re.compile(r'timezone="')
+
+
+class RawSignal:
+    __slots__ = ("text", "source", "source_ts", "received_ts")
+
+    def __init__(self, text: str, source: str, source_ts: float | None, received_ts: float | None = None):
+        self.text = text
+        self.source = source
+        self.source_ts = source_ts
+        self.received_ts = time.time() if received_ts is None else received_ts
+
+
+def normalize(text: str, provider: str | None = None, timezone: str | None = None) -> str:
+    """Add the signal_provider/timezone tags parse_signal needs when the source text lacks them."""
+    text = text.strip()
+    if provider and not PROVIDER_TAG.search(text):
+        text += f'\nsignal_provider="{provider}"'
+    if timezone and not TIMEZONE_TAG.search(text):
+        text += f'\ntimezone="{timezone}"'
+    return text
+
+
+class LatencyStats:
+    """Source-to-ingest latency over the last `window` messages."""
+    __slots__ = ("samples", "count", "errors")
+
+    def __init__(self, window: int = 500):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+
+    def record(self, latency: float | None) -> None:
+        self.count += 1
+        if latency is not None:
+            self.samples.append(latency)
+
+    def snapshot(self) -> dict:
+        if not self.samples:
+            return {"messages": self.count, "errors": self.errors, "latency_ms": None}
+        ordered = sorted(self.samples)
+        return {
+            "messages": self.count,
+            "errors": self.errors,
+            "latency_ms": {
+                "mean": round(statistics.fmean(ordered) * 1000, 1),
+                "p50": round(ordered[len(ordered) // 2] * 1000, 1),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                "max": round(ordered[-1] * 1000, 1),
+            },
+        }
+
+
+class SignalSource(ABC):
+    """Base adapter: `messages()` yields RawSignal until the source is exhausted or cancelled."""
+    name = "source"
+
+    @abstractmethod
+    def messages(self) -> AsyncIterator[RawSignal]:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class TelegramSource(SignalSource):
+    """Messages and channel posts received by a Telegram bot (python-telegram-bot).
+
+    Add the bot to the signal channel or group. The provider defaults to the
+    chat title; `providers` maps chat ids or titles to provider names.
+    """
+    name = "telegram"
+
+    def __init__(self, token: str, chats: set[str] | None = None, providers: dict[str, str] | None = None,
+                 timezone: str | None = None):
+        self.token = token
+        self.chats = chats
+        self.providers = providers or {}
+        self.timezone = timezone
+        self._queue: asyncio.Queue[RawSignal] = asyncio.Queue()
+        self._app = None
+
+    def on_message(self, message) -> None:
+        text = getattr(message, "text", None) or getattr(message, "caption", None)
+        if not text:
+            return
+        chat = message.chat
+        keys = (str(chat.id), chat.title or "")
+        if self.chats and not self.chats.intersection(keys):
+            return
+        provider = next((self.providers[k] for k in keys if k in self.providers), chat.title or str(chat.id))
+        # Telegram stamps messages in whole seconds
+        self._queue.put_nowait(RawSignal(normalize(text, provider, self.timezone), self.name, message.date.timestamp()))
+
+    async def _start(self) -> None:
+        # imported here so the bot only needs python-telegram-bot when this source is used
+        from telegram import Update
+        from telegram.ext import Application, MessageHandler, filters
+
+        async def handle(update, context) -> None:
+            if update.effective_message is not None:
+                self.on_message(update.effective_message)
+
+        self._app = Application.builder().token(self.token).build()
+        self._app.add_handler(MessageHandler(filters.TEXT | filters.CAPTION, handle))
+        await self._app.initialize()
+        await self._app.start()
+        await self._app.updater.start_polling(allowed_updates=[Update.MESSAGE, Update.CHANNEL_POST])  # type: ignore
+
+    async def messages(self) -> AsyncIterator[RawSignal]:
+        await self._start()
+        while True:
+            yield await self._queue.get()
+
+    async def close(self) -> None:
+        if self._app is not None:
+            await self._app.updater.stop()  # type: ignore
+            await self._app.stop()
+            await self._app.shutdown()
+            self._app = None
+
+
+class LocalTelegramSource(TelegramSource):
+    """Stand-in for TelegramSource: `post()` injects a message without a bot or network."""
+    name = "telegram_local"
+
+    def __init__(self, chats: set[str] | None = None, providers: dict[str, str] | None = None, timezone: str | None = None):
+        super().__init__("", chats, providers, timezone)
+
+    async def _start(self) -> None:
+        pass
+
+    def post(self, text: str, chat_title: str = "local", chat_id: int = 0, sent_at: float | None = None) -> None:
+        ts = time.time() if sent_at is None else sent_at
+        self.on_message(SimpleNamespace(text=text, caption=None, chat=SimpleNamespace(id=chat_id, title=chat_title),
+                                        date=SimpleNamespace(timestamp=lambda: ts)))
+
+
+def _parse_line(line: str) -> tuple[str, float | None, str | None]:
+    """A line is either plain signal text or a JSON object {"text", "ts", "provider"}."""
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            return entry["text"], entry.get("ts"), entry.get("provider")
+        except (ValueError, KeyError):
+            pass
+    return line, None, None
+
+
+class TailSource(SignalSource):
+    """Follow a file or named pipe, one signal per line.
+
+    Multi-line notifications are written as JSON lines (see `append_signal`).
+    Regular files are read from their end, so restarting does not replay old
+    signals. The descriptor is non-blocking, so a pipe without a writer never
+    ties up a thread.
+    """
+    name = "tail"
+
+    def __init__(self, path: str, provider: str | None = None, timezone: str | None = None, poll: float = 0.05):
+        self.path = path
+        self.provider = provider
+        self.timezone = timezone
+        self.poll = poll
+        self.name = f"tail:{os.path.basename(path)}"
+
+    async def messages(self) -> AsyncIterator[RawSignal]:
+        fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+                os.lseek(fd, 0, os.SEEK_END)
+            buffer = b""
+            while True:
+                try:
+                    chunk = os.read(fd, 65536)
+                except BlockingIOError:
+                    chunk = b""
+                if not chunk:
+                    await asyncio.sleep(self.poll)
+                    continue
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    text, ts, provider = _parse_line(line.decode("utf-8", errors="replace"))
+                    yield RawSignal(normalize(text, provider or self.provider, self.timezone), self.name, ts)
+        finally:
+            os.close(fd)
+
+
+def append_signal(path: str, text: str, provider: str | None = None) -> None:
+    """Local stand-in writer for TailSource: append one timestamped signal."""
+    entry = {"text": text, "ts": time.time()}
+    if provider:
+        entry["provider"] = provider
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+class ReplaySource(SignalSource):
+    """Replay a recorded message log (JSON lines with "text", "ts" and optionally "source"/"provider").
+
+    Gaps between messages are kept, divided by `speed`. Replayed messages
+    have no meaningful send time, so they are counted but left out of the
+    latency stats.
+    """
+    name = "replay"
+
+    def __init__(self, path: str, speed: float = 1.0, timezone: str | None = None):
+        self.path = path
+        self.speed = speed
+        self.timezone = timezone
+        self.name = f"replay:{os.path.basename(path)}"
+
+    def _load(self) -> list[dict]:
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+        return sorted(entries, key=lambda e: e.get("ts") or 0)
+
+    async def messages(self) -> AsyncIterator[RawSignal]:
+        entries = await asyncio.to_thread(self._load)
+        previous = None
+        for entry in entries:
+            ts = entry.get("ts")
+            if previous is not None and ts is not None and self.speed > 0:
+                await asyncio.sleep(max(0.0, (ts - previous) / self.speed))
+            previous = ts if ts is not None else previous
+            yield RawSignal(normalize(entry["text"], entry.get("provider"), self.timezone), self.name, None)
+
+
+class SignalIngestor:
+    """Run the configured sources and hand every message to `handler`.
+
+    `record_path` appends each ingested message to a JSON-lines log that
+    ReplaySource can play back later.
+    """
+
+    def __init__(self, handler: Callable[[str], Awaitable], record_path: str | None = None):
+        self.handler = handler
+        self.record_path = record_path
+        self.sources: list[SignalSource] = []
+        self.stats: dict[str, LatencyStats] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, source: SignalSource) -> None:
+        self.sources.append(source)
+        self.stats.setdefault(source.name, LatencyStats())
+
+    def record_latency(self, source: str, source_ts: float | None, received_ts: float | None = None) -> None:
+        received_ts = time.time() if received_ts is None else received_ts
+        self.stats.setdefault(source, LatencyStats()).record(None if source_ts is None else received_ts - source_ts)
+
+    def _record(self, signal: RawSignal) -> None:
+        with open(self.record_path, "a", encoding="utf-8") as f:  # type: ignore
+            f.write(json.dumps({"ts": signal.source_ts or signal.received_ts, "source": signal.source, "text": signal.text}) + "\n")
+
+    async def ingest(self, signal: RawSignal) -> None:
+        self.record_latency(signal.source, signal.source_ts, signal.received_ts)
+        if self.record_path:
+            await asyncio.to_thread(self._record, signal)
+        try:
+            await self.handler(signal.text)
+        except Exception as e:
+            self.stats[signal.source].errors += 1
+            logger.error(f"Signal from {signal.source} failed: {e}", exc_info=True)
+
+    async def _run(self, source: SignalSource) -> None:
+        try:
+            async for signal in source.messages():
+                await self.ingest(signal)
+            logger.info(f"Signal source {source.name} finished")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats[source.name].errors += 1
+            logger.error(f"Signal source {source.name} stopped: {e}", exc_info=True)
+        finally:
+            await source.close()
+
+    def start(self) -> None:
+        if any(not task.done() for task in self._tasks):
+            return
+        self._tasks = [asyncio.create_task(self._run(source)) for source in self.sources]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def snapshot(self) -> dict:
+        running = {source.name for source, task in zip(self.sources, self._tasks) if not task.done()}
+        return {name: stats.snapshot() | {"running": name in running} for name, stats in self.stats.items()}
+
+
+def sources_from_env(value: str | None, timezone: str | None = None) -> list[SignalSource]:
+    """Comma separated list of `telegram`, `tail:<path>` and `replay:<path>[@speed]`.
+
+    Telegram reads PO_TELEGRAM_TOKEN and optionally PO_TELEGRAM_CHATS (comma
+    separated chat ids or titles).
+    """
+    sources: list[SignalSource] = []
+    for spec in filter(None, (part.strip() for part in (value or "").split(","))):
+        kind, _, arg = spec.partition(":")
+        if kind == "telegram":
+            token = os.getenv("PO_TELEGRAM_TOKEN")
+            if not token:
+                raise ValueError("PO_TELEGRAM_TOKEN is required for the telegram signal source")
+            chats = {c.strip() for c in os.getenv("PO_TELEGRAM_CHATS", "").split(",") if c.strip()} or None
+            sources.append(TelegramSource(token, chats, timezone=timezone))
+        elif kind == "tail" and arg:
+            sources.append(TailSource(arg, timezone=timezone))
+        elif kind == "replay" and arg:
+            path, _, speed = arg.partition("@")
+            sources.append(ReplaySource(path, float(speed or 1), timezone=timezone))
+        else:
+            raise ValueError(f"Unknown signal source '{spec}', expected telegram, tail:<path> or replay:<path>[@speed]")
+    return sources
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local stand-ins for the signal source adapters.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    append = commands.add_parser("append", help="append a signal to a file or pipe followed by a tail source")
+    append.add_argument("path")
+    append.add_argument("text")
+    append.add_argument("--provider")
+    record = commands.add_parser("record", help="convert a tail log into a replay log")
+    record.add_argument("source")
+    record.add_argument("target")
+    args = parser.parse_args()
+
+    if args.command == "append":
+        append_signal(args.path, args.text.replace("\\n", "\n"), args.provider)
+    elif args.command == "record":
+        with open(args.source, "r", encoding="utf-8") as src, open(args.target, "a", encoding="utf-8") as dst:
+            for line in src:
+                if line.strip():
+                    text, ts, provider = _parse_line(line)
+                    dst.write(json.dumps({"ts": ts, "text": text, "provider": provider}) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
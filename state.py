@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Mapping
+
+logger = logging.getLogger(__name__)
+
+
+class StateSnapshot:
+    """Read-only view of the live state at one version; later changes never show through."""
+    __slots__ = ("version", "signals", "trades", "balance")
+
+    def __init__(self, version: int, signals: Mapping, trades: Mapping, balance: float):
+        self.version = version
+        self.signals = signals
+        self.trades = trades
+        self.balance = balance
+
+
+class StateManager:
+    """Sole owner of the live signals, open trades and account balance.
+
+    Every change is a synchronous command on this object, so on the event
+    loop it runs to completion before any other task is scheduled: a check
+    and its update (e.g. the duplicate-signal test in `add_signal`) can no
+    longer be split by an await. Commands from other threads go through
+    `submit`, which queues them onto the owning loop. Direct mutation from
+    a foreign thread raises.
+
+    Readers take a `snapshot()`. It shares the current dicts until the next
+    write, which copies the structure it changes first (copy-on-write), so
+    a snapshot is O(1) while nothing changes and never sees a half-applied
+    update.
+    """
+
+    def __init__(self):
+        self._signals: dict[str, Any] = {}
+        self._trades: dict[str, Any] = {}
+        self.balance = 0.0
+        self.version = 0
+        self._snapshot: StateSnapshot | None = None
+        self._signals_shared = False
+        self._trades_shared = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._owner: int | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """Make the running (or given) loop's thread the owner."""
+        self._loop = loop or asyncio.get_running_loop()
+        self._owner = threading.get_ident()
+
+    def _check_owner(self) -> None:
+        if self._owner is None:
+            try:
+                self.bind()
+            except RuntimeError:
+                # no loop yet (startup, scripts): whoever writes first owns the state
+                self._owner = threading.get_ident()
+        elif threading.get_ident() != self._owner:
+            raise RuntimeError("StateManager changed outside its owning thread; use submit()")
+
+    def submit(self, command: Callable, *args) -> None:
+        """Run a command on the owning loop; safe to call from any thread."""
+        if self._loop is None or threading.get_ident() == self._owner:
+            command(*args)
+        else:
+            self._loop.call_soon_threadsafe(command, *args)
+
+    def _write_signals(self) -> dict:
+        self._check_owner()
+        if self._signals_shared:
+            self._signals = dict(self._signals)
+            self._signals_shared = False
+        self._snapshot = None
+        self.version += 1
+        return self._signals
+
+    def _write_trades(self) -> dict:
+        self._check_owner()
+        if self._trades_shared:
+            self._trades = dict(self._trades)
+            self._trades_shared = False
+        self._snapshot = None
+        self.version += 1
+        return self._trades
+
+    # commands
+    def add_signal(self, signal_id: str, details) -> bool:
+        """Register a signal; False if one with the same id is already live."""
+        if signal_id in self._signals:
+            return False
+        self._write_signals()[signal_id] = details
+        return True
+
+    def remove_signal(self, signal_id: str):
+        if signal_id not in self._signals:
+            return None
+        return self._write_signals().pop(signal_id)
+
+    def open_trade(self, trade_id: str, details) -> None:
+        self._write_trades()[trade_id] = details
+
+    def close_trade(self, trade_id: str):
+        if trade_id not in self._trades:
+            return None
+        return self._write_trades().pop(trade_id)
+
+    def replace_trade(self, old_trade_id: str, trade_id: str, details) -> None:
+        """Move a sequence to its next martingale leg in one step."""
+        trades = self._write_trades()
+        trades.pop(old_trade_id, None)
+        trades[trade_id] = details
+
+    def set_balance(self, balance: float) -> None:
+        self._check_owner()
+        if balance != self.balance:
+            self.balance = balance
+            self._snapshot = None
+            self.version += 1
+
+    def reset(self) -> None:
+        self._check_owner()
+        self._signals, self._trades = {}, {}
+        self._signals_shared = self._trades_shared = False
+        self.balance = 0.0
+        self._snapshot = None
+        self.version += 1
+
+    # reads
+    def has_signal(self, signal_id: str) -> bool:
+        return signal_id in self._signals
+
+    def trade(self, trade_id: str):
+        return self._trades.get(trade_id)
+
+    def snapshot(self) -> StateSnapshot:
+        if self._snapshot is None:
+            self._signals_shared = self._trades_shared = True
+            self._snapshot = StateSnapshot(self.version, MappingProxyType(self._signals), MappingProxyType(self._trades), self.balance)
+        return self._snapshot
+
+    def stats(self) -> dict:
+        return {"version": self.version, "signals": len(self._signals), "open_trades": len(self._trades)}
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+def worker_identity() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class StateBackend(ABC):
+    """State shared between HTTP workers.
+
+    Exactly one worker holds the executor lease: it connects to the broker
+    and places every trade. Other workers hand incoming signals to the leader
+    through the inbox and serve dashboard reads from published snapshots.
+    """
+    shared = False
+
+    @abstractmethod
+    async def acquire_leadership(self, worker_id: str, ttl: float) -> bool:
+        ...
+
+    @abstractmethod
+    async def release_leadership(self, worker_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def leader(self) -> str | None:
+        ...
+
+    @abstractmethod
+    async def submit_signal(self, raw_data: str) -> None:
+        ...
+
+    @abstractmethod
+    async def claim_signals(self, worker_id: str, limit: int = 50) -> list[str]:
+        ...
+
+    @abstractmethod
+    async def publish(self, key: str, value) -> None:
+        ...
+
+    @abstractmethod
+    async def read(self, key: str):
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class InProcessBackend(StateBackend):
+    """Single-worker backend: this process is always the leader."""
+
+    def __init__(self):
+        self._owner: str | None = None
+        self._inbox: list[str] = []
+        self._snapshots: dict = {}
+
+    async def acquire_leadership(self, worker_id: str, ttl: float) -> bool:
+        if self._owner in (None, worker_id):
+            self._owner = worker_id
+            return True
+        return False
+
+    async def release_leadership(self, worker_id: str) -> None:
+        if self._owner == worker_id:
+            self._owner = None
+
+    async def leader(self) -> str | None:
+        return self._owner
+
+    async def submit_signal(self, raw_data: str) -> None:
+        self._inbox.append(raw_data)
+
+    async def claim_signals(self, worker_id: str, limit: int = 50) -> list[str]:
+        claimed, self._inbox = self._inbox[:limit], self._inbox[limit:]
+        return claimed
+
+    async def publish(self, key: str, value) -> None:
+        self._snapshots[key] = value
+
+    async def read(self, key: str):
+        return self._snapshots.get(key)
+
+
+class SqliteBackend(StateBackend):
+    """Backend shared by every worker on the host through one SQLite file in WAL mode.
+
+    Leadership is a lease row that the holder renews before it expires; a
+    worker that stops renewing (crash, hang) loses it to the next candidate.
+    Calls run in a thread so the event loop never waits on the file lock.
+    """
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS leader (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS inbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                raw TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                claimed_by TEXT
+            );
+            CREATE INDEX IF NOT EXISTS inbox_unclaimed ON inbox (claimed_by, id);
+            CREATE TABLE IF NOT EXISTS snapshots (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+        return asyncio.to_thread(locked)
+
+    def _acquire(self, worker_id: str, ttl: float) -> bool:
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT owner, expires_at FROM leader WHERE id = 1").fetchone()
+            if row is None or row[0] == worker_id or row[1] < now:
+                self._conn.execute(
+                    "INSERT INTO leader (id, owner, expires_at) VALUES (1, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                    (worker_id, now + ttl))
+                acquired = True
+            else:
+                acquired = False
+            self._conn.execute("COMMIT")
+            return acquired
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def acquire_leadership(self, worker_id: str, ttl: float) -> bool:
+        return await self._run(self._acquire, worker_id, ttl)
+
+    async def release_leadership(self, worker_id: str) -> None:
+        await self._run(self._conn.execute, "DELETE FROM leader WHERE id = 1 AND owner = ?", (worker_id,))
+
+    def _leader(self) -> str | None:
+        row = self._conn.execute("SELECT owner FROM leader WHERE id = 1 AND expires_at >= ?", (time.time(),)).fetchone()
+        return row[0] if row else None
+
+    async def leader(self) -> str | None:
+        return await self._run(self._leader)
+
+    async def submit_signal(self, raw_data: str) -> None:
+        await self._run(self._conn.execute, "INSERT INTO inbox (raw, received_at) VALUES (?, ?)", (raw_data, time.time()))
+
+    def _claim(self, worker_id: str, limit: int) -> list[str]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute("SELECT id, raw FROM inbox WHERE claimed_by IS NULL ORDER BY id LIMIT ?", (limit,)).fetchall()
+            if rows:
+                self._conn.executemany("UPDATE inbox SET claimed_by = ? WHERE id = ?", [(worker_id, row[0]) for row in rows])
+                # keep the inbox small, claimed rows are only useful for a short audit window
+                self._conn.execute("DELETE FROM inbox WHERE claimed_by IS NOT NULL AND received_at < ?", (time.time() - 3600,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return [row[1] for row in rows]
+
+    async def claim_signals(self, worker_id: str, limit: int = 50) -> list[str]:
+        return await self._run(self._claim, worker_id, limit)
+
+    async def publish(self, key: str, value) -> None:
+        await self._run(self._conn.execute,
+                        "INSERT INTO snapshots (key, value, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                        (key, json.dumps(value, default=str), time.time()))
+
+    def _read(self, key: str):
+        row = self._conn.execute("SELECT value FROM snapshots WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def read(self, key: str):
+        return await self._run(self._read, key)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def backend_from_env(value: str | None) -> StateBackend:
+    """`memory` (default) or `sqlite:<path>`."""
+    if not value or value == "memory":
+        return InProcessBackend()
+    if value.startswith("sqlite:"):
+        return SqliteBackend(value[len("sqlite:"):])
+    raise ValueError(f"Unknown state backend '{value}', expected 'memory' or 'sqlite:<path>'")
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    signal_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    entry_time REAL NOT NULL,
+    received_at REAL NOT NULL,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signals_signal ON signals (signal_id, entry_time);
+CREATE INDEX IF NOT EXISTS signals_provider ON signals (provider, entry_time);
+CREATE INDEX IF NOT EXISTS signals_asset ON signals (asset, entry_time);
+CREATE INDEX IF NOT EXISTS signals_entry_time ON signals (entry_time);
+
+CREATE TABLE IF NOT EXISTS legs (
+    trade_id TEXT PRIMARY KEY,
+    signal_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    open_price REAL,
+    opened_at REAL NOT NULL,
+    result TEXT,
+    profit REAL,
+    closed_at REAL
+);
+CREATE INDEX IF NOT EXISTS legs_signal ON legs (signal_id);
+CREATE INDEX IF NOT EXISTS legs_provider ON legs (provider, opened_at);
+CREATE INDEX IF NOT EXISTS legs_asset ON legs (asset, opened_at);
+CREATE INDEX IF NOT EXISTS legs_opened_at ON legs (opened_at);
+
+CREATE TABLE IF NOT EXISTS sequences (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    signal_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    pnl REAL NOT NULL,
+    entry_slippage REAL NOT NULL,
+    price_slippage REAL,
+    entry_time REAL NOT NULL,
+    closed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sequences_signal ON sequences (signal_id, entry_time);
+CREATE INDEX IF NOT EXISTS sequences_provider ON sequences (provider, entry_time);
+CREATE INDEX IF NOT EXISTS sequences_asset ON sequences (asset, entry_time);
+CREATE INDEX IF NOT EXISTS sequences_entry_time ON sequences (entry_time);
+
+CREATE TABLE IF NOT EXISTS pnl (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    amount REAL NOT NULL,
+    trade_id TEXT
+);
+CREATE INDEX IF NOT EXISTS pnl_ts ON pnl (ts);
+
+CREATE TABLE IF NOT EXISTS entry_decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    signal_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    action TEXT NOT NULL,
+    late REAL NOT NULL,
+    bucket TEXT NOT NULL,
+    target_time REAL NOT NULL,
+    entry_time REAL NOT NULL,
+    decided_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entry_decisions_provider ON entry_decisions (provider, decided_at);
+CREATE INDEX IF NOT EXISTS entry_decisions_decided_at ON entry_decisions (decided_at);
+
+CREATE TABLE IF NOT EXISTS handoff (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    saved_at REAL NOT NULL
+);
+"""
+
+MAX_QUERY_ROWS = 500
+
+# a signal id (provider|HH:MM|asset) repeats every day, so these tables append
+# one row per occurrence; (signal_id, entry_time) identifies an occurrence
+SIGNAL_COLUMNS = "signal_id, provider, asset, direction, entry_time, received_at, amount"
+SEQUENCE_COLUMNS = "signal_id, provider, asset, hour, won, depth, pnl, entry_slippage, price_slippage, entry_time, closed_at"
+
+
+def _ts(value) -> float | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class TradeStore:
+    """SQLite history of signals, martingale legs and sequence outcomes.
+
+    Writers only append to an in-memory batch; a flusher task commits the
+    batch in one transaction on a dedicated thread, so the event loop never
+    waits on disk. Reads also run on that thread and use the indexes on
+    provider, asset and entry time.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, max_batch: int = 200):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        # a single thread owns the connection, so writes and reads never interleave
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trade_store")
+        self._conn: sqlite3.Connection | None = None
+        self._batch: list[tuple[str, tuple]] = []
+        # writes are dropped while the store is not open (it failed to open, or replay never opens it)
+        self._dropped = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _connect(self) -> None:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        self._dropped = 0
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        migrate = self._detach_keyed_tables()
+        self._conn.executescript(SCHEMA)
+        for table, columns in migrate:
+            self._conn.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_keyed")
+            self._conn.execute(f"DROP TABLE {table}_keyed")
+        self._conn.commit()
+
+    def _detach_keyed_tables(self) -> list[tuple[str, str]]:
+        """Set aside signals/sequences tables from before they were append-only (keyed on signal_id)."""
+        migrate = []
+        for table, columns in (("signals", SIGNAL_COLUMNS), ("sequences", SEQUENCE_COLUMNS)):
+            info = self._conn.execute(f"PRAGMA table_info({table})").fetchall()  # type: ignore
+            if not info or any(row[1] == "id" for row in info):
+                continue
+            logger.info(f"Migrating {table} in {self.path} to one row per signal occurrence")
+            for (index,) in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)).fetchall():  # type: ignore
+                self._conn.execute(f"DROP INDEX {index}")  # type: ignore
+            self._conn.execute(f"ALTER TABLE {table} RENAME TO {table}_keyed")  # type: ignore
+            migrate.append((table, columns))
+        return migrate
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        await self._call(self._connect)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flusher())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    # writes (non-blocking, batched)
+    def _enqueue(self, sql: str, params: tuple) -> None:
+        if self._conn is None:
+            if not self._dropped:
+                logger.warning(f"Trade history at {self.path} is not open, history rows are not recorded")
+            self._dropped += 1
+            return
+        self._batch.append((sql, params))
+        if len(self._batch) >= self.max_batch:
+            self._wakeup.set()
+
+    def record_signal(self, signal_id: str, provider: str, asset: str, direction: str, entry_time, amount: float) -> None:
+        self._enqueue(f"INSERT INTO signals ({SIGNAL_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (signal_id, provider, asset, direction, _ts(entry_time), time.time(), amount))
+
+    def record_leg_open(self, trade_id: str, signal_id: str, provider: str, asset: str, direction: str,
+                        level: int, amount: float, open_price: float | None, opened_at) -> None:
+        self._enqueue("INSERT OR REPLACE INTO legs (trade_id, signal_id, provider, asset, direction, level, amount, open_price, opened_at) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (trade_id, signal_id, provider, asset, direction, level, amount, open_price, _ts(opened_at) or time.time()))
+
+    def record_leg_close(self, trade_id: str, result: str, profit: float | None) -> None:
+        self._enqueue("UPDATE legs SET result = ?, profit = ?, closed_at = ? WHERE trade_id = ?",
+                      (result, profit, time.time(), trade_id))
+
+    def record_sequence(self, signal_id: str, provider: str, asset: str, hour: int, won: bool, depth: int, pnl: float,
+                        entry_slippage: float, price_slippage: float | None, entry_time) -> None:
+        self._enqueue(f"INSERT INTO sequences ({SEQUENCE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (signal_id, provider, asset, hour, 1 if won else 0, depth, pnl, entry_slippage, price_slippage,
+                       _ts(entry_time) or time.time(), time.time()))
+
+    def record_pnl(self, amount: float, ts: float, trade_id: str | None = None) -> None:
+        self._enqueue("INSERT INTO pnl (ts, amount, trade_id) VALUES (?, ?, ?)", (ts, amount, trade_id))
+
+    def record_entry_decision(self, signal_id: str, provider: str, asset: str, action: str, late: float, bucket: str,
+                              target_time, entry_time, decided_at: float) -> None:
+        self._enqueue("INSERT INTO entry_decisions (signal_id, provider, asset, action, late, bucket, target_time, entry_time, decided_at) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (signal_id, provider, asset, action, late, bucket, _ts(target_time), _ts(entry_time), decided_at))
+
+    def save_handoff(self, items: list[tuple[str, dict]]) -> None:
+        """In-flight work for the next process; written by the final flush on close."""
+        saved_at = time.time()
+        for kind, payload in items:
+            self._enqueue("INSERT INTO handoff (kind, payload, saved_at) VALUES (?, ?, ?)", (kind, json.dumps(payload), saved_at))
+
+    def _write(self, batch: list[tuple[str, tuple]]) -> None:
+        with self._conn:  # type: ignore
+            for sql, params in batch:
+                self._conn.execute(sql, params)  # type: ignore
+
+    async def flush(self) -> None:
+        if not self._batch or self._conn is None:
+            return
+        batch, self._batch = self._batch, []
+        try:
+            await self._call(self._write, batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} history rows: {e}", exc_info=True)
+
+    async def _flusher(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    # reads
+    def _query(self, sql: str, params: tuple) -> list[sqlite3.Row]:
+        self._conn.row_factory = sqlite3.Row  # type: ignore
+        return self._conn.execute(sql, params).fetchall()  # type: ignore
+
+    @staticmethod
+    def _filters(column_prefix: str, time_column: str, provider: str | None, asset: str | None,
+                 since: float | None, until: float | None) -> tuple[str, list]:
+        clauses, params = [], []
+        if provider is not None:
+            clauses.append(f"{column_prefix}provider = ?")
+            params.append(provider)
+        if asset is not None:
+            clauses.append(f"{column_prefix}asset = ?")
+            params.append(asset)
+        if since is not None:
+            clauses.append(f"{column_prefix}{time_column} >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"{column_prefix}{time_column} < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    async def closed_legs(self, provider: str | None = None, asset: str | None = None,
+                          since: float | None = None, until: float | None = None, limit: int = 50) -> list[dict]:
+        where, params = self._filters("", "opened_at", provider, asset, since, until)
+        where = (where + " AND " if where else " WHERE ") + "result IS NOT NULL"
+        sql = (f"SELECT trade_id, signal_id, provider, asset, direction, level, amount, open_price, opened_at, result, profit, closed_at "
+               f"FROM legs{where} ORDER BY opened_at DESC LIMIT ?")
+        rows = await self._call(self._query, sql, tuple(params) + (min(limit, MAX_QUERY_ROWS),))
+        return [dict(row) for row in rows]
+
+    async def sequence_stats(self, by: str, provider: str | None = None, asset: str | None = None,
+                             since: float | None = None, until: float | None = None) -> list[dict]:
+        if by not in ("provider", "asset", "hour"):
+            raise ValueError(f"Unknown grouping '{by}', expected one of ['asset', 'hour', 'provider']")
+        where, params = self._filters("", "entry_time", provider, asset, since, until)
+        sql = (f"SELECT {by} AS key, COUNT(*) AS trades, SUM(won) AS wins, AVG(won) AS win_rate, "
+               f"AVG(depth) AS avg_martingale_depth, ROUND(SUM(pnl), 2) AS pnl, AVG(entry_slippage) AS avg_entry_slippage "
+               f"FROM sequences{where} GROUP BY {by} ORDER BY {by}")
+        rows = await self._call(self._query, sql, tuple(params))
+        return [dict(row) for row in rows]
+
+    async def entry_decision_stats(self, provider: str | None = None, asset: str | None = None,
+                                   since: float | None = None, until: float | None = None) -> list[dict]:
+        """Decisions per provider, action and lateness bucket with the outcome of the sequences they started."""
+        where, params = self._filters("d.", "decided_at", provider, asset, since, until)
+        sql = (f"SELECT d.provider AS provider, d.action AS action, d.bucket AS bucket, COUNT(*) AS decisions, "
+               f"AVG(d.late) AS avg_late, COUNT(s.signal_id) AS closed, SUM(s.won) AS wins, AVG(s.won) AS win_rate, "
+               f"ROUND(SUM(s.pnl), 2) AS pnl FROM entry_decisions d "
+               f"LEFT JOIN sequences s ON s.signal_id = d.signal_id AND s.entry_time = d.entry_time AND d.action != 'DROP'"
+               f"{where} GROUP BY d.provider, d.action, d.bucket ORDER BY d.provider, d.action, d.bucket")
+        rows = await self._call(self._query, sql, tuple(params))
+        return [dict(row) for row in rows]
+
+    def _take_handoff(self) -> list[tuple[str, dict]]:
+        with self._conn:  # type: ignore
+            rows = self._conn.execute("SELECT kind, payload FROM handoff ORDER BY id").fetchall()  # type: ignore
+            self._conn.execute("DELETE FROM handoff")  # type: ignore
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    async def take_handoff(self) -> list[tuple[str, dict]]:
+        """Read and clear what the previous process handed off, in one transaction."""
+        if self._conn is None:
+            return []
+        return await self._call(self._take_handoff)
+
+    async def sequence_rows(self) -> list[tuple]:
+        """All closed sequences in the shape `ProviderAnalytics.extend` expects."""
+        rows = await self._call(self._query,
+                                "SELECT provider, asset, hour, won, depth, pnl, entry_slippage FROM sequences ORDER BY entry_time, id", ())
+        return [(r["provider"], r["asset"], r["hour"], bool(r["won"]), r["depth"], r["pnl"], r["entry_slippage"]) for r in rows]
+
+    async def pnl_slots(self, slot_seconds: int) -> list[tuple[int, float]]:
+        """P/L deltas summed per time slot, for seeding `PnlLedger.load`."""
+        rows = await self._call(self._query,
+                                "SELECT CAST(ts / ? AS INTEGER) AS slot, SUM(amount) AS amount FROM pnl GROUP BY slot", (slot_seconds,))
+        return [(r["slot"], r["amount"]) for r in rows]
@@ -7,230 +7,222 @@ let balanceElements = {
 let openTradesElements = document.getElementById('open-trades-result');
 let currentSignalsElements = document.getElementById('current-signals-result');
 let closedTradesElements = document.getElementById('closed-trades-result');
+let riskElement = document.getElementById('risk-result');
 
-async function updateBalance() {
-    try {
-        let response = await fetch('/account_details');
-        if (!response.ok) throw new Error(`HTTP ${response.status}`);
-        let data = await response.json();
-        balanceElements.balance_result.textContent = data.balance ?? '—';
-        balanceElements.P_n_L_day_result.textContent = data.P_n_L_day ?? '—';
-        balanceElements.lifespan_result.textContent = data.lifespan ?? '—';
-    } catch (error) {
-        console.error('Error fetching balance data:', error);
-    }
+// Poll /dashboard for the rows changed since the last version seen. A poll that
+// finds nothing new doubles the delay (up to MAX_POLL_MS); any change resets it.
+// Polling stops while the tab is hidden and resumes when it is shown again.
+const MIN_POLL_MS = 2000;
+const MAX_POLL_MS = 60000;
+let feed = { epoch: null, version: 0 };
+let pollDelay = MIN_POLL_MS;
+let pollTimer = null;
+let polling = false;
+
+function colored(text, color) {
+    return { text: text, color: color };
 }
-async function updateOpenTrades() {
-    try {
-        // const controller = new AbortController();
-        // const signal = controller.signal;
-        // const timeoutId = setTimeout(() => controller.abort(), 5000);
-        console.log('Fetching open trades...');
-        let res = await fetch('/open_trades'/*,{method:"GET",signal}*/);
-        if (!res.ok){ /*;throw new Error*/(`HTTP ${res.status}`) ;};
-        let data = await res.json();
-        // clearTimeout(timeoutId);
-        const trades = data.open_trades || [];
-        if (!trades.length) {
-            openTradesElements.innerHTML = '<div class="empty">No open trades</div>';
-            return;
-        }
 
-        console.log('Open trades data:', trades);
-
-        let html = `<table class="trades-table table"><thead><tr><th>Direction</th><th>Asset</th><th>Amount</th><th>Open Price</th><th>Points</th><th>Profit</th><th>Total Returns</th><th>Opened time</th></tr></thead><tbody>`;
-        html += trades.map(t => {
-            // support both naming schemes (current_price or currentPrice)
-            const priceArray = Array.isArray(t.current_price) ? t.current_price : (Array.isArray(t.currentPrice) ? t.currentPrice : []);
-            const lastPriceObj = priceArray.length ? priceArray[priceArray.length - 1] : null;
-            // console.log('Last price object for trade:', lastPriceObj);
-            // robust last-close extraction with fallbacks
-            let lastClose = lastPriceObj
-                ? (typeof lastPriceObj.close !== 'undefined' && lastPriceObj.close !== null ? Number(lastPriceObj.close)
-                    : (typeof lastPriceObj.c !== 'undefined' && lastPriceObj.c !== null ? Number(lastPriceObj.c)
-                    : (typeof lastPriceObj.price !== 'undefined' && lastPriceObj.price !== null ? Number(lastPriceObj.price)
-                    : (typeof lastPriceObj.open !== 'undefined' && lastPriceObj.open !== null ? Number(lastPriceObj.open) : NaN))))
-                : (typeof t.current_price === 'number' ? Number(t.current_price) : (typeof t.currentPrice === 'number' ? Number(t.currentPrice) : NaN));
-            // console.log(`Extracted last close price: ${lastClose}`);
-            let openPrice = t.openPrice !== undefined ? Number(t.openPrice) : (t.open_price !== undefined ? Number(t.open_price) : NaN);
-            const amount = (t.amount !== undefined && t.amount !== null) ? t.amount : '—';
-            const profit = (t.profit !== undefined && t.profit !== null) ? t.profit : '—';
-            // console.log(`Trade details - Open Price: ${openPrice}, Amount: ${amount}, Profit: ${profit}`);
-            // compute points safely using the lastClose value
-            let pointsHtml = '—';
-            console.log(`Calculating points for trade. Last Close: ${lastClose}, Open Price: ${openPrice}, Direction: ${t.direction}`);
-            if (!isNaN(lastClose) && !isNaN(openPrice)) {
-                lastClose = lastClose;
-                openPrice = openPrice;
-                if (t.direction === "BUY") {
-                    const diff = lastClose - openPrice;
-                    const formatted =Math.abs(Math.round(diff*1000)); // optional formatting
-                    pointsHtml = diff >= 0 ? `<span style="color:green;">${formatted}</span>` : `<span style="color:red;">${formatted}</span>`;
-                } else if (t.direction === "SELL") {
-                    const diff = openPrice-lastClose ;
-                    const formatted = Math.abs(Math.round(diff/1000)); // optional formatting
-                    pointsHtml = diff >= 0 ? `<span style="color:green;">${formatted}</span>` : `<span style="color:red;">${formatted}</span>`;
-                } else {
-                    const diff = lastClose - openPrice;
-                    const formatted  =Math.abs(Math.round(diff/1000)); // optional formatting
-                    pointsHtml = String(formatted);
-                }
-            }
-            // console.log(`Calculated points HTML: ${pointsHtml}`);
-            const totalReturns = (typeof amount === 'number' && typeof profit === 'number') ? (amount + profit) : (amount === '—' || profit === '—' ? '—' : `${amount}+${profit}`);
-
-            console.log('Processed trade:', t);
-            return `
-                <tr>
-                    <td>${t.direction ?? ''}</td>
-                    <td>${t.asset ?? '—'}</td>
-                    <td>${amount}</td>
-                    <td>${isNaN(openPrice) ? '—' : openPrice}</td>
-                    <td>${pointsHtml}</td>
-                    <td>${profit}</td>
-                    <td>${totalReturns}</td>
-                    <td>${t.openedTime ?? '—'}</td>
-                </tr>
-            `;
-        }).join('');
-        // console.log('Final HTML for open trades table:', html);
-        html += '</tbody></table>';
-        openTradesElements.innerHTML = html;
-        console.log('Open trades HTML updated.');
-    } catch (error) {
-        console.error('Error fetching open trades:', error);
-        openTradesElements.innerHTML = '<div class="error">Error loading open trades</div>';
-    }
+function directionCell(direction) {
+    if (direction === undefined || direction === null) return '—';
+    const upper = direction.toUpperCase();
+    if (upper === 'BUY') return colored('BUY', 'green');
+    if (upper === 'SELL') return colored('SELL', 'red');
+    return '—';
 }
-async function updateCurrentSignals() {
-    try {
-        let res = await fetch('/current_signals');
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        let data = await res.json();
-        const signals = data.signals || {};
-        if (!signals.length) {
-            currentSignalsElements.innerHTML = '<div class="empty">No current signals</div>';
-            return;
-        }
-        console.log('Current signals data:', signals);
-        let html = `<table class="signals-table table"><thead><tr><th>Signal provider</th><th>Asset</th><th>Direction</th><th>Entry time</th></tr></thead><tbody>`;
-        html += signals.map(signal=> {
-            const signal_provider = (signal.signal_provider !== undefined && signal.signal_provider !== null) ? signal.signal_provider : '—';
-            const asset = (signal.asset !== undefined && signal.asset !== null) ? signal.asset : '—';
-            const entry_time = (signal.entry_time !== undefined && signal.entry_time !== null) ? signal.entry_time : '—';
-            let direction = '—';
-            if (signal.direction !== undefined && signal.direction !== null) {
-                if (signal.direction.toUpperCase() === 'BUY') {
-                    direction = '<span style="color:green;">BUY</span>';
-                } else if (signal.direction.toUpperCase() === 'SELL') {
-                    direction = '<span style="color:red;">SELL</span>';
-                }
-            }
-            return `
-                <tr>
-                    <td>${signal_provider}</td>
-                    <td>${asset}</td>
-                    <td>${direction}</td>
-                    <td>${entry_time}</td>
-                </tr>
-            `;
-
-        }).join('');
-        html += '</tbody></table>';
-
-        currentSignalsElements.innerHTML = html;
-    } catch (error) {
-        console.error('Error fetching current signals:', error);
-        currentSignalsElements.innerHTML = '<div class="error">Error loading current signals</div>';
+
+function signedCell(value, absolute) {
+    if (typeof value !== 'number') return '—';
+    return colored(absolute ? Math.abs(value) : value, value >= 0 ? 'green' : 'red');
+}
+
+function openTradeCells(t) {
+    // the server sends the latest price and the points / live P&L it computed from it
+    const amount = t.amount ?? '—';
+    const profit = t.profit ?? '—';
+    const totalReturns = (typeof amount === 'number' && typeof profit === 'number') ? (amount + profit) : (amount === '—' || profit === '—' ? '—' : `${amount}+${profit}`);
+    return [
+        t.direction ?? '',
+        t.asset ?? '—',
+        amount,
+        t.open_price ?? '—',
+        (typeof t.current_price === 'number') ? t.current_price : '—',
+        signedCell(t.points, true),
+        signedCell(t.live_pnl, false),
+        profit,
+        totalReturns,
+        t.openedTime ?? '—'
+    ];
+}
+
+function signalCells(signal) {
+    return [
+        signal.signal_provider ?? '—',
+        signal.asset ?? '—',
+        directionCell(signal.direction),
+        signal.entry_time ?? '—'
+    ];
+}
+
+function closedTradeCells(t) {
+    const d = t.trade_details;
+    let outcome = '—';
+    if (d.result !== undefined && d.result !== null) {
+        if (d.result.toUpperCase() === 'WON') outcome = colored('WON', 'green');
+        else if (d.result.toUpperCase() === 'LOSS') outcome = colored('LOSS', 'red');
+        else outcome = d.result;
     }
+    return [
+        d.signal_provider ?? '—',
+        outcome,
+        d.asset ?? '—',
+        directionCell(d.direction),
+        d.entry_time ?? '—',
+        d.amount ?? '—',
+        d.level ?? '—',
+        d.openedTime ?? '—'
+    ];
 }
-async function updateClosedTrades() {
-    try {
-        let res = await fetch('/closed_trades');
-        if (res.status === 404) {
-            closedTradesElements.innerHTML = '<div class="info">No closed-trades endpoint available on server.</div>';
-            return;
+
+// A table whose rows are patched in place by key instead of rebuilt
+class KeyedTable {
+    constructor(container, className, headers, cells, empty, newestFirst) {
+        this.container = container;
+        this.className = className;
+        this.headers = headers;
+        this.cells = cells;
+        this.empty = empty;
+        this.newestFirst = newestFirst;
+        this.rows = new Map();
+        this.tbody = null;
+    }
+
+    ensureTable() {
+        if (this.tbody) return;
+        const table = document.createElement('table');
+        table.className = `${this.className} table`;
+        const headRow = table.createTHead().insertRow();
+        for (const header of this.headers) {
+            const th = document.createElement('th');
+            th.textContent = header;
+            headRow.appendChild(th);
         }
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        let data = await res.json();
-        console.log('Closed trades data:', data);
-        const trades = data.closed_trades || [];
-        if (!Object.keys(trades).length) {
-            closedTradesElements.innerHTML = '<div class="empty">No closed trades</div>';
-            return;
+        this.tbody = table.createTBody();
+        this.container.replaceChildren(table);
+    }
+
+    setCell(td, value) {
+        const text = (value !== null && typeof value === 'object') ? String(value.text) : String(value);
+        const color = (value !== null && typeof value === 'object') ? value.color : '';
+        if (td.textContent !== text) td.textContent = text;
+        if (td.style.color !== color) td.style.color = color;
+    }
+
+    apply(change, full) {
+        if (full) {
+            for (const tr of this.rows.values()) tr.remove();
+            this.rows.clear();
         }
-        let html = `<table class="closed_trade-table table"><thead><tr><th>Signal provider</th><th>Outcome</th><th>Asset</th><th>Direction</th><th>Entry time</th><th>Amount</th><th>Level</th><th>Open time</th></tr></thead><tbody>`;
-        html += Object.keys(trades).map(key => {
-
-            const t = trades[key];
-            let direction = '—';
-            if (t.trade_details.direction !== undefined && t.trade_details.direction !== null) {
-                if (t.trade_details.direction.toUpperCase() === 'BUY') {
-                    direction = '<span style="color:green;">BUY</span>';
-                } else if (t.trade_details.direction.toUpperCase() === 'SELL') {
-                    direction = '<span style="color:red;">SELL</span>';
-                }
+        for (const key of change.remove || []) {
+            const tr = this.rows.get(key);
+            if (tr) {
+                tr.remove();
+                this.rows.delete(key);
             }
-            let Outcome = '—';
-            if (t.trade_details.result !== undefined && t.trade_details.result !== null) {
-                if (t.trade_details.result.toUpperCase() === 'WON') {
-                    Outcome = '<span style="color:green;">WON</span>';
-                } else if (t.trade_details.result.toUpperCase() === 'LOSS') {
-                    Outcome = '<span style="color:red;">LOSS</span>';
-                }else{
-                    Outcome = t.trade_details.result;
-                }
+        }
+        const upsert = change.upsert || {};
+        const keys = Object.keys(upsert);
+        if (keys.length) this.ensureTable();
+        // keys arrive in server order; new rows keep that order at the top or bottom
+        const anchor = this.newestFirst ? this.tbody.firstChild : null;
+        for (const key of keys) {
+            const values = this.cells(upsert[key]);
+            let tr = this.rows.get(key);
+            if (!tr) {
+                tr = document.createElement('tr');
+                for (let i = 0; i < values.length; i++) tr.insertCell();
+                this.tbody.insertBefore(tr, anchor);
+                this.rows.set(key, tr);
             }
-            // console.log(t.trade_details);
-            return `
-                <tr>
-                <td>${t.trade_details.signal_provider ?? '—'}</td>
-                <td>${Outcome}</td>
-                    <td>${t.trade_details.asset ?? '—'}</td>
-                    <td>${direction}</td>
-                    <td>${t.trade_details.entry_time ?? '—'}</td>
-                    <td>${t.trade_details.amount ?? '—'}</td>
-                    <td>${t.trade_details.level ?? '—'}</td>
-                    <td>${t.trade_details.openedTime ?? '—'}</td>
-                </tr>
-            `;
-
-        }).join('');
-        html += '</tbody></table>'
-        closedTradesElements.innerHTML = html;
-    } catch (error) {
-        console.error('Error fetching closed trades:', error);
-        closedTradesElements.innerHTML = '<div class="error">Error loading closed trades</div>';
+            values.forEach((value, i) => this.setCell(tr.cells[i], value));
+        }
+        if (!this.rows.size) {
+            this.tbody = null;
+            this.container.innerHTML = `<div class="empty">${this.empty}</div>`;
+        }
     }
 }
-async function updateRiskData() {
+
+const tables = {
+    open_trades: new KeyedTable(openTradesElements, 'trades-table',
+        ['Direction', 'Asset', 'Amount', 'Open Price', 'Current Price', 'Points', 'Live P/L', 'Profit', 'Total Returns', 'Opened time'],
+        openTradeCells, 'No open trades', false),
+    signals: new KeyedTable(currentSignalsElements, 'signals-table',
+        ['Signal provider', 'Asset', 'Direction', 'Entry time'],
+        signalCells, 'No current signals', false),
+    closed_trades: new KeyedTable(closedTradesElements, 'closed_trade-table',
+        ['Signal provider', 'Outcome', 'Asset', 'Direction', 'Entry time', 'Amount', 'Level', 'Open time'],
+        closedTradeCells, 'No closed trades', true)
+};
+
+function applyAccount(change) {
+    const data = (change.upsert || {}).account;
+    if (!data) return;
+    balanceElements.balance_result.textContent = data.balance ?? '—';
+    balanceElements.P_n_L_day_result.textContent = data.P_n_L_day ?? '—';
+    balanceElements.lifespan_result.textContent = data.lifespan ?? '—';
+}
+
+function applyRisk(change) {
+    const data = (change.upsert || {}).risk;
+    if (data && riskElement) riskElement.textContent = data.message ?? JSON.stringify(data);
+}
+
+function applyDiff(data) {
+    const sections = data.sections || {};
+    for (const [name, change] of Object.entries(sections)) {
+        if (name === 'account') applyAccount(change);
+        else if (name === 'risk') applyRisk(change);
+        else if (tables[name]) tables[name].apply(change, data.full);
+    }
+    feed = { epoch: data.epoch, version: data.version };
+}
+
+async function pollDashboard() {
+    if (polling || document.hidden) return;
+    polling = true;
+    clearTimeout(pollTimer);
     try {
-        let res = await fetch('/get_risk_management');
+        const params = new URLSearchParams({ since: feed.version });
+        if (feed.epoch) params.set('epoch', feed.epoch);
+        let res = await fetch(`/dashboard?${params}`);
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
         let data = await res.json();
-        const msg = data.message ?? JSON.stringify(data);
-        const el = document.getElementById('risk-result');
-        if (el) el.textContent = msg;
+        if (data.changed) {
+            applyDiff(data);
+            pollDelay = MIN_POLL_MS;
+        } else {
+            pollDelay = Math.min(pollDelay * 2, MAX_POLL_MS);
+        }
     } catch (error) {
-        console.error('Error fetching risk data:', error);
-        const el = document.getElementById('risk-result');
-        if (el) el.textContent = 'Error loading risk data';
+        console.error('Error fetching dashboard data:', error);
+        pollDelay = Math.min(pollDelay * 2, MAX_POLL_MS);
+    } finally {
+        polling = false;
+        if (!document.hidden) pollTimer = setTimeout(pollDashboard, pollDelay);
     }
 }
 
+document.addEventListener('visibilitychange', () => {
+    if (document.hidden) {
+        clearTimeout(pollTimer);
+    } else {
+        // catch up at once when the tab is shown again
+        pollDelay = MIN_POLL_MS;
+        pollDashboard();
+    }
+});
+
 document.addEventListener('DOMContentLoaded', () => {
-    updateBalance();
-    updateOpenTrades();
-    updateCurrentSignals();
-    updateClosedTrades();
-    updateRiskData();
-
-    const UPDATE_INTERVAL_MS = 5000;
-    setInterval(() => {
-        updateBalance();
-        updateOpenTrades();
-        updateCurrentSignals();
-        updateClosedTrades();
-        updateRiskData();
-    }, UPDATE_INTERVAL_MS);
-});
\ No newline at end of file
+    pollDashboard();
+});